@@ -13,33 +13,113 @@ With the second method, ParametricAirfoil._fn_upper and
 ParametricAirfoil._fn_lower are left to do their job, which is to
 nicely join the camberline and thickness, taking into account the
 camberline's direction, not simply summing camberline and thickness.
+
+Many airfoils can be generated at once with batch_coords(params), one row
+of parameters per airfoil. It constructs a single object whose parameters
+are column arrays, so child classes that write their equations to broadcast
+over those columns (e.g. np.where instead of if statements) generate all
+airfoils in one vectorized pass.
+
+Coordinates and metrics are computed once per airfoil object: get_coords,
+max_thickness, area and max_camber are @cached, so e.g. scoring an airfoil
+by its thickness, writing its coordinate file and plotting it share one
+geometry computation. Child classes that override get_coords decorate it
+with @cached too. Setting any public attribute (a parameter) drops the cache.
 """
 
 from __future__ import division
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
 import numpy as np
 
+
+def cached(method):
+    """Decorator for ParametricAirfoil methods whose result only depends on
+    the parameters and the arguments. Results are kept per object and
+    arguments, default arguments included, until a parameter is set. Arrays
+    in them are shared by all callers, so they're made read-only."""
+    names = method.__code__.co_varnames[1:method.__code__.co_argcount]
+    defaults = method.__defaults__ or ()
+    defaults = dict(zip(names[len(names)-len(defaults):], defaults))
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        values = dict(defaults)
+        values.update(zip(names, args))
+        values.update(kwargs)
+        key = (method.__name__,) + tuple(values.get(n) for n in names)
+        # Set in __dict__ directly, __setattr__ would drop it again
+        cache = self.__dict__.setdefault('_cache', {})
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        result = method(self, *args, **kwargs)
+        for a in (result if isinstance(result, tuple) else (result,)):
+            if isinstance(a, np.ndarray):
+                a.flags.writeable = False
+        cache[key] = result
+        return result
+    return wrapper
+
+
 class ParametricAirfoil(object):
     """Base class for airfoil generators."""
 
     # x-position of trailing edge, usually 1.0 for normalized airfoil.
     # Only override when really needed.
     xte = 1.0
-    
+
+    # Names of the parameters of from_params and batch_coords, in order
+    parameters = ()
+
+    def __setattr__(self, name, value):
+        """Sets attribute, drops cached coordinates and metrics when it's a
+        parameter (any attribute not starting with _)"""
+        object.__setattr__(self, name, value)
+        if not name.startswith('_'):
+            self.__dict__.pop('_cache', None)
+
+    @classmethod
+    def from_params(cls, params):
+        """Airfoil from a sequence of parameters in the order of
+        cls.parameters. Parameters may be column arrays (N x 1), the object
+        then describes N airfoils."""
+        return cls(*params)
+
+    @classmethod
+    def batch_coords(cls, params, npts=None):
+        """Coordinates of N airfoils, given an (N x P) array with the
+        parameters of one airfoil per row, in the order of cls.parameters.
+        Returns the arrays of get_coords(npts), each (N x ceil(npts/2)),
+        npts defaults to that of get_coords."""
+        params = np.atleast_2d(np.asarray(params, dtype="float"))
+        if params.shape[1] != len(cls.parameters):
+            raise Warning("Pass one column per parameter: {}"
+                          .format(", ".join(cls.parameters)))
+        airfoils = cls.from_params([column[:,np.newaxis]
+                                    for column in params.T])
+        coords = airfoils.get_coords() if npts is None else \
+            airfoils.get_coords(npts)
+        coords = np.broadcast_arrays(*coords)
+        return tuple(np.array(c) for c in coords)
+
     def _fn_upper_lower(self, x):
         """Implements proper coordinate calculation, using camberline
         direction. Returns:
         (x_upper, y_upper, x_lower, y_lower, x_camber, y_camber)"""
         y_t = self._thickness(x)
         y_c = self._camberline(x)
-        # Calculate camber line derivative using central difference
-        dx = np.gradient(x)
-        dyc_dx = np.gradient(y_c, dx)
+        # Calculate camber line derivative using central difference, along
+        # the last axis as a batch has one airfoil per row
+        dyc_dx = np.gradient(y_c, x, axis=-1)
         # np.gradient calculates the edges weirdly, replace them by fwd diff
         # Can be made even more accurate by using second-order fwd diff,
         # but that is not so straightforward when step size differs.
         # Numpy 1.9.1 supports edge_order=2 in np.gradient()
-        dyc_dx[0] = (y_c[1]-y_c[0]) / (x[1]-x[0])
-        dyc_dx[-1] = (y_c[-2]-y_c[-1]) / (x[-2]-x[-1])
+        dyc_dx[...,0] = (y_c[...,1]-y_c[...,0]) / (x[1]-x[0])
+        dyc_dx[...,-1] = (y_c[...,-2]-y_c[...,-1]) / (x[-2]-x[-1])
         # Calculate camberline angle
         theta = np.arctan(dyc_dx)
         # Calculate x,y of upper, lower surfaces
@@ -51,16 +131,33 @@ class ParametricAirfoil(object):
         y_l = y_c - y_t*np.cos(theta)
         return x_l, y_l, x_u, y_u, x, y_c
     
+    @cached
     def max_thickness(self):
         """Numerically compute max. thickness of airfoil"""
-        x_u, y_u, x_l, y_l = self.get_coords()[:4]
-        return y_u.max() - y_l.min()
+        x_l, y_l, x_u, y_u = self.get_coords()[:4]
+        return y_u.max(axis=-1) - y_l.min(axis=-1)
 
+    @cached
     def area(self):
         """Numerically compute volume of airfoil"""
-        x_u, y_u, x_l, y_l = self.get_coords()[:4]
+        x_l, y_l, x_u, y_u = self.get_coords()[:4]
         # Use trapezoidal integration
-        return np.trapz(y_u, x_u) - np.trapz(y_l, x_l)
+        return np.trapz(y_u, x_u, axis=-1) - np.trapz(y_l, x_l, axis=-1)
+
+    @cached
+    def max_camber(self):
+        """Numerically compute max. camber, the largest distance of the mean
+        line from the x-axis"""
+        coords = self.get_coords()
+        if len(coords) > 4:
+            # Generator has a camberline
+            return np.abs(coords[5]).max(axis=-1)
+        x_l, y_l, x_u, y_u = np.broadcast_arrays(*coords)
+        # Mean of the surfaces at the x-positions of the lower, per airfoil
+        y_u = np.reshape([np.interp(xl, xu, yu) for xl, xu, yu in
+                          zip(*(c.reshape(-1, c.shape[-1])
+                                for c in (x_l, x_u, y_u)))], y_l.shape)
+        return np.abs((y_l + y_u) / 2).max(axis=-1)
 
     def _camberline(self, xpts):
         raise Warning("""In child class,
@@ -76,11 +173,11 @@ class ParametricAirfoil(object):
     def get_coords_plain(self, *args):
         """Returns string of coordinates in plain format."""
         # Ignore any camber line
-        x_u, y_u, x_l, y_l = self.get_coords(*args)[:4]
-        # Evaluate and re-order to start at TE, over bottom, then top
-        # Use slicing [1:] to remove [0,0]
-        ycoords = np.append(y_l[::-1], y_u[1:])
-        xcoords = np.append(x_l[::-1], x_u[1:])
+        x_l, y_l, x_u, y_u = self.get_coords(*args)[:4]
+        # Evaluate and re-order to start at TE, over top, then bottom, as
+        # XFOIL expects. Use slicing [1:] to remove [0,0]
+        ycoords = np.append(y_u[::-1], y_l[1:])
+        xcoords = np.append(x_u[::-1], x_l[1:])
         # Use .T to transpose to [[x,y],[x,y],...]
         coordslist = np.array((xcoords, ycoords)).T
         coordstrlist = ["{:.6f} {:.6f}".format(coord[0], coord[1])
@@ -88,12 +185,12 @@ class ParametricAirfoil(object):
         # Join with linebreaks in between
         return '\n'.join(coordstrlist)
 
+    @cached
     def get_coords(self, npts=161):
         """Generates cosine-spaced coordinates, concentrated at LE and TE.
            Returns ([x_lower],[y_lower],[x_upper],[y_upper])"""
-        xpts = (1 - np.cos(np.linspace(0, 1, np.ceil(npts/2))*np.pi)) / 2
-        # Take TE position into account
-        xpts *= self.xte
+        # Take TE position into account, per airfoil for a batch
+        xpts = cosine_spacing(npts) * self.xte
         return self._fn_upper_lower(xpts)
 
     def plot(self, ax, score=None, title=None, style='r-'):
@@ -104,3 +201,105 @@ class ParametricAirfoil(object):
             ax.annotate(str(score), (.4,0))
         if title:
             ax.set_title(title)
+
+
+def cosine_spacing(npts):
+    """x-positions of get_coords(npts) for chord 1, ceil(npts/2) points
+       concentrated at LE and TE"""
+    return (1 - np.cos(np.linspace(0, 1, int(np.ceil(npts/2)))*np.pi)) / 2
+
+
+class GridCache(object):
+    """Arrays that only depend on the coordinate grid, like basis matrices,
+    made by make(key) the first time a key is used. Keeps the maxsize keys
+    used last. Arrays are shared by all airfoils, so they're made read-only.
+    Thread-safe, as airfoils are generated by concurrent scoring threads."""
+
+    def __init__(self, make, maxsize=16):
+        self.make = make
+        self.maxsize = maxsize
+        self._arrays = OrderedDict()
+        self._lock = Lock()
+
+    def __call__(self, key):
+        with self._lock:
+            try:
+                arrays = self._arrays.pop(key)
+            except KeyError:
+                arrays = self.make(key)
+                for a in arrays:
+                    a.flags.writeable = False
+            self._arrays[key] = arrays
+            while len(self._arrays) > self.maxsize:
+                self._arrays.popitem(last=False)
+        return arrays
+
+
+def test():
+    '''Unit tests of batch generation: every row of a batch equals the
+       airfoil generated on its own.'''
+    from naca4series import NACA4
+    from naca5series import NACA5, MEAN_LINES
+    from parsec import PARSEC
+    from nurbs import NURBS
+    rs = np.random.RandomState(0)
+    N = 20
+    batches = {
+        NACA4: np.column_stack((rs.randint(0, 9, N), rs.randint(1, 9, N),
+                                rs.randint(6, 30, N))),
+        NACA5: np.column_stack((rs.choice(sorted(MEAN_LINES), N),
+                                rs.randint(6, 30, N))),
+        PARSEC: np.column_stack((
+            rs.uniform(.9, 1, N), rs.uniform(-.01, .01, N),
+            rs.uniform(.005, .03, N), rs.uniform(.3, .5, N),
+            rs.uniform(.04, .08, N), rs.uniform(-.5, -.2, N),
+            rs.uniform(-20, -5, N), rs.uniform(.3, .5, N),
+            rs.uniform(-.05, 0, N), rs.uniform(0, .4, N),
+            rs.uniform(0, 5, N))),
+        NURBS: np.column_stack((
+            rs.uniform(.01, .4, N), rs.uniform(.05, .4, N),
+            rs.uniform(1, 3, N), rs.uniform(.05, 3, N),
+            rs.uniform(.4, 8, N), rs.uniform(1, 10, N)))}
+    for cls, params in batches.items():
+        coords = cls.batch_coords(params, npts=101)
+        for i, row in enumerate(params):
+            single = cls.from_params(row).get_coords(101)
+            assert len(single) == len(coords)
+            for c, s in zip(coords, single):
+                np.testing.assert_allclose(c[i], s, rtol=1E-10, atol=1E-14)
+        # Metrics work on a batch too
+        airfoils = cls.from_params([column[:,np.newaxis]
+                                    for column in params.T])
+        for metric in ('max_thickness', 'area', 'max_camber'):
+            np.testing.assert_allclose(
+                getattr(airfoils, metric)(),
+                [getattr(cls.from_params(row), metric)() for row in params])
+    # Coordinates and metrics are computed once, until a parameter is set
+    for cls, params in batches.items():
+        airfoil = cls.from_params(params[0])
+        coords = airfoil.get_coords()
+        assert airfoil.get_coords() is coords
+        assert airfoil.get_coords(npts=coords[0].size*2-1) is coords
+        assert airfoil.get_coords(51) is not coords
+        assert not coords[1].flags.writeable
+        thickness = airfoil.max_thickness()
+        assert airfoil.max_thickness() is thickness
+        setattr(airfoil, cls.parameters[-1], params[1][-1])
+        assert airfoil.get_coords() is not coords
+    airfoil = NACA4(2, 4, 12)
+    thickness = airfoil.max_thickness()
+    airfoil.t = .2
+    assert abs(airfoil.max_thickness() - .2) < 1E-3 < thickness - .1
+    assert abs(NACA4(2, 4, 12).max_camber() - .02) < 1E-4
+    # No camber is allowed, camber at position 0 isn't
+    NACA4.batch_coords(((0, 0, 12), (2, 4, 12)))
+    try:
+        NACA4.batch_coords(((0, 0, 12), (2, 0, 12)))
+        raise AssertionError("Camber at position 0 accepted")
+    except Warning:
+        pass
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print("Tests succeeded.")
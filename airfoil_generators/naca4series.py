@@ -12,6 +12,8 @@ from airfoilgen_baseclass import ParametricAirfoil
 
 class NACA4(ParametricAirfoil):
 
+    parameters = ('m', 'p', 't')
+
     def __init__(self, m, p, t):
         """Takes maximum camber m, position of max. camber in tenths of chord,
            and thickness in percent."""
@@ -20,20 +22,20 @@ class NACA4(ParametricAirfoil):
         self.t = t/100
 
     def _camberline(self, xpts):
-        m, p = self.m, self.p
-        if m == 0:
-            return np.zeros(len(xpts))
-        elif m!=0 and p==0:
+        # As arrays, dividing by p=0 gives nan instead of an exception
+        m = np.asarray(self.m, dtype="float")
+        p = np.asarray(self.p, dtype="float")
+        if np.any((m != 0) & (p == 0)):
             raise Warning(
             "Position of max camber is zero while camber is nonzero.")
-        else:
-            xpts0 = xpts[xpts<=p]
-            xpts1 = xpts[xpts>p]
+        # Both pieces are evaluated everywhere and selected with np.where,
+        # so m and p can be column arrays of a batch
+        with np.errstate(divide='ignore', invalid='ignore'):
             # From x=0 to x=p
-            y_c0 = m/p**2 * (2*p*xpts0 - xpts0**2)
+            y_c0 = m/p**2 * (2*p*xpts - xpts**2)
             # From x=p to x=c
-            y_c1 = m/(1-p)**2 * ((1-2*p)+2*p*xpts1 - xpts1**2)
-            return np.append(y_c0, y_c1)
+            y_c1 = m/(1-p)**2 * ((1-2*p)+2*p*xpts - xpts**2)
+        return np.where(m == 0, 0, np.where(xpts <= p, y_c0, y_c1))
 
     def _thickness(self, x):
         t = self.t
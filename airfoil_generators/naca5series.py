@@ -13,52 +13,45 @@ from airfoilgen_baseclass import ParametricAirfoil
 import matplotlib.pyplot as plt
 
 
+#mean line designation: (m, k1, p)
+MEAN_LINES = {
+	210: (.0580, 361.40, .05),
+	220: (.1260, 51.640, .10),
+	230: (.2025, 15.957, .15),
+	240: (.2900, 6.643, .20),
+	250: (.3910, 3.23, .25)}
+
 class NACA5(ParametricAirfoil):
 
+	parameters = ('mld', 't')
+
 	def __init__(self, mld,t):
 		#t is thickness in percentage of chord
 		self.mld = mld #mean line designation
 		self.t = t/100
-		if mld == 210:
-			self.m = .0580
-			self.k1 = 361.40
-			self.p = 0.05
-		elif mld ==220:
-			self.m = .1260
-			self.k1 = 51.640
-			self.p = 0.10
-		elif mld == 230:
-			self.m = .2025
-			self.k1 = 15.957
-			self.p = .15
-		elif mld == 240:
-			self.m = .2900
-			self.k1 = 6.643
-			self.p = 0.20
-		elif mld == 250:
-			self.m = .3910
-			self.k1 = 3.23
-			self.p = .25
-		else: 
-			raise Warning("Unknown airfoil number. Try again.")	
+		try:
+			if np.ndim(mld) == 0:
+				self.m, self.k1, self.p = MEAN_LINES[mld]
+			else:
+				#column arrays of a batch
+				m, k1, p = np.transpose([MEAN_LINES[d] for d in np.ravel(mld)])
+				shape = np.shape(mld)
+				self.m, self.k1, self.p = (m.reshape(shape), k1.reshape(shape),
+				                           p.reshape(shape))
+		except KeyError:
+			raise Warning("Unknown airfoil number. Try again.")
 		#print self.m,self.k1,self.p
 
 	def _camberline(self,xpts):
 		m,p = self.m, self.p
 		k1 = self.k1
-		if m==0:
-			return np.zeros(len(xpts))
-		elif m!=0 and p==0:
+		if np.any((m != 0) & (p == 0)):
 			raise Warning("Position of maximum camber is zero while the mean camber is non-zero")
-		else: 
-			xpts0 = xpts[xpts<=p]
-			xpts1 = xpts[xpts>p]
-			
-			#from x=0 to x=p 
-			yc_0 = k1/6 * (xpts0**3 - 3*m*xpts0**2 + m**2 * (3-m)*xpts0)
-			#from x=p to x=callable
-			yc_1 = k1*m**3/6 * (1-xpts1)
-			return np.append(yc_0,yc_1)
+		#from x=0 to x=p
+		yc_0 = k1/6 * (xpts**3 - 3*m*xpts**2 + m**2 * (3-m)*xpts)
+		#from x=p to x=callable
+		yc_1 = k1*m**3/6 * (1-xpts)
+		return np.where(xpts <= p, yc_0, yc_1)
 		
 
 	def _thickness(self,x):
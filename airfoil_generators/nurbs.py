@@ -1,91 +1,95 @@
 """
-Generates airfoil using NURBS. 
+Generates airfoil using NURBS.
 Original Paper: http://eprints.soton.ac.uk/50031/1/Sobe07.pdf
+
+Each surface is a cubic Hermite curve from the leading edge (0,0) to the
+trailing edge (1,0), defined by the magnitudes and directions of its end
+tangents. Points along the curve are the product of a basis matrix, which
+only depends on the number of points and is cached, with the control points.
 """
 from __future__ import division
 import numpy as np
-import matplotlib.pyplot as plt 
-from math import * 
+from airfoilgen_baseclass import ParametricAirfoil, GridCache, cached
 
-class NURBS():
-	def __init__(self,k):
-		"""Takes a dictionary of coefficients to define NURBS airfoil. 
-		Coefficient names: ta_u,ta_l,tb_u,tb_l,alpha_b,alpha_c """
+#Hermite matrix, rows multiply (1,u,u**2,u**3) with (P0,P1,T0,T1)
+HERMITE = np.array([[1,0,0,0],[0,0,1,0],[-3,3,-2,-1],[2,-2,1,1]])
+
+def _make_basis(n):
+	u = np.linspace(0,1,n)
+	U = np.column_stack((np.ones(n), u, u**2, u**3))
+	return (U.dot(HERMITE),)
+
+#_basis(n) returns (n x 4) matrix, point i of a curve is its row i times
+#the control points (P0,P1,T0,T1)
+_basis = GridCache(_make_basis)
+
+class NURBS(ParametricAirfoil):
 
-		self.k = k 
+	parameters = ('ta_u', 'ta_l', 'tb_u', 'tb_l', 'alpha_b', 'alpha_c')
 
-		self.ta_u = k['ta_u']
-		self.ta_l = k['ta_l']
-		self.tb_u = k['tb_u']
-		self.tb_l = k['tb_l']
-		self.alpha_b = k['alpha_b']
-		self.alpha_c = k['alpha_c']
+	def __init__(self,k):
+		"""Takes a dictionary of coefficients to define NURBS airfoil.
+		Coefficient names: ta_u,ta_l,tb_u,tb_l,alpha_b,alpha_c """
 
-		'''try:
-			self.coeff = []
-			self.coeff = self._spline()
-			print self.coeff 
-			self._coef()
+		self.k = k
+		try:
+			self.ta_u = k['ta_u']
+			self.ta_l = k['ta_l']
+			self.tb_u = k['tb_u']
+			self.tb_l = k['tb_l']
+			self.alpha_b = k['alpha_b']
+			self.alpha_c = k['alpha_c']
 		except TypeError:
-			raise Warning("Pass a dict with named coefficients")'''
-
-
-	def _spline(self):
-		"""
-		Calculates the spline interpolation for the airfoil params specified
-		"""
-		u = np.linspace(0,1,100)
-		x_u = []
-		y_u = []
-		x_l = []
-		y_l = []
-		temp_var1 = np.array([[1,0,0,0],[0,0,1,0],[-3,3,-2,-1],[2,-2,1,1]])
-		A = [0,0]
-		B = [1,0]
-		ta_u = self.ta_u
-		ta_l = self.ta_l
-		tb_u = self.tb_u
-		tb_l = self.tb_l 
-		alpha_b = self.alpha_b
-		alpha_c = self.alpha_c
+			raise Warning("Pass a dict with named coefficients.\n"+
+			"Explanation:\n"+self.__init__.__doc__)
+		except KeyError, e:
+			raise Warning("{:s} was not defined in the dict".format(e))
+
+	@classmethod
+	def from_params(cls, params):
+		return cls(dict(zip(cls.parameters, params)))
+
+	def __str__(self):
+		"""Gives some information on airfoil"""
+		return ("Airfoil with NURBS parametrization. Coefficients: {}"
+				.format(self.k))
+
+	def _curve(self, basis, T0, T1):
+		"""x and y of the curve from (0,0) to (1,0) with end tangents T0 and
+		T1, (x,y) pairs whose components may be column arrays of a batch"""
+		coords = []
+		for P0, P1, t0, t1 in ((0, 1, T0[0], T1[0]), (0, 0, T0[1], T1[1])):
+			G = np.stack(np.broadcast_arrays(P0, P1, t0, t1), axis=-1)
+			#A batch has control points (N x 1 x 4), evaluate as (N x 4)
+			points = G.reshape(-1, 4).dot(basis.T)
+			coords.append(points[0] if G.ndim == 1 else points)
+		return coords
+
+	@cached
+	def get_coords(self, npts=199):
+		"""Generates coordinates of ceil(npts/2) points per surface, evenly
+		spaced along the curve, which concentrates them at the LE.
+		Returns ([x_lower],[y_lower],[x_upper],[y_upper])"""
+		basis, = _basis(int(np.ceil(npts/2)))
+		ta_u, ta_l, tb_u, tb_l = (np.asarray(t, dtype="float") for t in
+		                          (self.ta_u, self.ta_l, self.tb_u, self.tb_l))
+		alpha_b = np.asarray(self.alpha_b, dtype="float")
+		alpha_c = np.asarray(self.alpha_c, dtype="float")
 
 		#initialize end tangent magnitudes and directions
-		TA_u = [(ta_u*cos(-pi/2)),ta_u*abs(sin(-pi/2))]
-		TB_u = [(tb_u*cos(-((alpha_c+alpha_b)*pi/180))),(tb_u*sin(-((alpha_b+alpha_c)*pi/180)))] 
-		TA_l = [(ta_l*cos(-pi/2)),ta_l*(sin(-pi/2))]
-		TB_l = [(tb_l*cos(-((alpha_c)*pi/180))),(tb_l*sin(-((alpha_c)*pi/180)))] 
-
-		#calculate (x,y) for the upper curve of the airfoil
-		for j in range(2):
-			temp_var =  np.array([[A[j]],[B[j]],[TA_u[j]],[TB_u[j]]]) #control points for x and y coords
-			temp_var_coord = np.dot(temp_var1,temp_var)
-			for i in range(len(u)):
-				temp_var4 = [1,u[i],u[i]**2, pow(u[i],3)]
-				if j==1:
-					x_u.append(np.dot(temp_var4,temp_var_coord)) #calculate x coords
-				else:
-					y_u.append(np.dot(temp_var4,temp_var_coord)) #calculate y coords
-
-		#calculate (x,y) for the lower curve of the airfoil 
-		for j in range(2):
-			temp_var =  np.array([[A[j]],[B[j]],[TA_l[j]],[TB_l[j]]]) #control points for x and y coords
-			temp_var_coord = np.dot(temp_var1,temp_var)
-			for i in range(len(u)):
-				temp_var4 = [1,u[i],u[i]**2, pow(u[i],3)]
-				if j==1:
-					x_l.append(np.dot(temp_var4,temp_var_coord)) #calculate x coords
-				else:
-					y_l.append(np.dot(temp_var4,temp_var_coord)) #calculate y coords
-		#coords = np.array([x_u,y_u,x_l,y_l])
-		coords = np.array([x_l,y_l,x_u,y_u])
-		return coords 
-
-	'''def _coef(self):
-		coeff = self.coeff
-		return coeff '''
-
-
-def _example(): 
+		TA_u = (ta_u*np.cos(-np.pi/2), ta_u*abs(np.sin(-np.pi/2)))
+		TB_u = (tb_u*np.cos(-((alpha_c+alpha_b)*np.pi/180)),
+		        tb_u*np.sin(-((alpha_b+alpha_c)*np.pi/180)))
+		TA_l = (ta_l*np.cos(-np.pi/2), ta_l*np.sin(-np.pi/2))
+		TB_l = (tb_l*np.cos(-(alpha_c*np.pi/180)),
+		        tb_l*np.sin(-(alpha_c*np.pi/180)))
+
+		x_u, y_u = self._curve(basis, TA_u, TB_u)
+		x_l, y_l = self._curve(basis, TA_l, TB_l)
+		return x_l, y_l, x_u, y_u
+
+
+def _example():
 	'''Runs an example'''
 	k ={}
 	#sample coefficients: Coefficients for generating NACA5410
@@ -97,16 +101,16 @@ def _example():
 	k['alpha_c'] = 3.8270
 
 	x = NURBS(k)
-	pts = x._spline()
+	print x
+	print ("Real thickness: {:.1%}".format(x.max_thickness()))
+	print ("Volume: {:.3f} chord^2".format(x.area()))
 
+	import matplotlib.pyplot as plt
 	plt.xlim(0,1)
 	plt.ylim(-.2,.2)
-	colour = np.random.rand(3,1)
-	plt.plot(pts[3],pts[2], color = colour) #plot the spline
-	plt.plot(pts[1],pts[0], color = colour)
-
+	x.plot(plt.gca(), style='b-')
 	plt.show()
 
 #If this file is run, execute example
 if __name__ == "__main__":
-	_example()
\ No newline at end of file
+	_example()
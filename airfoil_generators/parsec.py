@@ -7,10 +7,25 @@ Based on: http://github.com/dqsis/parsec-airfoils
 
 from __future__ import division
 import numpy as np
-from airfoilgen_baseclass import ParametricAirfoil
+from airfoilgen_baseclass import ParametricAirfoil, GridCache, cached, cosine_spacing
+
+# Powers of x in the PARSEC surface polynomials
+PWRS = (1/2, 3/2, 5/2, 7/2, 9/2, 11/2)
+
+def _make_basis(npts):
+    u = cosine_spacing(npts)
+    return u, u[:,np.newaxis]**PWRS
+
+# _basis(npts) returns x-positions u of get_coords(npts) for chord 1 and the
+# matrix u**PWRS (one row per point). A surface of an airfoil with trailing
+# edge at xte is then basis.dot(coeffs * xte**PWRS), as x**p = xte**p * u**p.
+_basis = GridCache(_make_basis)
 
 class PARSEC(ParametricAirfoil):
 
+    parameters = ('xte', 'yte', 'rle', 'x_suc', 'y_suc', 'd2ydx2_suc',
+                  'th_suc', 'x_pre', 'y_pre', 'd2ydx2_pre', 'th_pre')
+
     def __init__(self, k):
         """Takes a dict of coefficients to define PARSEC airfoil.
         Coefficient names: xte, yte, rle, x_suc, y_suc, d2ydx2_suc, th_suc,
@@ -29,61 +44,67 @@ class PARSEC(ParametricAirfoil):
             "Explanation:\n"+self.__init__.__doc__)
         except KeyError, e:
             raise Warning("{:s} was not defined in the dict".format(e))
-    
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(dict(zip(cls.parameters, params)))
+
     def __str__(self):
         """Gives some information on airfoil"""
         return ("Airfoil with PARSEC parametrization. Coefficients: {}"
                 .format(self.k))
 
-    def _fn_upper_lower(self, xpts):
-        return (xpts, self._calc_coords(xpts, self.coeffs_upper),
-                xpts, self._calc_coords(xpts, self.coeffs_lower))
-
-    def _calc_coords(self, xpts, coeffs):
-        # Powers to raise coefficients to. from __future___ import division!
-        pwrs = (1/2, 3/2, 5/2, 7/2, 9/2, 11/2)
-        # Make [[1,1,1,1],[2,2,2,2],...] style array
-        xptsgrid = np.meshgrid(np.arange(len(pwrs)), xpts)[1]
-        # Evaluate points with concise matrix calculations.
-        # One x-coordinate is evaluated for every row in xptsgrid
-        return np.sum(coeffs*xptsgrid**pwrs, axis=1)
+    @cached
+    def get_coords(self, npts=161):
+        """As ParametricAirfoil.get_coords, but evaluates each surface as one
+        product with the cached basis matrix of the grid, see _basis()"""
+        u, basis = _basis(npts)
+        xpts = u * self.xte
+        scale = np.asarray(self.xte, dtype="float")[...,np.newaxis]**PWRS
+        def surface(coeffs):
+            # A batch has coefficients (N x 1 x 6), evaluate as (N x 6)
+            return (coeffs*scale).reshape(-1, len(PWRS)).dot(basis.T) \
+                .reshape(np.shape(xpts))
+        return (xpts, surface(self.coeffs_lower),
+                xpts, surface(self.coeffs_upper))
 
     def _pcoef(self, xte, yte, rle, x_cre, y_cre, d2ydx2_cre, th_cre, surface):
-        """Evaluate the PARSEC coefficients.
+        """Evaluate the PARSEC coefficients. Arguments may be arrays of the
+        same shape, the coefficients of all airfoils are then solved at once
+        and returned with shape + (6,).
         From https://github.com/dqsis/parsec-airfoils
         """
+        xte, yte, rle, x_cre, y_cre, d2ydx2_cre, th_cre = np.broadcast_arrays(
+            *[np.asarray(a, dtype="float") for a in
+              (xte, yte, rle, x_cre, y_cre, d2ydx2_cre, th_cre)])
         # Initialize coefficients
-        coef = np.zeros(6)
+        coef = np.zeros(xte.shape + (6,))
 
         # 1st coefficient depends on surface (pressure or suction)
         if surface == 'pressure':
-            coef[0] = -np.sqrt(2*rle)
+            coef[...,0] = -np.sqrt(2*rle)
         elif surface == 'suction':
-            coef[0] = np.sqrt(2*rle)
-
-        # Form system of equations
-        A = np.array([
-                     [xte**1.5, xte**2.5, xte**3.5, xte**4.5, xte**5.5],
-                     [x_cre**1.5, x_cre**2.5, x_cre**3.5, x_cre**4.5, 
-                      x_cre**5.5],
-                     [1.5*np.sqrt(xte), 2.5*xte**1.5, 3.5*xte**2.5, 
-                      4.5*xte**3.5, 5.5*xte**4.5],
-                     [1.5*np.sqrt(x_cre), 2.5*x_cre**1.5, 3.5*x_cre**2.5, 
-                      4.5*x_cre**3.5, 5.5*x_cre**4.5],
-                     [0.75*(1/np.sqrt(x_cre)), 3.75*np.sqrt(x_cre), 8.75*x_cre**1.5, 
-                      15.75*x_cre**2.5, 24.75*x_cre**3.5]
-                     ])
-        B = np.array([
-                     [yte - coef[0]*np.sqrt(xte)],
-                     [y_cre - coef[0]*np.sqrt(x_cre)],
-                     [np.tan(th_cre*np.pi/180) - 0.5*coef[0]*(1/np.sqrt(xte))],
-                     [-0.5*coef[0]*(1/np.sqrt(x_cre))],
-                     [d2ydx2_cre + 0.25*coef[0]*x_cre**(-1.5)]
-                     ])
-        # Solve system of linear equations
-        X = np.linalg.solve(A,B) 
+            coef[...,0] = np.sqrt(2*rle)
+        c0 = coef[...,0]
+
+        # Form system of equations, one 5x5 matrix per airfoil. Rows are
+        # y and dy/dx at the TE, y, dy/dx and d2y/dx2 at the crest, for the
+        # terms x**p of coefficients 1 to 5
+        p = np.array(PWRS[1:])
+        xte_, x_cre_ = xte[...,np.newaxis], x_cre[...,np.newaxis]
+        A = np.stack([xte_**p, x_cre_**p, p*xte_**(p-1), p*x_cre_**(p-1),
+                      p*(p-1)*x_cre_**(p-2)], axis=-2)
+        B = np.stack([
+            yte - c0*np.sqrt(xte),
+            y_cre - c0*np.sqrt(x_cre),
+            np.tan(th_cre*np.pi/180) - 0.5*c0*(1/np.sqrt(xte)),
+            -0.5*c0*(1/np.sqrt(x_cre)),
+            d2ydx2_cre + 0.25*c0*x_cre**(-1.5)
+            ], axis=-1)
+        # Solve systems of linear equations, all at once
+        X = np.linalg.solve(A, B[...,np.newaxis])
         # Gather all coefficients
-        coef[1:6] = X[0:5,0]
+        coef[...,1:6] = X[...,0]
         # Return coefficients
         return coef
 
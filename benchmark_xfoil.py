@@ -0,0 +1,219 @@
+"""
+Benchmark of the XFOIL interface hot path. Times the parts of one evaluation
+separately, for every binary given (default: the XFOIL binary and the
+fake_xfoil.py stand-in):
+
+  spawn       XfoilSession construction, i.e. Xfoil.__init__ plus PLOP
+  startup     From spawn until XFOIL answers its first command
+  roundtrip   One command round trip in the OPER menu
+  setup       oper_setup and new_polar round trip
+  load        LOAD of a 161 point airfoil file
+  solve_alfa  Time per operating point, one ALFA command per point
+  solve_aseq  Time per operating point, all points in one ASEQ command
+  list        PLIS round trip
+  parse       parse_stdout_polar of the PLIS output
+  teardown    Killing and reaping XFOIL
+
+Every phase is timed once per repeat (solve_alfa once per point), results
+are reported as percentiles in ms and saved as JSON. Given a baseline JSON
+from an earlier run, phases with a median that got slower than the
+tolerance are reported and the exit code is 1.
+
+Usage, e.g.:
+  python benchmark_xfoil.py --repeats 50 --output new.json --baseline old.json
+"""
+
+from __future__ import division, print_function
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from time import time
+import numpy as np
+from airfoil_generators import naca4series
+from xfoil import xfoil
+
+PHASES = ('spawn', 'startup', 'roundtrip', 'setup', 'load', 'solve_alfa',
+          'solve_aseq', 'list', 'parse', 'teardown')
+PERCENTILES = (50, 90, 99)
+
+
+class BenchmarkError(Exception): pass
+
+
+def _roundtrip(session, timeout):
+    """Waits until XFOIL processed all commands sent so far"""
+    if not session.ping(timeout):
+        raise BenchmarkError("XFOIL did not answer within {} s"
+                             .format(timeout))
+
+def bench_session(samples, path, binary, airfoil, alphas, Re, iterlim,
+                  parse_repeats=10, timeout=60):
+    """Runs one session through all phases, appends times [s] to the lists
+       in dict samples"""
+    def record(phase, start):
+        samples[phase].append(time() - start)
+
+    start = time()
+    session = xfoil.XfoilSession(path, binary)
+    record('spawn', start)
+    try:
+        _roundtrip(session, timeout)
+        record('startup', start)
+
+        start = time()
+        session.load(airfoil)
+        _roundtrip(session, timeout)
+        record('load', start)
+
+        start = time()
+        session.oper_setup(Re, iterlim=iterlim)
+        session.new_polar()
+        _roundtrip(session, timeout)
+        record('setup', start)
+
+        start = time()
+        _roundtrip(session, timeout)
+        record('roundtrip', start)
+
+        for alpha in alphas:
+            start = time()
+            session.solve(xfoil.PCMDS['ALFA'], alpha)
+            _roundtrip(session, timeout)
+            record('solve_alfa', start)
+
+        session.new_polar()
+        step = alphas[1] - alphas[0] if len(alphas) > 1 else 1
+        start = time()
+        session.solve(xfoil.PCMDS['ALFA'], [alphas[0], alphas[-1], step])
+        _roundtrip(session, timeout)
+        samples['solve_aseq'].append((time() - start) / len(alphas))
+
+        start = time()
+        session.start_listing()
+        lines = session.read_until("ENDD", timeout)
+        record('list', start)
+
+        for i in range(parse_repeats):
+            start = time()
+            xfoil.parse_stdout_polar(lines)
+            record('parse', start)
+    finally:
+        start = time()
+        session.close()
+        record('teardown', start)
+
+def bench_binary(path, binary, repeats, airfoil, alphas, Re, iterlim):
+    """Returns dict of phase: list of times [s]"""
+    samples = dict((phase, []) for phase in PHASES)
+    for i in range(repeats):
+        bench_session(samples, path, binary, airfoil, alphas, Re, iterlim)
+    return samples
+
+def summarize(times):
+    """Percentiles, mean, min and max of times [s] in ms"""
+    times = np.asarray(times) * 1E3
+    if not len(times):
+        return {'n': 0}
+    summary = {'n': len(times), 'mean': times.mean(), 'min': times.min(),
+               'max': times.max()}
+    for p in PERCENTILES:
+        summary['p{}'.format(p)] = np.percentile(times, p)
+    return summary
+
+def report(binary, summaries):
+    print("\n{} (times in ms)".format(binary))
+    columns = ['n', 'mean', 'min'] + ['p{}'.format(p)
+                                      for p in PERCENTILES] + ['max']
+    print(" "*12 + "".join("{:>10s}".format(c) for c in columns))
+    for phase in PHASES:
+        summary = summaries[phase]
+        row = ["{:>10d}".format(summary['n'])]
+        for c in columns[1:]:
+            row.append("{:10.3f}".format(summary[c]) if c in summary
+                       else "{:>10s}".format('-'))
+        print("{:12s}".format(phase) + "".join(row))
+
+def regressions(results, baseline, tolerance):
+    """Lists (binary, phase, old, new) of medians that got slower than
+       1+tolerance times the baseline median"""
+    slower = []
+    for binary, summaries in results['binaries'].items():
+        for phase, summary in summaries.items():
+            try:
+                old = baseline['binaries'][binary][phase]['p50']
+            except KeyError:
+                continue
+            new = summary.get('p50')
+            if new is not None and new > old * (1 + tolerance):
+                slower.append((binary, phase, old, new))
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--binary', action='append',
+                        help="binary in --path to benchmark, repeatable "
+                             "(default: {} and fake_xfoil.py)"
+                             .format(xfoil.XFOIL_BIN))
+    parser.add_argument('--path', default=xfoil._XFOIL_PATH)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--alphas', type=int, default=10,
+                        help="number of operating points, 0 to 9 deg")
+    parser.add_argument('--Re', type=float, default=1E6)
+    parser.add_argument('--iterlim', type=int, default=100)
+    parser.add_argument('--output', default='benchmark_xfoil.json')
+    parser.add_argument('--baseline', help="JSON results to compare with")
+    parser.add_argument('--tolerance', type=float, default=.2,
+                        help="allowed relative slowdown of medians")
+    args = parser.parse_args(argv)
+
+    binaries = args.binary or [xfoil.XFOIL_BIN, 'fake_xfoil.py']
+    alphas = list(np.linspace(0, 9, args.alphas))
+    airfoil_file = tempfile.NamedTemporaryFile('w', suffix='.dat',
+                                               delete=False)
+    with airfoil_file:
+        airfoil_file.write(naca4series.NACA4(2, 4, 12).get_coords_plain())
+
+    results = {'time': time(), 'platform': platform.platform(),
+               'python': platform.python_version(),
+               'repeats': args.repeats, 'alphas': args.alphas,
+               'Re': args.Re, 'iterlim': args.iterlim, 'binaries': {}}
+    try:
+        for binary in binaries:
+            if not os.path.exists(os.path.join(args.path, binary)):
+                print("Skipping {}, not found in {}".format(binary,
+                                                            args.path))
+                continue
+            try:
+                samples = bench_binary(args.path, binary, args.repeats,
+                                       airfoil_file.name, alphas, args.Re,
+                                       args.iterlim)
+            except (OSError, BenchmarkError) as e:
+                print("Skipping {}: {}".format(binary, e))
+                continue
+            summaries = dict((phase, summarize(samples[phase]))
+                             for phase in PHASES)
+            results['binaries'][binary] = summaries
+            report(binary, summaries)
+    finally:
+        os.remove(airfoil_file.name)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("\nResults saved to {}".format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(results, baseline, args.tolerance)
+        for binary, phase, old, new in slower:
+            print("REGRESSION {} {}: median {:.3f} ms -> {:.3f} ms".format(
+                binary, phase, old, new))
+        if slower:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
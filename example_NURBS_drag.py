@@ -14,28 +14,6 @@ Cl = 0.2
 
 drags = np.zeros((5,3))
 
-def get_coords_plain(argv):
-	x_l = argv[0]
-	y_l = argv[1]
-	x_u = argv[2]
-	y_u = argv[3]
-	ycoords = np.append(y_l[::-1], y_u[1:])
-	xcoords = np.append(x_l[::-1], x_u[1:])
-	coordslist = np.array((xcoords, ycoords)).T
-	coordstrlist = ["{:.6f} {:.6f}".format(coord[1], coord[0])
-					for coord in coordslist]
-	return '\n'.join(coordstrlist)
-'''k= {}
-k['ta_u'] = 0.1584
-k['ta_l'] = 0.1565
-k['tb_u'] = 2.1241
-k['tb_l'] = 1.8255
-k['alpha_b'] = 11.6983
-k['alpha_c'] = 3.8270
-x = NURBS(k)
-pts = x._spline()
-coords = get_coords_plain(pts)
-'''
 ta_u = 0.1584
 ta_l = 0.1565
 tb_u = np.linspace(1.8,2.2,6)
@@ -53,15 +31,14 @@ for i in xrange(1,6):
 		k['tb_l'] = 1.8255
 		k['alpha_b'] = alpha_b[j]
 		k['alpha_c'] = 3.8270
-		af = NURBS(k)
-		airfoil = af._spline()
+		airfoil = NURBS(k)
 
 		#make unique filename
 		temp_af_filename = "temp_airfoil_{}{}.dat".format(i,j)
 
 		#Save coordinates
 		with open(temp_af_filename, 'w') as af:
-			af.write(get_coords_plain(airfoil))
+			af.write(airfoil.get_coords_plain())
 
 		#Let Xfoil do its thing 
 		polar = oper_visc_cl(temp_af_filename, Cl, Re,iterlim=1000)
@@ -73,14 +50,11 @@ for i in xrange(1,6):
 			raise Warning("Shit! XFOIL didn't converge on NACA{}{}15 at Cl={}."
 							.format(i,j,Cl))
  
-		xl = airfoil[0]
-		yl = airfoil[1]
-		xu = airfoil[2]
-		yu = airfoil[3]
+		xl, yl, xu, yu = airfoil.get_coords()
 		def translated_plt(x, y, *args):
 			plt.plot(x*0.8 + (j-.9), y*0.8 + (i-0.5) , *args)
-		translated_plt(yl, xl, 'w')
-		translated_plt(yu, xu, 'w')
+		translated_plt(xl, yl, 'w')
+		translated_plt(xu, yu, 'w')
 		
 		os.remove(temp_af_filename)
 
@@ -0,0 +1,96 @@
+"""
+Comparison of the optimizers on the high Re low drag PARSEC airfoil of
+example_pso_drag_highRe.py. Every optimizer scores S airfoils per generation
+through the same pool of XFOIL processes, for the same number of
+generations. Reported is the wall-clock time each needed to reach the
+target drag coefficient, and the best drag found.
+"""
+
+from __future__ import division, print_function
+from os import remove
+from time import time
+import numpy as np
+from string import ascii_uppercase
+from random import choice
+from optimization_algorithms.pso import PSO
+from optimization_algorithms.de import DifferentialEvolution
+from optimization_algorithms.cmaes import CMAES
+from optimization_algorithms.annealing import SimulatedAnnealing
+from optimization_algorithms.executors import make_executor
+from airfoil_generators import parsec
+from xfoil import xfoil
+
+Re = 1E6
+constraints = np.array((
+#rle        x_pre/suc    d2ydx2_pre/suc  th_pre/suc
+(.015,.05), (.3,.75),     (-2,.2),          (0,40)
+))
+iterations, S = 12, 12
+target_Cd = .0062
+
+def construct_airfoil(*pts):
+    k = {}
+    k['rle'] = pts[0]
+    k['x_pre'] = pts[1]
+    # Thickness 21%
+    k['y_pre'] = -.105
+    k['d2ydx2_pre'] = -pts[2]
+    # Trailing edge angle
+    k['th_pre'] = pts[3]
+    # Suction part
+    k['x_suc'] = k['x_pre']
+    k['y_suc'] = -k['y_pre']
+    k['d2ydx2_suc'] = -k['d2ydx2_pre']
+    k['th_suc'] = -k['th_pre']
+    # Trailing edge x and y position
+    k['xte'] = 1
+    k['yte'] = 0
+    return parsec.PARSEC(k)
+
+def score_pts(pts):
+    # Make unique filename
+    randstr = ''.join(choice(ascii_uppercase) for i in range(20))
+    filename = "parsec_{}.dat".format(randstr)
+    with open(filename, 'w') as af:
+        af.write(construct_airfoil(*pts).get_coords_plain())
+    polar = xfoil.oper_visc_alpha(filename, 0, Re,
+                                  iterlim=80, show_seconds=0)
+    remove(filename)
+    try:
+        score = polar[0][0][2]
+    except IndexError:
+        return None
+    return score if np.isfinite(score) else None
+
+executor = make_executor('thread')
+results = []
+for name, optimizer in (
+        ("PSO", PSO(score_pts, constraints, S, -0.2, 0, 2.8,
+                    executor=executor)),
+        ("Differential evolution", DifferentialEvolution(constraints, S)),
+        ("CMA-ES", CMAES(constraints, lam=S)),
+        ("Simulated annealing", SimulatedAnnealing(constraints, S))):
+    start = time()
+    reached = []
+    def check_target(optimizer, scores):
+        if not reached and optimizer.bestscore <= target_Cd:
+            reached.append(time() - start)
+        print("{}, generation {}: best Cd {}".format(
+            name, optimizer.generation, optimizer.bestscore))
+    if isinstance(optimizer, PSO):
+        optimizer.callback = check_target
+        optimizer.run(iterations)
+    else:
+        optimizer.run(score_pts, iterations, executor, check_target)
+    results.append((name, reached[0] if reached else None,
+                    optimizer.bestscore, optimizer.evaluations,
+                    time() - start))
+executor.close()
+
+print("\nTarget Cd = {}".format(target_Cd))
+print("{:24s}{:>14s}{:>10s}{:>13s}{:>10s}".format(
+    "", "to target [s]", "best Cd", "evaluations", "total [s]"))
+for name, to_target, bestscore, evaluations, total in results:
+    print("{:24s}{:>14s}{:10.5f}{:13d}{:10.1f}".format(
+        name, "-" if to_target is None else "{:.1f}".format(to_target),
+        bestscore, evaluations, total))
@@ -6,11 +6,13 @@ the PARSEC airfoil parametrization. Trying to find high Re low drag airfoil.
 from __future__ import division, print_function
 from os import remove
 import numpy as np
-from copy import copy
 from string import ascii_uppercase
 from random import choice
 import matplotlib.pyplot as plt
-from optimization_algorithms.pso import Particle
+from optimization_algorithms.pso import PSO
+from optimization_algorithms.plotting import GenerationPlot
+from optimization_algorithms.executors import make_executor
+from optimization_algorithms.memo import EvaluationMemo
 from airfoil_generators import parsec
 from xfoil import xfoil
 
@@ -71,74 +73,22 @@ def score_airfoil(airfoil):
         print("Return None (IndexError)")
         return None
 
-# Show plot and make redrawing possible
-fig, (cur_afplt, lastpbest_afplt, gbest_afplt, score_plt) = plt.subplots(4,1)
-# Enable auto-clearing
-cur_afplt.hold(False)
-lastpbest_afplt.hold(False)
-gbest_afplt.hold(False)
-plt.tight_layout()
-# Interactive mode
-plt.ion()
-#plt.pause(.0001)
+def score_pts(pts):
+    """Score of particle position, None if not converged"""
+    return score_airfoil(construct_airfoil(*pts))
 
-# Initialize globals
-global_bestscore   = None
-global_bestpos     = None
-global_bestairfoil = None
-
-# Constructing a particle automatically initializes position and speed
-particles = [Particle(constraints) for i in xrange(0, S)]
-
-scores_y = []
-
-for n in xrange(iterations+1):
-    print("\nIteration {}".format(n))
-    for i_par, particle in enumerate(particles):
-        # Keep scoring until converged
-        score = None
-        while not score:
-            # Update particle's velocity and position, if global best
-            if global_bestscore:
-                print("Update particle")
-                particle.update(global_bestpos, omega, theta_p, theta_g)
-            # None if not converged
-            airfoil = construct_airfoil(*particle.pts)
-            score = score_airfoil(airfoil)
-            plotstyle = "{}-".format(choice("rgb"))
-            airfoil.plot(cur_afplt, score="Cd {}".format(score), style=plotstyle,
-                         title="Current, particle n{}p{}".format(n, i_par))
-            #plt.pause(.0001)
-            if not score and (not global_bestscore or n==0):
-                print("Not converged, no global best, or first round. Randomizing particle.")
-                particle.randomize()
-            elif not score:
-                print("Not converged, there is a global best. Randomizing.")
-                particle.randomize()
-
-        if not particle.bestscore or score < particle.bestscore:
-            particle.new_best(score)
-            txt = 'particle best'
-            airfoil.plot(lastpbest_afplt, score="Cd {}".format(score), style=plotstyle,
-            title="Particle best, particle n{}p{}".format(n, i_par))
-            #plt.pause(.0001)
-            print("Found particle best, score {}".format(score))
-        if not global_bestscore or score < global_bestscore:
-            global_bestscore = score
-            # Copy to avoid globaL_bestpos becoming reference to array
-            global_bestpos = copy(particle.pts)
-            txt = 'global best'
-            airfoil.plot(gbest_afplt, score="Cd {}".format(score), style=plotstyle,
-              title="Global best, particle n{}p{}".format(n, i_par))
-            #plt.pause(.0001)
-            print("Found global best, score {}".format(score))
-            global_bestairfoil = airfoil
-        
-    scores_y.append(global_bestscore)
-    score_plt.plot(scores_y, 'r-')
-    score_plt.set_title("Global best per round")
-    plt.pause(.0001)
+plot_generation = GenerationPlot(construct_airfoil)
 
+executor = make_executor('thread')
+# Particles clamped to the constraints often land on the same position,
+# score those only once
+memo = EvaluationMemo(tolerance=(constraints[:,1] - constraints[:,0]) * 1E-3)
+pso = PSO(score_pts, constraints, S, omega, theta_p, theta_g,
+          executor=executor, callback=plot_generation, memo=memo)
+global_bestscore, global_bestpos = pso.run(iterations)
+executor.close()
+print("{} scores taken from memo".format(memo.hits))
+airfoil = construct_airfoil(*global_bestpos)
 
 print("Best airfoil found for Re={}, ".format(Re),
       "score = ", global_bestscore,
@@ -6,11 +6,12 @@ Trying to find high Re low drag airfoil.
 from __future__ import division, print_function 
 from os import remove 
 import numpy as np 
-from copy import copy
 from string import ascii_uppercase
 from random import choice
 import matplotlib.pyplot as plt
-from optimization_algorithms.pso import Particle
+from optimization_algorithms.pso import PSO
+from optimization_algorithms.plotting import GenerationPlot
+from optimization_algorithms.executors import make_executor
 from airfoil_generators import nurbs 
 from xfoil import xfoil 
 
@@ -33,38 +34,13 @@ def construct_airfoil(*pts):
 	k['alpha_c'] = 3.8270
 	return nurbs.NURBS(k)
 
-def plot(argv, ax, score=None, title=None, style='r-'):
-	x_l = argv[0]
-	y_l = argv[1]
-	x_u = argv[2]
-	y_u = argv[3]
-	ax.set_xlim(0,1)
-	ax.plot(y_l, x_l, style, y_u, x_u, style, linewidth=2)
-	if score:
-		ax.annotate(str(score), (.4,0))
-	if title:
-		ax.set_title(title)
-
-def get_coords_plain(argv):
-	x_l = argv[0]
-	y_l = argv[1]
-	x_u = argv[2]
-	y_u = argv[3]
-	ycoords = np.append(y_l[::-1], y_u[1:])
-	xcoords = np.append(x_l[::-1], x_u[1:])
-	coordslist = np.array((xcoords, ycoords)).T
-	coordstrlist = ["{:.6f} {:.6f}".format(coord[1], coord[0])
-					for coord in coordslist]
-
-	return '\n'.join(coordstrlist)
-
 def score_airfoil(airfoil):
 	# Make unique filename
 	randstr = ''.join(choice(ascii_uppercase) for i in range(20))
 	filename = "parsec_{}.dat".format(randstr)
 	# Save coordinates
 	with open(filename, 'w') as af:
-		af.write(get_coords_plain(airfoil._spline()))
+		af.write(airfoil.get_coords_plain())
 	#Let Xfoil do its magic 
 	polar = xfoil.oper_visc_alpha(filename,0,Re,
 									iterlim =80, show_seconds =0)
@@ -88,75 +64,22 @@ def score_airfoil(airfoil):
 		print("Return None (IndexError)")
 		return None 
 
-# Show plot and make redrawing possible
-fig, (cur_afplt, lastpbest_afplt, gbest_afplt, score_plt) = plt.subplots(4,1)
-# Enable auto-clearing
-cur_afplt.hold(False)
-lastpbest_afplt.hold(False)
-gbest_afplt.hold(False)
-plt.tight_layout()
-# Interactive mode
-plt.ion()
-#plt.pause(.0001)
-
-# Initialize globals
-global_bestscore   = None
-global_bestpos     = None
-global_bestairfoil = None
-
-# Constructing a particle automatically initializes position and speed
-particles = [Particle(constraints) for i in xrange(0, S)]
-
-scores_y = []
-
-for n in xrange(iterations+1):
-	print("\nIteration {}".format(n))
-	for i_par, particle in enumerate(particles):
-		# Keep scoring until converged
-		score = None 
-		while not score: 
-			if global_bestscore:
-				print("Update Particle")
-				particle.update(global_bestpos,omega,theta_p,theta_g)
-			airfoil = construct_airfoil(*particle.pts)
-			score = score_airfoil(airfoil)
-			plotstyle = "{}-".format(choice("rgb"))
-			af = airfoil._spline()
-			plot(af,cur_afplt, score="Cd {}".format(score), style=plotstyle,
-						  title="Current, particle n{}p{}".format(n, i_par))
-
-			if not score and (not global_bestscore or n==0):
-				print("Not converged, no global best, or first round. Randomizing particle.")
-				particle.randomize()
+def score_pts(pts):
+	"""Score of particle position, None if not converged"""
+	return score_airfoil(construct_airfoil(*pts))
 
-			elif not score:
-				print("Not converged, there is a global best. Randomizing.")
-				particle.randomize()
+plot_generation = GenerationPlot(construct_airfoil)
 
-		if not particle.bestscore or score < particle.bestscore:
-			particle.new_best(score)
-			txt = 'particle best'
-			plot(af,lastpbest_afplt, score="Cd {}".format(score), style=plotstyle,
-			title="Particle best, particle n{}p{}".format(n, i_par))
-			print("Found particle best, score {}".format(score))
-		if not global_bestscore or score < global_bestscore:
-			global_bestscore = score
-			# Copy to avoid globaL_bestpos becoming reference to array
-			global_bestpos = copy(particle.pts)
-			txt = 'global best'
-			plot(af, gbest_afplt, score="Cd {}".format(score), style=plotstyle,
-			  title="Global best, particle n{}p{}".format(n, i_par))
-			#plt.pause(.0001)
-			print("Found global best, score {}".format(score))
-			global_bestairfoil = airfoil	
-	scores_y.append(global_bestscore)
-	score_plt.plot(scores_y, 'r-')
-	score_plt.set_title("Global best per round")
-	plt.pause(.0001)
+executor = make_executor('thread')
+pso = PSO(score_pts, constraints, S, omega, theta_p, theta_g,
+		  executor=executor, callback=plot_generation)
+global_bestscore, global_bestpos = pso.run(iterations)
+executor.close()
+airfoil = construct_airfoil(*global_bestpos)
 
 print("Best airfoil found for Re={}, ".format(Re),
       "score = ", global_bestscore,
       ", pos = ", global_bestpos.__repr__(),
-      ", airfoil points:\n{}".format(get_coords_plain(af)))
+      ", airfoil points:\n{}".format(airfoil.get_coords_plain()))
 
 plt.show()
\ No newline at end of file
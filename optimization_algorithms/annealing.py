@@ -0,0 +1,62 @@
+"""
+Simulated annealing with many independent chains, with the ask/tell
+interface of ask_tell.py. Every generation asks for one proposal per chain,
+a normally distributed step from its current position. A chain moves to its
+proposal if that scores better, or with probability exp(-increase/T) if it
+scores worse. The temperature T falls by factor cooling every generation,
+and the step size shrinks with the square root of T.
+
+All chains of a generation are scored together, so they keep a parallel
+XFOIL backend busy the way a swarm does.
+"""
+
+from __future__ import division
+import numpy as np
+from ask_tell import AskTellOptimizer
+
+
+class SimulatedAnnealing(AskTellOptimizer):
+    '''
+    chains  -> Number of independent chains, positions per generation
+    T0      -> Initial temperature, default the standard deviation of the
+               initial scores
+    cooling -> Temperature factor per generation
+    step    -> Initial step size, fraction of the constraint range
+    '''
+    def __init__(self, constraints, chains=20, T0=None, cooling=.9,
+                 step=.2, random_state=None):
+        AskTellOptimizer.__init__(self, constraints, random_state)
+        self.T0, self.T = T0, T0
+        self.cooling = cooling
+        self.step = step
+        D = len(self.constraints)
+        self.pts = self.random.uniform(self.lower, self.upper, (chains, D))
+        self.scores = None
+
+    def ask(self):
+        '''Initial positions first, then one proposal per chain'''
+        if self.scores is None:
+            return self.pts.copy()
+        scale = self.step * np.sqrt(self.T / self.T0) * self.absrange
+        return self._clip(self.pts + scale *
+                          self.random.normal(size=self.pts.shape))
+
+    def _tell(self, X, scores):
+        if self.scores is None:
+            self.pts, self.scores = X.copy(), scores
+            if self.T0 is None:
+                finite = scores[np.isfinite(scores)]
+                self.T0 = finite.std() if len(finite) > 1 else 1.
+                self.T0 = self.T0 or 1.
+            self.T = self.T0
+            return
+        with np.errstate(invalid='ignore', over='ignore'):
+            increase = np.where(np.isfinite(self.scores),
+                                scores - self.scores, -np.inf)
+            accept = np.isfinite(scores) & (
+                (increase <= 0) |
+                (self.random.uniform(size=len(scores)) <
+                 np.exp(-increase / self.T)))
+        self.pts[accept] = X[accept]
+        self.scores[accept] = scores[accept]
+        self.T *= self.cooling
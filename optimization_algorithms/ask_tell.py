@@ -0,0 +1,146 @@
+"""
+Ask/tell interface shared by the batch optimizers (de.py, cmaes.py,
+annealing.py): ask() returns a batch of candidate positions, tell() takes
+their scores. The optimizer never calls the score function itself, so any
+engine can be driven by the same evaluation backend: run() scores every
+batch concurrently through an executor (see executors.py), optionally with
+a memo (see memo.py).
+
+    optimizer = DifferentialEvolution(constraints, S=20)
+    bestscore, bestpos = optimizer.run(score, iterations,
+                                       executor=make_executor('thread'))
+
+or driving it by hand:
+
+    for n in range(iterations+1):
+        X = optimizer.ask()
+        optimizer.tell(X, [score(pts) for pts in X])
+
+Scores are minimized, None or nan marks a position that couldn't be scored
+(e.g. XFOIL didn't converge), which ranks below every scored position.
+"""
+
+from __future__ import division
+import numpy as np
+from executors import SerialExecutor, score_batch
+
+
+class AskTellOptimizer(object):
+    '''
+    Base class of the ask/tell optimizers. Subclasses implement ask() and
+    _tell(X, scores), this class keeps the global best, the number of
+    generations and the evaluation log.
+    The constraint array c is organized as [[low,high],[low,high]].
+    random_state is a seed or numpy RandomState, default np.random.
+    '''
+    def __init__(self, constraints, random_state=None):
+        self.constraints = np.asarray(constraints, dtype="float")
+        self.lower = self.constraints[:,0]
+        self.upper = self.constraints[:,1]
+        self.absrange = abs(self.upper-self.lower)
+        if random_state is None:
+            random_state = np.random
+        elif not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        self.random = random_state
+        self.bestscore = np.inf
+        self.bestpos = None
+        self.generation = 0
+        self.evaluations = 0
+        self.failures = 0
+        self.candidates = None
+        # (generation, position, score) of every evaluation by run()
+        self.log = []
+
+    def ask(self):
+        '''Candidate positions to score, (N x D) array'''
+        raise Warning("""In child class,
+        implement ask and _tell.""")
+
+    def tell(self, X, scores):
+        '''Scores of the positions X returned by the last ask()'''
+        X = np.asarray(X, dtype="float")
+        scores = np.array([np.nan if s is None else s for s in scores],
+                          dtype="float")
+        ranked = np.where(np.isfinite(scores), scores, np.inf)
+        i = np.argmin(ranked)
+        if ranked[i] < self.bestscore:
+            self.bestscore = ranked[i]
+            self.bestpos = X[i].copy()
+        self._tell(X, scores)
+        self.generation += 1
+
+    def _tell(self, X, scores):
+        raise Warning("""In child class,
+        implement ask and _tell.""")
+
+    def _clip(self, X):
+        '''Positions X moved onto the constraint box where outside it'''
+        return np.clip(X, self.lower, self.upper)
+
+    def run(self, score, iterations, executor=None, callback=None,
+            memo=None):
+        '''
+        Ask, score concurrently and tell iterations+1 times, like PSO.run.
+        callback(optimizer, scores) is called after every generation, like
+        PSO's, the scored positions are in optimizer.candidates.
+        Returns global best score and position.
+        '''
+        if executor is None:
+            executor = SerialExecutor()
+        for n in range(iterations+1):
+            X = self.candidates = self.ask()
+            scores, scored = score_batch(score, list(X), executor, memo)
+            self.evaluations += len(scored)
+            for j in scored:
+                self.failures += not np.isfinite(scores[j])
+                self.log.append((self.generation, X[j].copy(), scores[j]))
+            self.tell(X, scores)
+            if callback is not None:
+                callback(self, scores)
+        return self.bestscore, self.bestpos
+
+
+def _finite_ranks(scores):
+    '''Order of scores from best to worst, nan last'''
+    return np.argsort(np.where(np.isfinite(scores), scores, np.inf),
+                      kind='mergesort')
+
+
+def test():
+    '''Unit tests for the ask/tell optimizers.'''
+    from de import DifferentialEvolution
+    from cmaes import CMAES
+    from annealing import SimulatedAnnealing
+    from memo import EvaluationMemo
+    c = ((-5,5),)*4
+    def sphere(pts):
+        return float(np.sum((pts - 1)**2))
+    def failing_sphere(pts):
+        return None if pts[0] < -3 else sphere(pts)
+    engines = (lambda: DifferentialEvolution(c, 20, random_state=1),
+               lambda: CMAES(c, random_state=1),
+               lambda: SimulatedAnnealing(c, 20, random_state=1))
+    for make in engines:
+        optimizer = make()
+        bestscore, bestpos = optimizer.run(failing_sphere, 60)
+        assert bestscore < .1, (type(optimizer).__name__, bestscore)
+        assert ((bestpos >= -5) & (bestpos <= 5)).all()
+        assert optimizer.generation == 61 and optimizer.failures > 0
+        assert len(optimizer.log) == optimizer.evaluations
+        # Reproducible for a given seed, by hand or through run()
+        other = make()
+        for n in range(61):
+            X = other.ask()
+            other.tell(X, [failing_sphere(pts) for pts in X])
+        assert other.bestscore == bestscore
+        # Memoized positions aren't scored again
+        optimizer = make()
+        memo = EvaluationMemo(.5)
+        optimizer.run(failing_sphere, 20, memo=memo)
+        assert optimizer.evaluations == len(memo)
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print("Tests succeeded.")
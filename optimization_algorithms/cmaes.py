@@ -0,0 +1,92 @@
+"""
+CMA-ES, covariance matrix adaptation evolution strategy, with the ask/tell
+interface of ask_tell.py. Every generation asks for lam positions drawn
+from a multivariate normal distribution, whose mean, covariance and step
+size are adapted to the best half of them. Works in coordinates scaled to
+the unit box of the constraints; positions outside it are moved onto it,
+and the distribution is updated with the moved positions.
+
+Hansen: The CMA Evolution Strategy: A Tutorial, 2016,
+http://arxiv.org/abs/1604.00772
+"""
+
+from __future__ import division
+import numpy as np
+from ask_tell import AskTellOptimizer, _finite_ranks
+
+
+class CMAES(AskTellOptimizer):
+    '''
+    sigma -> Initial step size in unit box coordinates, about a quarter of
+             the box is a good start
+    lam   -> Positions per generation, default 4+3*ln(D)
+    mean  -> Initial mean position, default random within the constraints
+    '''
+    def __init__(self, constraints, sigma=.3, lam=None, mean=None,
+                 random_state=None):
+        AskTellOptimizer.__init__(self, constraints, random_state)
+        D = len(self.constraints)
+        self.lam = lam or 4 + int(3*np.log(D))
+        mu = self.lam // 2
+        weights = np.log(mu + .5) - np.log(np.arange(1, mu+1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / (self.weights**2).sum()
+        mueff = self.mueff
+        # Learning rates and damping, defaults from Hansen's tutorial
+        self.cc = (4 + mueff/D) / (D + 4 + 2*mueff/D)
+        self.cs = (mueff + 2) / (D + mueff + 5)
+        self.c1 = 2 / ((D + 1.3)**2 + mueff)
+        self.cmu = min(1 - self.c1,
+                       2 * (mueff - 2 + 1/mueff) / ((D + 2)**2 + mueff))
+        self.damps = 1 + 2*max(0, np.sqrt((mueff - 1)/(D + 1)) - 1) + self.cs
+        self.chiN = np.sqrt(D) * (1 - 1/(4*D) + 1/(21*D**2))
+
+        if mean is None:
+            self.mean = self.random.uniform(0, 1, D)
+        else:
+            self.mean = (np.asarray(mean, dtype="float") - self.lower) / \
+                self.absrange
+        self.sigma = sigma
+        self.C = np.eye(D)
+        self.B = np.eye(D)
+        self.D = np.ones(D)
+        self.pc = np.zeros(D)
+        self.ps = np.zeros(D)
+
+    def ask(self):
+        '''lam positions from the current distribution'''
+        Z = self.random.normal(size=(self.lam, len(self.mean)))
+        U = self.mean + self.sigma * (Z * self.D).dot(self.B.T)
+        return self.lower + np.clip(U, 0, 1) * self.absrange
+
+    def _tell(self, X, scores):
+        D = len(self.mean)
+        U = (X - self.lower) / self.absrange
+        best = U[_finite_ranks(scores)[:len(self.weights)]]
+        old = self.mean
+        self.mean = self.weights.dot(best)
+        Y = (best - old) / self.sigma
+        y_w = (self.mean - old) / self.sigma
+
+        # Evolution paths
+        invsqrtC = (self.B / self.D).dot(self.B.T)
+        self.ps = (1 - self.cs)*self.ps + \
+            np.sqrt(self.cs*(2 - self.cs)*self.mueff) * invsqrtC.dot(y_w)
+        # generation is the number of generations told before this one
+        hsig = (np.linalg.norm(self.ps) /
+                np.sqrt(1 - (1 - self.cs)**(2*(self.generation + 1))) /
+                self.chiN) < 1.4 + 2/(D + 1)
+        self.pc = (1 - self.cc)*self.pc + \
+            hsig * np.sqrt(self.cc*(2 - self.cc)*self.mueff) * y_w
+
+        # Rank-one and rank-mu update of covariance, then step size
+        self.C = (1 - self.c1 - self.cmu)*self.C + \
+            self.c1*(np.outer(self.pc, self.pc) +
+                     (1 - hsig)*self.cc*(2 - self.cc)*self.C) + \
+            self.cmu*(Y.T * self.weights).dot(Y)
+        self.sigma *= np.exp(self.cs/self.damps *
+                             (np.linalg.norm(self.ps)/self.chiN - 1))
+
+        self.C = (self.C + self.C.T) / 2
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1E-20))
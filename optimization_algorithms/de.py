@@ -0,0 +1,56 @@
+"""
+Differential evolution (DE/rand/1/bin) with the ask/tell interface of
+ask_tell.py. Every generation asks for one trial position per member of the
+population, made by adding the scaled difference of two random members to
+a third and crossing that with the member. A trial replaces its member if
+it scores at least as well.
+
+Storn, Price: Differential Evolution - A Simple and Efficient Heuristic for
+Global Optimization over Continuous Spaces, 1997
+"""
+
+from __future__ import division
+import numpy as np
+from ask_tell import AskTellOptimizer
+
+
+class DifferentialEvolution(AskTellOptimizer):
+    '''
+    S  -> Population size, at least 4
+    F  -> Differential weight, 0.4 ~ 1
+    CR -> Crossover probability, 0.1 for separable problems ~ 0.9 otherwise
+    '''
+    def __init__(self, constraints, S=20, F=.7, CR=.9, random_state=None):
+        AskTellOptimizer.__init__(self, constraints, random_state)
+        if S < 4:
+            raise Warning("Differential evolution needs S >= 4")
+        self.F, self.CR = F, CR
+        D = len(self.constraints)
+        self.pts = self.random.uniform(self.lower, self.upper, (S, D))
+        self.scores = None
+
+    def ask(self):
+        '''Initial population first, then one trial position per member'''
+        if self.scores is None:
+            return self.pts.copy()
+        S, D = self.pts.shape
+        # Three distinct members other than i for every member i
+        others = np.argsort(self.random.uniform(size=(S, S-1)),
+                            axis=1)[:,:3]
+        others += others >= np.arange(S)[:,np.newaxis]
+        a, b, c = (self.pts[others[:,k]] for k in range(3))
+        mutant = a + self.F * (b - c)
+        cross = self.random.uniform(size=(S, D)) < self.CR
+        # At least one coordinate comes from the mutant
+        cross[np.arange(S), self.random.randint(D, size=S)] = True
+        return self._clip(np.where(cross, mutant, self.pts))
+
+    def _tell(self, X, scores):
+        if self.scores is None:
+            self.pts, self.scores = X.copy(), scores
+            return
+        with np.errstate(invalid='ignore'):
+            better = ((scores <= self.scores) |
+                      (np.isfinite(scores) & ~np.isfinite(self.scores)))
+        self.pts[better] = X[better]
+        self.scores[better] = scores[better]
@@ -0,0 +1,78 @@
+"""
+Executors that score a batch of candidates concurrently. Anything with a
+map(function, iterable) method that returns a list in order will do, like
+multiprocessing.Pool. Asynchronous optimizers also need
+apply_async(function, args, callback=callback), which these pools have too.
+
+XFOIL runs in its own process, so threads scoring airfoils spend their time
+waiting for XFOIL and the GIL is no bottleneck. Threads are therefore the
+default: they need no pickling of the score function, and share the XFOIL
+process pool. Use processes when scoring itself is heavy Python work; the
+score function then has to be picklable, e.g. defined at module level.
+"""
+
+from __future__ import division
+from multiprocessing import Pool, cpu_count
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+
+class SerialExecutor(object):
+    """Scores one candidate after another in the calling thread"""
+
+    def map(self, function, iterable):
+        return [function(item) for item in iterable]
+
+    def apply_async(self, function, args=(), kwds={}, callback=None):
+        """Calls function right away, like multiprocessing pools would
+           later, and hands the result to callback"""
+        result = function(*args, **kwds)
+        if callback is not None:
+            callback(result)
+
+    def close(self):
+        pass
+
+
+def make_executor(kind='thread', workers=None):
+    """
+    Returns executor of kind 'thread', 'process' or 'serial', with workers
+    threads or processes (default: number of cores). Close it with
+    executor.close() when done.
+    """
+    workers = workers or cpu_count()
+    if kind == 'thread':
+        return ThreadPool(workers)
+    elif kind == 'process':
+        return Pool(workers)
+    elif kind == 'serial':
+        return SerialExecutor()
+    raise Warning("Executor kind is 'thread', 'process' or 'serial'")
+
+
+def score_batch(score, positions, executor, memo=None):
+    """
+    Scores positions with executor.map(score, ...). Returns array of scores,
+    nan where score() returned None, and the indices of the positions that
+    were actually scored: with a memo (see memo.py), memoized positions and
+    repeats within positions aren't scored again.
+    """
+    scores = np.full(len(positions), np.nan)
+    # Index of the position scored for each of positions
+    source = list(range(len(positions)))
+    todo = source
+    if memo is not None:
+        todo, first = [], {}
+        for j, pts in enumerate(positions):
+            found, scores[j] = memo.lookup(pts)
+            key = memo.key(pts)
+            if not found and key not in first:
+                first[key] = j
+                todo.append(j)
+            source[j] = j if found else first[key]
+    new = executor.map(score, [positions[j] for j in todo])
+    for j, s in zip(todo, new):
+        scores[j] = np.nan if s is None else s
+        if memo is not None:
+            memo.store(positions[j], s)
+    return scores[source], todo
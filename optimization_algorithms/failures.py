@@ -0,0 +1,76 @@
+"""
+What an optimizer does with candidates that can't be scored, e.g. airfoils
+for which XFOIL doesn't converge. Trying new positions until one can be
+scored, as the examples used to, can cost any number of XFOIL runs in a
+region where nothing converges. A FailurePolicy bounds that: a candidate
+is retried at most max_retries times per generation, so a generation takes
+at most 1+max_retries rounds of scoring.
+
+    pso = PSO(score, constraints, S, omega, theta_p, theta_g,
+              failure_policy=FailurePolicy(max_retries=2, penalty=1.))
+"""
+
+from __future__ import division
+import numpy as np
+
+
+class FailurePolicy(object):
+    """
+    max_retries       -> Times a candidate is retried per generation
+    retry             -> Where to retry: 'randomize' (random position,
+                         moved towards the global best if there is one) or
+                         'personal_best' (halfway back to personal best)
+    penalty           -> Score given when retries are used up, None to give
+                         no score (no best is updated)
+    infeasible_radius -> Remember failed positions, and don't score
+                         candidates within this distance (in unit box
+                         coordinates) of one, they fail without cost.
+                         None to score everything.
+    max_infeasible    -> Number of failed positions remembered
+    """
+
+    def __init__(self, max_retries=5, retry='randomize', penalty=None,
+                 infeasible_radius=None, max_infeasible=1000):
+        if retry not in ('randomize', 'personal_best'):
+            raise Warning("retry is 'randomize' or 'personal_best'")
+        self.max_retries = max_retries
+        self.retry_mode = retry
+        self.penalty = penalty
+        self.infeasible_radius = infeasible_radius
+        self.max_infeasible = max_infeasible
+        self._failed = None
+
+    def penalty_score(self):
+        return np.nan if self.penalty is None else self.penalty
+
+    def record(self, swarm, X):
+        """Remember failed positions X (N x D)"""
+        if self.infeasible_radius is None or not len(X):
+            return
+        X = (np.atleast_2d(X) - swarm.lower) / swarm.absrange
+        if self._failed is not None:
+            X = np.vstack((self._failed, X))
+        self._failed = X[-self.max_infeasible:]
+
+    def infeasible(self, swarm, X):
+        """Boolean array, True for positions X near a failed position"""
+        X = np.atleast_2d(X)
+        if self._failed is None:
+            return np.zeros(len(X), dtype=bool)
+        X = (X - swarm.lower) / swarm.absrange
+        d2 = ((X[:,np.newaxis,:] - self._failed[np.newaxis,:,:])**2).sum(2)
+        return d2.min(axis=1) < self.infeasible_radius**2
+
+    def retry(self, swarm, rows, omega, theta_p, theta_g):
+        """Give failed rows of swarm a new position"""
+        rows = np.asarray(rows)
+        if self.retry_mode == 'personal_best':
+            known = np.isfinite(swarm.bestscores[rows])
+            back = rows[known]
+            swarm.pts[back] = (swarm.pts[back] + swarm.bestpts[back]) / 2
+            rows = rows[~known]
+            if not len(rows):
+                return
+        swarm.randomize(rows)
+        if swarm.bestpos is not None:
+            swarm.update(omega, theta_p, theta_g, idx=rows)
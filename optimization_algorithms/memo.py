@@ -0,0 +1,129 @@
+"""
+Memo of scores by position, so an optimizer doesn't run XFOIL again for a
+position it already scored. Positions are quantized to a tolerance per
+dimension, positions that round to the same grid point share a score.
+Particles clamped onto the constraint box often land on exactly the same
+corner, those are answered from the memo.
+
+    memo = EvaluationMemo(tolerance=1E-4, filename="scores.pkl")
+    pso = PSO(score, constraints, S, omega, theta_p, theta_g, memo=memo)
+    pso.run(iterations)
+    print memo.hits, memo.misses
+
+Failed evaluations are remembered too (as nan), XFOIL won't converge at
+the same position the next time either.
+"""
+
+from __future__ import division
+from collections import OrderedDict
+import cPickle as pickle
+import os
+import numpy as np
+
+
+class EvaluationMemo(object):
+    """
+    tolerance   -> Quantization step, scalar or one per dimension
+    max_entries -> Least recently used entries are evicted beyond this
+    filename    -> Loaded if it exists, written by save(). None to keep the
+                   memo in memory only.
+    """
+
+    def __init__(self, tolerance, max_entries=100000, filename=None):
+        self.tolerance = np.asarray(tolerance, dtype="float")
+        if (self.tolerance <= 0).any():
+            raise Warning("Memo tolerance has to be positive")
+        self.max_entries = max_entries
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+        if filename is not None and os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                tolerance, scores = pickle.load(f)
+            if not np.array_equal(tolerance, self.tolerance):
+                raise Warning("Memo {} was saved with tolerance {}"
+                              .format(filename, tolerance))
+            self._scores.update(scores)
+            self._evict()
+
+    def key(self, pts):
+        """Grid point of position pts"""
+        return tuple(np.round(np.asarray(pts) / self.tolerance)
+                     .astype(int).tolist())
+
+    def lookup(self, pts):
+        """Returns (True, score) if pts is memoized, else (False, None)"""
+        key = self.key(pts)
+        try:
+            score = self._scores.pop(key)
+        except KeyError:
+            self.misses += 1
+            return False, None
+        # Most recently used goes last
+        self._scores[key] = score
+        self.hits += 1
+        return True, score
+
+    def store(self, pts, score):
+        """Remember score of pts, None is stored as nan"""
+        key = self.key(pts)
+        self._scores.pop(key, None)
+        self._scores[key] = np.nan if score is None else float(score)
+        self._evict()
+
+    def _evict(self):
+        while len(self._scores) > self.max_entries:
+            self._scores.popitem(last=False)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def save(self, filename=None):
+        """Write memo to filename (default: the one given at construction),
+           through a temporary file like PSO.save"""
+        filename = filename or self.filename
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'wb') as f:
+            pickle.dump((self.tolerance, list(self._scores.items())), f,
+                        pickle.HIGHEST_PROTOCOL)
+        if os.name == 'nt' and os.path.exists(filename):
+            # Renaming doesn't overwrite on Windows
+            os.remove(filename)
+        os.rename(tmpname, filename)
+
+
+def test():
+    '''Unit tests for this module.'''
+    import tempfile
+    memo = EvaluationMemo((.1, .01), max_entries=3)
+    memo.store((1., .5), 2.)
+    # Near repeat is a hit, further away isn't
+    assert memo.lookup((1.04, .501)) == (True, 2.)
+    assert memo.lookup((1.06, .5)) == (False, None)
+    memo.store((0., 0.), None)
+    found, score = memo.lookup((0., 0.))
+    assert found and np.isnan(score)
+    # Least recently used is evicted
+    memo.store((2., 0.), 3.)
+    memo.lookup((1., .5))
+    memo.store((3., 0.), 4.)
+    assert len(memo) == 3 and not memo.lookup((0., 0.))[0]
+    assert memo.hits == 3 and memo.misses == 2
+    # Persisted
+    filename = os.path.join(tempfile.mkdtemp(), 'memo.pkl')
+    memo.save(filename)
+    loaded = EvaluationMemo((.1, .01), filename=filename)
+    assert loaded.lookup((1., .5)) == (True, 2.) and len(loaded) == 3
+    try:
+        EvaluationMemo(.1, filename=filename)
+        raise AssertionError("Loaded memo with other tolerance")
+    except Warning:
+        pass
+    os.remove(filename)
+    os.rmdir(os.path.dirname(filename))
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print("Tests succeeded.")
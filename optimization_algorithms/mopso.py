@@ -0,0 +1,257 @@
+"""
+Multi-objective particle swarm optimization. Instead of one weighted score,
+score(pts) returns a sequence of objectives (e.g. Cd at two lift
+coefficients), all minimized. Non-dominated positions found during the run
+are kept in a bounded ParetoArchive, which is the result: the whole trade-off
+front, from which designs can be picked afterwards for any weighting without
+running XFOIL again.
+
+    pso = MOPSO(score, constraints, S, omega, theta_p, theta_g)
+    archive = pso.run(iterations)
+    pts, objectives = archive.choose((.5, .5))
+
+Coello, Pulido, Lechuga: Handling Multiple Objectives With Particle Swarm
+Optimization, 2004. Leaders and archive truncation use the crowding
+distance of NSGA-II (Deb et al., 2002) instead of Coello's grid.
+"""
+
+from __future__ import division
+import numpy as np
+from pso import PSO
+
+
+class ParetoArchive(object):
+    '''
+    Non-dominated positions X (N x D) with their objectives F (N x M).
+    Beyond max_size positions, the most crowded ones are dropped, which
+    keeps the front evenly covered.
+    '''
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        self.X = None
+        self.F = None
+
+    def __len__(self):
+        return 0 if self.F is None else len(self.F)
+
+    def add(self, X, F):
+        '''Add positions X with objectives F, rows with a non-finite
+           objective are ignored. Returns boolean array, True for the
+           positions that made it into the archive.'''
+        X, F = np.atleast_2d(X), np.atleast_2d(F)
+        finite = np.isfinite(F).all(axis=1)
+        added = np.zeros(len(F), dtype=bool)
+        if not finite.any():
+            return added
+        n_old = len(self)
+        if n_old:
+            X = np.vstack((self.X, X[finite]))
+            F = np.vstack((self.F, F[finite]))
+        else:
+            X, F = X[finite], F[finite]
+        keep = _nondominated(F)
+        # Drop repeated objective vectors, the archive entry comes first
+        keep[np.setdiff1d(np.arange(len(F)),
+                          _unique_rows(F))] = False
+        keep = np.flatnonzero(keep)
+        while len(keep) > self.max_size:
+            keep = np.delete(keep, np.argmin(crowding_distance(F[keep])))
+        self.X, self.F = X[keep], F[keep]
+        added[np.flatnonzero(finite)[keep[keep >= n_old] - n_old]] = True
+        return added
+
+    def leaders(self, n, random=np.random):
+        '''n archive positions (n x D), each the less crowded of two random
+           archive members (binary tournament)'''
+        crowding = crowding_distance(self.F)
+        pairs = random.randint(len(self), size=(n, 2))
+        better = np.where(crowding[pairs[:,0]] >= crowding[pairs[:,1]],
+                          pairs[:,0], pairs[:,1])
+        return self.X[better]
+
+    def choose(self, weights):
+        '''Position and objectives with the lowest weighted sum of
+           objectives, each scaled to its range in the archive'''
+        if not len(self):
+            raise Warning("Pareto archive is empty")
+        lo, hi = self.F.min(axis=0), self.F.max(axis=0)
+        scaled = (self.F - lo) / np.where(hi > lo, hi - lo, 1)
+        i = np.argmin(scaled.dot(np.asarray(weights, dtype="float")))
+        return self.X[i], self.F[i]
+
+
+def dominates(F, G):
+    '''Boolean array, True where row of F Pareto-dominates row of G, False
+       where either has a nan'''
+    with np.errstate(invalid='ignore'):
+        return (F <= G).all(axis=-1) & (F < G).any(axis=-1)
+
+def _nondominated(F):
+    '''Boolean array, True for rows of F that no other row dominates'''
+    return ~dominates(F[np.newaxis,:,:], F[:,np.newaxis,:]).any(axis=1)
+
+def _unique_rows(F):
+    '''Indices of the first occurrence of every distinct row of F'''
+    order = np.lexsort(F.T[::-1])
+    distinct = np.ones(len(F), dtype=bool)
+    distinct[1:] = (np.diff(F[order], axis=0) != 0).any(axis=1)
+    # Smallest index of each run of equal rows
+    starts = np.flatnonzero(distinct)
+    return np.array([order[a:b].min() for a, b in
+                     zip(starts, np.append(starts[1:], len(F)))], dtype=int)
+
+def crowding_distance(F):
+    '''Crowding distance of every row of F: summed over objectives, the
+       distance between its neighbours along that objective, relative to the
+       objective's range. Infinite at the extremes.'''
+    N, M = F.shape
+    distance = np.zeros(N)
+    if N <= 2:
+        return np.full(N, np.inf)
+    for m in range(M):
+        order = np.argsort(F[:,m], kind='mergesort')
+        f = F[order,m]
+        span = f[-1] - f[0]
+        distance[order[[0, -1]]] = np.inf
+        if span > 0:
+            distance[order[1:-1]] += (f[2:] - f[:-2]) / span
+    return distance
+
+
+class MOPSO(PSO):
+    '''
+    Multi-objective PSO. Arguments as for PSO, except that score(pts)
+    returns a sequence of objectives, or None if the position couldn't be
+    scored. Every particle moves towards its personal best and a leader
+    drawn from the archive (see ParetoArchive.leaders). A new position
+    replaces the personal best if it dominates it, or with probability
+    1/2 if neither dominates the other.
+
+    Unscorable particles are retried as failure_policy says, but get no
+    penalty: when retries are used up they stay unscored (nan) for that
+    generation. Scores passed to callback(pso, scores) are (S x M).
+    The surrogate and memo options of PSO aren't supported.
+    '''
+    def __init__(self, score, constraints, S, omega, theta_p, theta_g,
+                 archive_size=100, **kwargs):
+        if kwargs.get('surrogate') is not None or \
+                kwargs.get('memo') is not None:
+            raise Warning("MOPSO doesn't support a surrogate or memo")
+        PSO.__init__(self, score, constraints, S, omega, theta_p, theta_g,
+                     **kwargs)
+        self.archive = ParetoArchive(archive_size)
+        # Objectives of personal bests, (S x M) once the number M is known
+        self.bestobjectives = None
+
+    def evaluate(self, idx):
+        '''Score rows idx of the swarm concurrently, returns (len(idx) x M)
+           objectives with nan rows where score() returned None'''
+        positions = [self.swarm.pts[i].copy() for i in idx]
+        results = self.executor.map(self.score, positions)
+        if self.bestobjectives is None:
+            M = [len(r) for r in results if r is not None]
+            if M:
+                self.bestobjectives = np.full((len(self.swarm), M[0]),
+                                              np.nan)
+        M = 1 if self.bestobjectives is None else \
+            self.bestobjectives.shape[1]
+        F = np.array([[np.nan]*M if r is None else r for r in results],
+                     dtype="float").reshape(len(positions), M)
+        self.evaluations += len(positions)
+        for pts, objectives in zip(positions, F):
+            self.failures += not np.isfinite(objectives).all()
+            self.log.append((self.generation, pts, objectives))
+        return F
+
+    def step(self):
+        '''Move (except in first generation) and score all particles, add
+           them to the archive, returns their objectives'''
+        swarm = self.swarm
+        if self.generation > 0 and not len(self.archive):
+            # Nothing could be scored yet, nothing to move towards
+            swarm.randomize()
+        elif self.generation > 0:
+            leaders = self.archive.leaders(len(swarm), swarm.random)
+            swarm.update(self.omega, self.theta_p, self.theta_g, leaders)
+        F = None
+        todo = np.arange(len(swarm))
+        policy = self.failure_policy
+        retries = 0
+        while len(todo):
+            infeasible = policy.infeasible(swarm, swarm.pts[todo])
+            blocked, todo = todo[infeasible], todo[~infeasible]
+            new = self.evaluate(todo)
+            if F is None or F.shape[1] != new.shape[1]:
+                F = np.full((len(swarm), new.shape[1]), np.nan)
+            F[todo] = new
+            failed = todo[~np.isfinite(new).all(axis=1)]
+            policy.record(swarm, swarm.pts[failed])
+            failed = np.sort(np.concatenate((failed, blocked)))
+            if not len(failed) or retries == policy.max_retries:
+                break
+            policy.retry(swarm, failed, self.omega, self.theta_p,
+                         self.theta_g)
+            todo = failed
+            retries += 1
+        self.archive.add(swarm.pts, F)
+        self._update_personal_bests(F)
+        self._end_generation(F)
+        return F
+
+    def _update_personal_bests(self, F):
+        swarm, best = self.swarm, self.bestobjectives
+        if best is None or best.shape[1] != F.shape[1]:
+            return
+        scored = np.isfinite(F).all(axis=1)
+        new = ~np.isfinite(best).all(axis=1)
+        coin = swarm.random.uniform(size=len(F)) < .5
+        replace = scored & (new | dominates(F, best) |
+                            (~dominates(best, F) & coin))
+        best[replace] = F[replace]
+        swarm.bestpts[replace] = swarm.pts[replace]
+        # Marks particles that have a personal best, see FailurePolicy.retry
+        swarm.bestscores[replace] = 0
+
+    def run(self, iterations):
+        '''Score first generation and do iterations updates, returns the
+           ParetoArchive. A resumed run continues where it was.'''
+        while self.generation <= iterations:
+            self.step()
+        return self.archive
+
+
+def test():
+    '''Unit tests for this module.'''
+    # Archive keeps non-dominated points only
+    archive = ParetoArchive(max_size=4)
+    F = np.array(((1, 5), (2, 2), (3, 3), (5, 1), (np.nan, 0), (1, 5)))
+    added = archive.add(np.arange(6)[:,np.newaxis], F)
+    assert list(added) == [True, True, False, True, False, False]
+    assert sorted(archive.X[:,0]) == [0, 1, 3]
+    # Bounded, extremes are kept
+    archive.add(np.arange(6, 9)[:,np.newaxis],
+                ((1.5, 3), (1.6, 2.9), (4, 1.5)))
+    assert len(archive) == 4
+    assert set((0, 3)) <= set(archive.X[:,0])
+    np.testing.assert_array_equal(archive.choose((1, 0))[1], (1, 5))
+    # Schaffer's problem, front is 0 <= x <= 2
+    def schaffer(pts):
+        if pts[1] > .9:
+            return None
+        return pts[0]**2 + pts[1]**2, (pts[0] - 2)**2 + pts[1]**2
+    c = ((-4, 4), (-1, 1))
+    pso = MOPSO(schaffer, c, 20, .4, 1.5, 1.5, archive_size=30,
+                random_state=2)
+    archive = pso.run(30)
+    assert len(archive) == 30 and pso.generation == 31
+    assert (archive.X[:,0] > -.1).all() and (archive.X[:,0] < 2.1).all()
+    assert (np.abs(archive.X[:,1]) < .1).all()
+    # Front is covered from end to end
+    assert archive.F[:,0].min() < .1 and archive.F[:,1].min() < .1
+    pts, objectives = archive.choose((.5, .5))
+    assert abs(pts[0] - 1) < .3
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print("Tests succeeded.")
@@ -0,0 +1,72 @@
+"""
+Live plot of a PSO run on airfoils, as used by the example scripts:
+
+    plot_generation = GenerationPlot(construct_airfoil)
+    pso = PSO(score, constraints, S, omega, theta_p, theta_g,
+              callback=plot_generation)
+
+matplotlib is only imported when a GenerationPlot is made, so the
+optimizers don't need it.
+"""
+
+from __future__ import division
+from random import choice
+import numpy as np
+
+
+class GenerationPlot(object):
+    '''
+    Figure with the best airfoil of the latest generation, the latest
+    particle best, the latest global best and the progress of the global
+    best, updated by calling it as callback(pso, scores) of PSO.
+    construct_airfoil(*pts) makes the airfoil of a particle position.
+    '''
+    def __init__(self, construct_airfoil, equal_axes=False):
+        import matplotlib.pyplot as plt
+        self.plt = plt
+        self.construct_airfoil = construct_airfoil
+        # Show plot and make redrawing possible
+        fig, axes = plt.subplots(4,1)
+        (self.cur_afplt, self.lastpbest_afplt, self.gbest_afplt,
+         self.score_plt) = axes
+        for ax in axes[:3]:
+            # Enable auto-clearing
+            ax.hold(False)
+            if equal_axes:
+                ax.axis('equal')
+        plt.tight_layout()
+        # Interactive mode
+        plt.ion()
+        self.scores_y = []
+
+    def _plot(self, ax, pso, i_par, scores, style, title):
+        self.construct_airfoil(*pso.swarm.pts[i_par]).plot(ax,
+            score="Cd {}".format(scores[i_par]), style=style,
+            title="{}, particle n{}p{}".format(title, pso.generation, i_par))
+
+    def __call__(self, pso, scores):
+        '''Plot best airfoil of this generation, latest particle best and
+           new global best, and progress of global best'''
+        plotstyle = "{}-".format(choice("rgb"))
+        # Unscored particles are nan, a generation may have no scores at all
+        scored = np.isfinite(scores).any()
+        if scored:
+            self._plot(self.cur_afplt, pso, np.nanargmin(scores), scores,
+                       plotstyle, "Current best")
+        # Particles that found their personal best in this generation
+        improved = np.flatnonzero(pso.swarm.bestscores == scores)
+        if len(improved):
+            i_par = improved[-1]
+            self._plot(self.lastpbest_afplt, pso, i_par, scores, plotstyle,
+                       "Particle best")
+            print("Found particle best, score {}".format(scores[i_par]))
+        scores_y = self.scores_y
+        if scored and (not scores_y or pso.bestscore < scores_y[-1]):
+            i_par = np.nanargmin(scores)
+            self._plot(self.gbest_afplt, pso, i_par, scores, plotstyle,
+                       "Global best")
+            print("Found global best, score {}".format(scores[i_par]))
+        scores_y.append(pso.bestscore)
+        self.score_plt.plot(scores_y, 'r-')
+        self.score_plt.set_title("Global best per round")
+        self.plt.pause(.0001)
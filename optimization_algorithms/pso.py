@@ -9,69 +9,216 @@ Great paper on parameter selection: http://hvass-labs.org/people/magnus/publicat
 # Make sure that 7/2=3.5
 from __future__ import division
 import numpy as np
-# Import N(mu, sigma) and U[0,1) function
-from numpy.random import normal, uniform
-from copy import copy
+from Queue import Queue
+import cPickle as pickle
+import os
+from executors import SerialExecutor, score_batch
+from failures import FailurePolicy
 
-class Particle():
-    '''A particle is an array of constrained numbers.
-       The constraint array c is organized as [[low,high],[low,high]].'''
-    def __init__(self, constraints):
-        self.constraints = constraints
-        self.pts  = np.zeros(len(constraints), dtype="float")
-        self.spds = np.zeros(len(constraints), dtype="float")
+class Swarm(object):
+    '''S particles as rows of (S x D) arrays of positions, speeds and
+       personal bests, updated with whole-array operations. Indexing gives
+       a Particle that is a view on one row.
+       The constraint array c is organized as [[low,high],[low,high]].
+       random_state is a seed or numpy RandomState, default np.random.'''
+    def __init__(self, constraints, S, random_state=None):
+        self.constraints = np.asarray(constraints, dtype="float")
+        self.lower = self.constraints[:,0]
+        self.upper = self.constraints[:,1]
+        self.absrange = abs(self.upper-self.lower)
+        if random_state is None:
+            random_state = np.random
+        elif not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+        self.random = random_state
+        D = len(self.constraints)
+        self.pts  = np.zeros((S, D), dtype="float")
+        self.spds = np.zeros((S, D), dtype="float")
+        # Positions and speeds before last update, for rewind
+        self.oldpts  = np.zeros((S, D), dtype="float")
+        self.oldspds = np.zeros((S, D), dtype="float")
+        self._updated = np.zeros(S, dtype=bool)
         # Randomize positions and speeds
         self.randomize()
-        # Set current point as best
-        self.new_best(float('inf'))
+        # Set current points as personal bests
+        self.bestpts = self.pts.copy()
+        self.bestscores = np.full(S, float('inf'))
+        # Global best
+        self.bestscore = float('inf')
+        self.bestpos = None
+        self.particles = [Particle(self.constraints, self, i)
+                          for i in range(S)]
+
+    def __getstate__(self):
+        '''np.random can't be pickled, store the state of its generator'''
+        state = self.__dict__.copy()
+        if self.random is np.random:
+            state['random'] = ('np.random', np.random.get_state())
+        return state
+    def __setstate__(self, state):
+        if isinstance(state['random'], tuple):
+            np.random.set_state(state['random'][1])
+            state['random'] = np.random
+        self.__dict__.update(state)
+
+    def __len__(self):
+        return len(self.pts)
+    def __getitem__(self, i):
+        return self.particles[i]
+    def __iter__(self):
+        return iter(self.particles)
+
+    def _rows(self, idx):
+        '''Index for rows idx (default all) and their number'''
+        if idx is None:
+            return slice(None), len(self.pts)
+        rows = np.arange(len(self.pts))[idx]
+        return rows, len(rows)
+
+    def randomize(self, idx=None):
+        '''Randomize with uniform distribution within bounds.'''
+        rows, n = self._rows(idx)
+        shape = (n, len(self.constraints))
+        self.pts[rows]  = self.random.uniform(self.lower, self.upper, shape)
+        self.spds[rows] = self.random.uniform(-self.absrange, self.absrange,
+                                              shape)
+
+    def _save(self, rows):
+        self.oldpts[rows]  = self.pts[rows]
+        self.oldspds[rows] = self.spds[rows]
+        self._updated[rows] = True
+
+    def update(self, omega, theta_p, theta_g, global_best=None, idx=None):
+        '''Update velocities and positions of rows idx (default all),
+           global_best defaults to self.bestpos'''
+        if global_best is None:
+            global_best = self.bestpos
+        rows, n = self._rows(idx)
+        self._save(rows)
+        shape = (n, len(self.constraints))
+        r_p = self.random.uniform(0, 1, shape)
+        r_g = self.random.uniform(0, 1, shape)
+        pts = self.pts[rows]
+        # v_i,d <- omega*v_i,d + theta_p*r_p*(p_i,d-x_i,d) + theta_g*r_g*(g_d-x_i,d)
+        self.spds[rows] = (omega*self.spds[rows] +
+                           theta_p*r_p*(self.bestpts[rows]-pts) +
+                           theta_g*r_g*(np.asarray(global_best)-pts))
+        self._boundspds(rows)
+        self.pts[rows] = pts + self.spds[rows]
+        self._boundpts(rows)
+
+    def rewind(self, idx=None):
+        '''Go back to previous velocities and positions'''
+        rows, n = self._rows(idx)
+        if not self._updated[rows].all():
+            raise Warning("Update was never called, so no rewind possible.")
+        self.pts[rows]  = self.oldpts[rows]
+        self.spds[rows] = self.oldspds[rows]
+
+    def _boundpts(self, rows=slice(None)):
+        '''Restrict points to lowerbound<x<upperbound'''
+        self.pts[rows] = np.minimum(np.maximum(self.pts[rows], self.lower),
+                                    self.upper)
+    def _boundspds(self, rows=slice(None)):
+        '''Restrict speeds to -range<v<range'''
+        self.spds[rows] = np.clip(self.spds[rows], -self.absrange,
+                                  self.absrange)
+
+    def APSO(self, B, a, global_best=None, idx=None):
+        '''Vectorized Particle.APSO of rows idx (default all)'''
+        if global_best is None:
+            global_best = self.bestpos
+        rows, n = self._rows(idx)
+        self._save(rows)
+        e = self.random.normal(0, 1, (n, len(self.constraints)))
+        L = self.absrange
+        self.pts[rows] = ((1-B)*L*self.pts[rows] +
+                          B*L*np.asarray(global_best) + a*L*e)
+        self._boundpts(rows)
+
+    def update_bests(self, scores, idx=None):
+        '''Store personal and global bests for scores of rows idx (default
+           all). Scores of None or nan, e.g. not converged, are ignored.
+           Returns boolean array, True where personal best improved.'''
+        rows, n = self._rows(idx)
+        scores = np.array([np.nan if s is None else s for s in
+                           np.atleast_1d(scores)], dtype="float")
+        with np.errstate(invalid='ignore'):
+            improved = scores < self.bestscores[rows]
+        if isinstance(rows, slice):
+            rows = np.arange(n)
+        rows = rows[improved]
+        self.bestscores[rows] = scores[improved]
+        self.bestpts[rows] = self.pts[rows]
+        if len(rows):
+            best = rows[np.argmin(self.bestscores[rows])]
+            if self.bestscores[best] < self.bestscore:
+                self.bestscore = self.bestscores[best]
+                self.bestpos = self.pts[best].copy()
+        return improved
+
+
+class Particle(object):
+    '''A particle is an array of constrained numbers.
+       The constraint array c is organized as [[low,high],[low,high]].
+       Particles of a Swarm are views on one of its rows, a Particle
+       constructed on its own is a swarm of one.'''
+    def __init__(self, constraints, swarm=None, index=0):
+        if swarm is None:
+            # Randomizes positions and speeds, sets current point as best
+            swarm = Swarm(constraints, 1)
+        self._swarm = swarm
+        self._i = index
+
+    constraints = property(lambda self: self._swarm.constraints)
+    oldpts  = property(lambda self: self._swarm.oldpts[self._i])
+    oldspds = property(lambda self: self._swarm.oldspds[self._i])
+
+    @property
+    def pts(self):
+        return self._swarm.pts[self._i]
+    @pts.setter
+    def pts(self, value):
+        self._swarm.pts[self._i] = value
+
+    @property
+    def spds(self):
+        return self._swarm.spds[self._i]
+    @spds.setter
+    def spds(self, value):
+        self._swarm.spds[self._i] = value
+
+    @property
+    def bestpts(self):
+        return self._swarm.bestpts[self._i]
+
+    @property
+    def bestscore(self):
+        return self._swarm.bestscores[self._i]
 
     def new_best(self, score):
         '''Stores new personal best score and position.'''
-        self.bestscore = score
-        self.bestpts = self.pts
+        self._swarm.bestscores[self._i] = score
+        # Copies into row of swarm, doesn't become reference to self.pts
+        self._swarm.bestpts[self._i] = self.pts
 
     def randomize(self):
         '''Randomize with uniform distribution within bounds.'''
-        # Iterate over self.pts
-        for i, (lowerbound, upperbound) in enumerate(self.constraints):
-            self.pts[i]  = uniform(lowerbound, upperbound)
-            absrange = abs(upperbound-lowerbound)
-            self.spds[i] = uniform(-absrange, absrange)
+        self._swarm.randomize([self._i])
 
     def update(self, global_best, omega, theta_p, theta_g):
         '''Update velocity and position'''
-        # Copy to prevent self.oldpts becoming reference to self.pts array
-        self.oldpts  = copy(self.pts)
-        self.oldspds = copy(self.spds)
-        r_p, r_g = uniform(0,1), uniform(0,1)
-        # v_i,d <- omega*v_i,d + theta_p*r_p*(p_i,d-x_i,d) + theta_g*r_g*(g_d-x_i,d)
-        self.spds = (omega*self.spds + theta_p*r_p*(self.bestpts-self.pts) +
-                       theta_g*r_g*(global_best-self.pts))
-        self._boundspds()
-        self.pts += self.spds
-        self._boundpts()
+        self._swarm.update(omega, theta_p, theta_g, global_best, [self._i])
     def rewind(self):
         '''Go back to previous velocity and position'''
-        # Copy to prevent self.pts becoming reference to self.oldpts array
-        try:
-            self.pts  = copy(self.oldpts)
-            self.spds = copy(self.oldspds)
-        except NameError:
-            raise Warning("Update was never called, so no rewidn possible.")
+        self._swarm.rewind([self._i])
 
     def _boundpts(self):
         '''Restrict points to lowerbound<x<upperbound'''
-        for i, (lowerbound, upperbound) in enumerate(self.constraints):
-            pt = self.pts[i]
-            if pt < lowerbound: self.pts[i] = lowerbound
-            if pt > upperbound: self.pts[i] = upperbound
+        self._swarm._boundpts([self._i])
     def _boundspds(self):
         '''Restrict speeds to -range<v<range'''
-        for i, (lowerbound, upperbound) in enumerate(self.constraints):
-            spd = self.spds[i]
-            absrange = abs(upperbound-lowerbound)
-            if spd < -absrange: self.spds[i] = -absrange
-            if spd >  absrange: self.spds[i] =  absrange
+        self._swarm._boundspds([self._i])
 
     def __str__(self):
         '''Print values of Particle.'''
@@ -83,15 +230,7 @@ class Particle():
            in one step. http://arxiv.org/pdf/1203.6577.pdf
            Typically, a = 0.1L ~ 0.5L where L is the scale of each variable,
            while B = 0.1 ~ 0.7 is sufficient for most applications'''
-        self.oldpts  = copy(self.pts)
-        self.oldspds = copy(self.spds)
-        for i, pt in enumerate(self.pts):
-            mu, sigma = 0, 1
-            e = normal(mu, sigma)
-            c = self.constraints[i]
-            L = abs(c[1]-c[0])
-            self.pts[i] = (1-B)*L*pt + B*L*global_best[i] + a*L*e
-        self._boundpts()
+        self._swarm.APSO(B, a, global_best, [self._i])
 
 
 def test():
@@ -117,7 +256,385 @@ def test():
     p.APSO( (3, 1, 0), .5, 0)
     np.testing.assert_array_almost_equal(p.pts, np.array([3.0, 1.5, 0.0]))
     
+class PSO(object):
+    '''
+    Generation-synchronous particle swarm optimization: every generation,
+    all particles are moved and then scored concurrently by executor (see
+    executors.py, default scores serially), after which the bests are
+    updated. score(pts) returns the score of a position, or None if it
+    couldn't be scored (e.g. XFOIL didn't converge). failure_policy (see
+    failures.py) decides how often and where such particles are tried
+    again, and what they score when that fails. failures counts the
+    evaluations that failed, they're part of evaluations.
+
+    Random numbers are only drawn in the calling thread, in a fixed order,
+    so a run is reproducible for a given random_state whatever the
+    executor. callback(pso, scores) is called after every generation.
+
+    The whole state, including random generator and evaluation log, is
+    saved to file checkpoint every checkpoint_every generations. A run
+    continued with PSO.resume() goes on exactly as if it never stopped.
+
+    With a surrogate (see surrogate.py), moved particles are only scored if
+    the surrogate, fitted on all scores so far, finds them promising. The
+    others keep moving without being scored, their score is nan for that
+    generation. saved_evaluations counts the skipped scorings.
+
+    With a memo (see memo.py), positions that were scored before, up to
+    the memo's tolerance, get their score from the memo instead of score().
+    evaluations only counts calls of score(), log only holds those. A memo
+    with a filename is saved after every generation. Positions that are
+    still being scored aren't in the memo yet, so AsyncPSO can score a
+    position twice.
+    '''
+    def __init__(self, score, constraints, S, omega, theta_p, theta_g,
+                 executor=None, random_state=None, callback=None,
+                 checkpoint=None, checkpoint_every=1, surrogate=None,
+                 failure_policy=None, memo=None):
+        self.score = score
+        self.omega, self.theta_p, self.theta_g = omega, theta_p, theta_g
+        self.swarm = Swarm(constraints, S, random_state)
+        if executor is None:
+            executor = SerialExecutor()
+        self.executor = executor
+        self.callback = callback
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.surrogate = surrogate
+        if failure_policy is None:
+            failure_policy = FailurePolicy()
+        self.failure_policy = failure_policy
+        self.memo = memo
+        self.generation = 0
+        self.evaluations = 0
+        self.failures = 0
+        self.saved_evaluations = 0
+        # (generation, position, score) of every evaluation
+        self.log = []
+
+    bestscore = property(lambda self: self.swarm.bestscore)
+    bestpos = property(lambda self: self.swarm.bestpos)
+
+    def __getstate__(self):
+        '''Functions and pools are given again when resuming'''
+        state = self.__dict__.copy()
+        for k in ('score', 'executor', 'callback'):
+            state[k] = None
+        return state
+
+    def save(self, filename):
+        '''Save state of optimization. Written to a temporary file first, so
+           a crash while saving leaves the previous checkpoint intact.'''
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        if os.name == 'nt' and os.path.exists(filename):
+            # Renaming doesn't overwrite on Windows
+            os.remove(filename)
+        os.rename(tmpname, filename)
+
+    @classmethod
+    def resume(cls, filename, score, executor=None, callback=None):
+        '''Load optimizer saved with save(), continue with run()'''
+        with open(filename, 'rb') as f:
+            pso = pickle.load(f)
+        pso.score = score
+        pso.executor = SerialExecutor() if executor is None else executor
+        pso.callback = callback
+        return pso
+
+    def _end_generation(self, scores):
+        '''Callback and checkpoint after a generation was scored'''
+        if self.callback is not None:
+            self.callback(self, scores)
+        self.generation += 1
+        if self.memo is not None and self.memo.filename:
+            self.memo.save()
+        if self.checkpoint and not self.generation % self.checkpoint_every:
+            self.save(self.checkpoint)
+
+    def evaluate(self, idx):
+        '''Score rows idx of the swarm concurrently, returns scores with
+           nan where score() returned None. Memoized positions and repeats
+           within idx aren't scored again.'''
+        positions = [self.swarm.pts[i].copy() for i in idx]
+        scores, scored = score_batch(self.score, positions, self.executor,
+                                     self.memo)
+        self.evaluations += len(scored)
+        for j in scored:
+            self.failures += not np.isfinite(scores[j])
+            self.log.append((self.generation, positions[j], scores[j]))
+        return scores
+
+    def step(self):
+        '''Move (except in first generation) and score all particles'''
+        swarm = self.swarm
+        if self.generation > 0 and swarm.bestpos is None:
+            # Nothing could be scored yet, nothing to move towards
+            swarm.randomize()
+        elif self.generation > 0:
+            swarm.update(self.omega, self.theta_p, self.theta_g)
+        scores = np.full(len(swarm), np.nan)
+        todo = np.arange(len(swarm))
+        if self.surrogate is not None and self.generation > 0:
+            todo = self._screen()
+        policy = self.failure_policy
+        retries = 0
+        while len(todo):
+            infeasible = policy.infeasible(swarm, swarm.pts[todo])
+            blocked, todo = todo[infeasible], todo[~infeasible]
+            scores[todo] = self.evaluate(todo)
+            failed = todo[~np.isfinite(scores[todo])]
+            policy.record(swarm, swarm.pts[failed])
+            failed = np.sort(np.concatenate((failed, blocked)))
+            if not len(failed):
+                break
+            if retries == policy.max_retries:
+                scores[failed] = policy.penalty_score()
+                break
+            policy.retry(swarm, failed, self.omega, self.theta_p,
+                         self.theta_g)
+            todo = failed
+            retries += 1
+        swarm.update_bests(scores)
+        self._end_generation(scores)
+        return scores
+
+    def _screen(self):
+        '''Rows of swarm the surrogate finds worth scoring'''
+        positions = np.array([pts for generation, pts, score in self.log])
+        scores = np.array([score for generation, pts, score in self.log])
+        self.surrogate.fit(positions, scores)
+        selected = self.surrogate.select(self.swarm.pts,
+                                         self.swarm.bestscores)
+        self.saved_evaluations += np.count_nonzero(~selected)
+        return np.flatnonzero(selected)
+
+    def run(self, iterations):
+        '''Score first generation and do iterations updates, returns global
+           best score and position. A resumed run continues where it was.'''
+        while self.generation <= iterations:
+            self.step()
+        return self.bestscore, self.bestpos
+
+
+def _score_particle(score, index, pts):
+    '''Runs score(pts) in a worker, returns (index, pts, score, exception)
+       as exceptions in workers would otherwise get lost'''
+    try:
+        return index, pts, score(pts), None
+    except Exception as e:
+        return index, pts, None, e
+
+
+class AsyncPSO(PSO):
+    '''
+    Barrier-free variant of PSO: as soon as the score of a particle
+    arrives, it updates the bests, is moved using the global best of that
+    moment and is submitted again, instead of waiting for the slowest
+    particle of its generation. This keeps all workers busy when scoring
+    times vary a lot, e.g. when some XFOIL runs hit the iteration limit.
+
+    The executor needs apply_async(function, args, callback=...), like
+    multiprocessing pools. Particles move in the order their scores
+    arrive, so runs are only reproducible with a serial executor.
+    callback(pso, scores) is called every S scores, scores holds the
+    latest score of every particle. When resumed from a checkpoint, the
+    particles that were being scored are scored again.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        PSO.__init__(self, *args, **kwargs)
+        if self.surrogate is not None:
+            raise Warning("AsyncPSO doesn't support a surrogate")
+        self._scored = 0
+        self._scores = np.full(len(self.swarm), np.nan)
+        self._retries = np.zeros(len(self.swarm), dtype=int)
+
+    def run(self, iterations):
+        '''Score (iterations+1)*S positions, as many as PSO.run, returns
+           global best score and position'''
+        swarm = self.swarm
+        S = len(swarm)
+        done = Queue()
+        scores = self._scores
+        budget = (iterations+1) * S
+        self._busy = 0
+        policy = self.failure_policy
+        def retry(i):
+            self._retries[i] += 1
+            policy.retry(swarm, [i], self.omega, self.theta_p, self.theta_g)
+        # Particles whose result in done came from the memo, or is the
+        # penalty as they're still infeasible after the last retry
+        memoized = set()
+        blocked = set()
+        def submit(i):
+            while (self._retries[i] < policy.max_retries and
+                   policy.infeasible(swarm, swarm.pts[i])[0]):
+                retry(i)
+            self._busy += 1
+            pts = swarm.pts[i].copy()
+            if policy.infeasible(swarm, pts)[0]:
+                # Not scored, like in PSO.step
+                blocked.add(i)
+                done.put((i, pts, policy.penalty_score(), None))
+                return
+            if self.memo is not None:
+                found, score = self.memo.lookup(pts)
+                if found:
+                    memoized.add(i)
+                    done.put((i, pts, score, None))
+                    return
+            self.executor.apply_async(_score_particle,
+                                      (self.score, i, pts),
+                                      callback=done.put)
+        for i in range(min(S, budget - self._scored)):
+            submit(i)
+        while self._busy:
+            i, pts, score, error = done.get()
+            self._busy -= 1
+            if error is not None:
+                raise error
+            score = np.nan if score is None else score
+            was_blocked = i in blocked
+            if was_blocked:
+                blocked.remove(i)
+            elif i in memoized:
+                memoized.remove(i)
+            else:
+                self.evaluations += 1
+                self.failures += not np.isfinite(score)
+                self.log.append((self.generation, pts, score))
+                if self.memo is not None:
+                    self.memo.store(pts, score)
+            if not np.isfinite(score) and not was_blocked:
+                policy.record(swarm, pts)
+                if self._retries[i] < policy.max_retries:
+                    retry(i)
+                    submit(i)
+                    continue
+                score = policy.penalty_score()
+            self._retries[i] = 0
+            scores[i] = score
+            swarm.update_bests([score], [i])
+            self._scored += 1
+            if self._scored % S == 0:
+                self._end_generation(scores.copy())
+            if self._scored + self._busy < budget:
+                if swarm.bestpos is None:
+                    # Nothing could be scored yet, like in PSO.step
+                    swarm.randomize([i])
+                else:
+                    swarm.update(self.omega, self.theta_p, self.theta_g,
+                                 idx=[i])
+                submit(i)
+        return self.bestscore, self.bestpos
+
+
+def test_swarm():
+    '''Unit tests for Swarm.'''
+    c = ((1,2), (4,5), (0,1))
+    s = Swarm(c, 50, random_state=1)
+    assert ((s.pts >= s.lower) & (s.pts <= s.upper)).all()
+    # Particle is a view
+    s[3].pts = (1.5, 4.5, .5)
+    np.testing.assert_array_almost_equal(s.pts[3], (1.5, 4.5, .5))
+    # Bests, None is ignored
+    scores = np.arange(50.)
+    scores[0] = 100
+    improved = s.update_bests([None] + list(scores[1:]))
+    assert not improved[0] and improved[1:].all()
+    assert s.bestscore == 1 and (s.bestpos == s.pts[1]).all()
+    # Personal best isn't a reference to the position
+    old = s.bestpts.copy()
+    s.update(.5, 1, 1)
+    np.testing.assert_array_almost_equal(s.bestpts, old)
+    assert ((s.pts >= s.lower) & (s.pts <= s.upper)).all()
+    s.rewind([2])
+    np.testing.assert_array_almost_equal(s.pts[2], old[2])
+    # Same seed, same swarm
+    np.testing.assert_array_almost_equal(Swarm(c, 5, 7).pts,
+                                         Swarm(c, 5, 7).pts)
+
+def test_pso():
+    '''Unit tests for PSO.'''
+    from multiprocessing.pool import ThreadPool
+    def sphere(pts):
+        return None if pts[0] > .9 else float(np.sum(pts**2))
+    c = ((-1,1),)*3
+    runs = []
+    for executor in (None, ThreadPool(4)):
+        pso = PSO(sphere, c, 10, -.3, 0, 2.8, executor, random_state=3)
+        runs.append(pso.run(20))
+        assert pso.evaluations >= 210
+    assert runs[0][0] == runs[1][0] and runs[0][0] < .1
+    # Asynchronous, slow evaluations shouldn't hold up the others
+    from time import sleep
+    def slow_sphere(pts):
+        sleep(.05 if pts[1] > .5 else .001)
+        return sphere(pts)
+    pso = AsyncPSO(slow_sphere, c, 10, -.3, 0, 2.8, ThreadPool(4),
+                   random_state=3)
+    bestscore, bestpos = pso.run(20)
+    assert bestscore < .1 and pso.generation == 21
+    assert len([l for l in pso.log if np.isfinite(l[2])]) == \
+        pso.evaluations - pso.failures >= 210
+    # Failures are bounded
+    never = lambda pts: None
+    pso = PSO(never, c, 10, -.3, 0, 2.8,
+              failure_policy=FailurePolicy(max_retries=2, penalty=1.))
+    pso.run(3)
+    assert pso.evaluations == pso.failures == 4*10*3
+    assert pso.bestscore == 1.
+    # Positions still infeasible after the last retry aren't scored
+    for cls in (PSO, AsyncPSO):
+        policy = FailurePolicy(max_retries=2, infeasible_radius=.5)
+        swarms = []
+        def never_feasible(pts):
+            assert not policy.infeasible(swarms[0], pts)[0]
+            return None
+        pso = cls(never_feasible, c, 10, -.3, 0, 2.8, SerialExecutor(),
+                  failure_policy=policy, random_state=3)
+        swarms.append(pso.swarm)
+        pso.run(3)
+        assert pso.evaluations == pso.failures < 4*10*3
+        assert pso.generation == 4
+    # Memoized positions aren't scored again
+    from memo import EvaluationMemo
+    for cls in (PSO, AsyncPSO):
+        calls = []
+        def counted(pts):
+            calls.append(pts)
+            return sphere(pts)
+        memo = EvaluationMemo(.25)
+        pso = cls(counted, c, 10, -.3, 0, 2.8, memo=memo, random_state=3)
+        pso.run(20)
+        assert len(calls) == pso.evaluations == len(pso.log) < 210
+        assert memo.hits > 0
+        keys = set(memo.key(pts) for pts in calls)
+        # AsyncPSO may score a position again while it is being scored
+        assert len(keys) == len(memo) and (len(keys) == len(calls) or
+                                           cls is AsyncPSO)
+    # Resumed run is the same as uninterrupted one
+    import tempfile
+    filename = os.path.join(tempfile.mkdtemp(), 'pso.pkl')
+    reference = PSO(sphere, c, 10, -.3, 0, 2.8, random_state=5)
+    reference.run(10)
+    pso = PSO(sphere, c, 10, -.3, 0, 2.8, random_state=5,
+              checkpoint=filename, checkpoint_every=2)
+    pso.run(4)
+    del pso
+    resumed = PSO.resume(filename, sphere)
+    assert resumed.generation == 4
+    resumed.run(10)
+    np.testing.assert_array_equal(resumed.swarm.pts, reference.swarm.pts)
+    assert resumed.evaluations == reference.evaluations
+    os.remove(filename)
+    os.rmdir(os.path.dirname(filename))
+
 # Run tests when running this file itself, and not when importing it.
 if __name__ == "__main__":
+    test_swarm()
+    test_pso()
     test()
     print("Tests succeeded.")
@@ -0,0 +1,129 @@
+"""
+Surrogate model that predicts scores from the positions scored so far, so an
+optimizer can skip XFOIL runs for candidates that are unlikely to improve.
+
+RBFSurrogate interpolates the scores with cubic radial basis functions and
+a linear tail, in coordinates scaled to the unit box of the constraints.
+Its uncertainty measure is the distance to the nearest scored position:
+far away from known points a prediction means little, so such candidates
+are scored anyway.
+
+    pso = PSO(score, constraints, S, omega, theta_p, theta_g,
+              surrogate=RBFSurrogate(constraints))
+    pso.run(iterations)
+    print pso.saved_evaluations
+"""
+
+from __future__ import division
+import numpy as np
+
+
+class RBFSurrogate(object):
+    """
+    constraints      -> [[low,high],[low,high]] of the positions
+    max_points       -> Fit on at most this many of the best positions
+    min_points       -> Positions needed before screening, default 2*D+2
+    explore_distance -> Always score candidates at least this far (in unit
+                        box coordinates) from any scored position
+    min_fraction     -> Always score at least this fraction of candidates,
+                        the ones with the best predictions
+    smoothing        -> Added to the diagonal, keeps fit well-conditioned
+    """
+
+    def __init__(self, constraints, max_points=300, min_points=None,
+                 explore_distance=.1, min_fraction=.2, smoothing=1E-10):
+        constraints = np.asarray(constraints, dtype="float")
+        self.lower = constraints[:,0]
+        self.scale = constraints[:,1] - constraints[:,0]
+        self.max_points = max_points
+        self.min_points = min_points or 2*len(constraints) + 2
+        self.explore_distance = explore_distance
+        self.min_fraction = min_fraction
+        self.smoothing = smoothing
+        self.X = None
+
+    def _unit(self, X):
+        return (np.asarray(X, dtype="float") - self.lower) / self.scale
+
+    def fit(self, X, y):
+        """Fit on positions X (N x D) with scores y, non-finite scores are
+           left out. Returns False if there are too few points to fit."""
+        X, y = self._unit(X), np.asarray(y, dtype="float")
+        finite = np.isfinite(y)
+        X, y = X[finite], y[finite]
+        if len(y) < self.min_points:
+            self.X = None
+            return False
+        if len(y) > self.max_points:
+            best = np.argsort(y)[:self.max_points]
+            X, y = X[best], y[best]
+        N, D = X.shape
+        Phi = _distances(X, X)**3 + self.smoothing*np.eye(N)
+        P = np.hstack((np.ones((N, 1)), X))
+        A = np.vstack((np.hstack((Phi, P)),
+                       np.hstack((P.T, np.zeros((D+1, D+1))))))
+        b = np.concatenate((y, np.zeros(D+1)))
+        try:
+            coefs = np.linalg.solve(A, b)
+        except np.linalg.LinAlgError:
+            # E.g. positions that coincide
+            coefs = np.linalg.lstsq(A, b, rcond=-1)[0]
+        self.X = X
+        self.weights, self.tail = coefs[:N], coefs[N:]
+        return True
+
+    def predict(self, X):
+        """Returns predicted scores of positions X (M x D) and their
+           distance to the nearest scored position in unit box coordinates"""
+        X = self._unit(np.atleast_2d(X))
+        r = _distances(X, self.X)
+        predicted = (r**3).dot(self.weights) + self.tail[0] + \
+            X.dot(self.tail[1:])
+        return predicted, r.min(axis=1)
+
+    def select(self, X, reference):
+        """Boolean array of positions X worth scoring: predicted to beat
+           their reference score (e.g. personal best), far from anything
+           scored, or among the best min_fraction predictions. All of them
+           if the surrogate isn't fitted."""
+        X = np.atleast_2d(X)
+        if self.X is None:
+            return np.ones(len(X), dtype=bool)
+        predicted, distance = self.predict(X)
+        with np.errstate(invalid='ignore'):
+            selected = ((predicted < np.asarray(reference)) |
+                        (distance > self.explore_distance))
+        nbest = int(np.ceil(self.min_fraction * len(X)))
+        selected[np.argsort(predicted)[:nbest]] = True
+        return selected
+
+
+def _distances(X, Y):
+    """Euclidean distance of every row of X to every row of Y"""
+    return np.sqrt(((X[:,np.newaxis,:] - Y[np.newaxis,:,:])**2).sum(axis=2))
+
+
+def test():
+    '''Unit tests for this module.'''
+    c = ((-2,2), (-1,3))
+    f = lambda X: (X**2).sum(axis=1)
+    rs = np.random.RandomState(0)
+    X = rs.uniform((-2,-1), (2,3), (60,2))
+    s = RBFSurrogate(c)
+    assert s.fit(X, f(X))
+    # Interpolates
+    np.testing.assert_array_almost_equal(s.predict(X)[0], f(X), 5)
+    Xnew = rs.uniform((-2,-1), (2,3), (20,2))
+    predicted, distance = s.predict(Xnew)
+    assert np.abs(predicted - f(Xnew)).max() < .2
+    assert distance.max() < .3
+    # Candidates predicted worse than reference aren't selected
+    selected = s.select(Xnew, np.full(20, .5))
+    assert selected[f(Xnew) < .3].all() and not selected.all()
+    # Unfitted selects all
+    assert RBFSurrogate(c).select(Xnew, np.zeros(20)).all()
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print("Tests succeeded.")
@@ -0,0 +1,83 @@
+"""
+Multi-objective version of optimize_for_cl_nurbs.py: instead of minimizing
+0.5*Cd(Cl=0) + 0.5*Cd(Cl=0.4), MOPSO minimizes both drag coefficients and
+keeps the trade-off front. Designs for any weighting are picked from it
+afterwards, without running XFOIL again.
+"""
+
+from __future__ import division, print_function
+from os import remove
+from os.path import exists
+import numpy as np
+from string import ascii_uppercase
+from random import choice
+import matplotlib.pyplot as plt
+from optimization_algorithms.mopso import MOPSO
+from optimization_algorithms.executors import make_executor
+from airfoil_generators import nurbs
+from xfoil import xfoil
+
+Re = 300000
+constraints = np.array((
+#ta_u       ta_l        tb_u    tb_l        alpha_b     alpha_c
+(.01,.4), (.05,.4), (1,3),(0.05,3), (0.4,8), (1,10)
+))
+iterations, S, omega, theta_g, theta_p = 100, 12, .4, 1.5, 1.5
+weightings = (0, .25, .5, .75, 1)
+
+def construct_airfoil(*pts):
+    k = {}
+    k['ta_u'] = pts[0]
+    k['ta_l'] = pts[1]
+    k['tb_u'] = pts[2]
+    k['tb_l'] = pts[3]
+    k['alpha_b'] = pts[4]
+    k['alpha_c'] = pts[5]
+    return nurbs.NURBS(k)
+
+def score_pts(pts):
+    """Cd at Cl=0 and at Cl=0.4, None if not converged"""
+    # Make unique filename
+    randstr = ''.join(choice(ascii_uppercase) for i in range(20))
+    filename = "nurbs_{}.dat".format(randstr)
+    with open(filename, 'w') as af:
+        af.write(construct_airfoil(*pts).get_coords_plain())
+    # Both operating points in one XFOIL session
+    polar, polar2 = xfoil.oper_visc_batch([(filename, 'CL', 0, Re),
+                                           (filename, 'CL', 0.4, Re)],
+                                          iterlim=80)
+    remove(filename)
+    try:
+        objectives = polar[0][0][2], polar2[0][0][2]
+    except IndexError:
+        return None
+    return objectives if np.isfinite(objectives).all() else None
+
+def report(pso, objectives):
+    print("Generation {}: {} designs on the front".format(
+        pso.generation, len(pso.archive)))
+
+executor = make_executor('thread')
+# Swarm and archive are saved every generation, if the run is interrupted
+# running this script again continues where it was
+checkpoint = "optimize_for_cl_nurbs_pareto.pkl"
+if exists(checkpoint):
+    print("Resuming from", checkpoint)
+    pso = MOPSO.resume(checkpoint, score_pts, executor, report)
+else:
+    pso = MOPSO(score_pts, constraints, S, omega, theta_p, theta_g,
+                executor=executor, callback=report, checkpoint=checkpoint)
+archive = pso.run(iterations)
+executor.close()
+remove(checkpoint)
+
+plt.plot(archive.F[:,0], archive.F[:,1], 'bo')
+for w in weightings:
+    pts, (cd0, cd4) = archive.choose((1 - w, w))
+    plt.plot(cd0, cd4, 'rx', markersize=12)
+    print("Weight {} on Cl=0.4: Cd {} at Cl=0, {} at Cl=0.4, pos = {}"
+          .format(w, cd0, cd4, pts.__repr__()))
+plt.xlabel("Cd at Cl=0")
+plt.ylabel("Cd at Cl=0.4")
+plt.title("Pareto front, {} XFOIL runs".format(pso.evaluations))
+plt.show()
@@ -0,0 +1,343 @@
+"""
+Persistent cache of polars, so XFOIL isn't run again for an airfoil and flow
+condition that was calculated before, e.g. by an earlier optimization run or
+by another particle that ended up at the same position.
+
+Polars are stored in an SQLite database, which takes care of locking, so many
+worker processes can share one cache file. The key is a hash of the airfoil
+coordinates (rounded like ParametricAirfoil.get_coords_plain writes them) and
+of all flow conditions, formatted like they are sent to XFOIL. When more than
+max_entries polars are stored, the least recently used ones are evicted.
+
+Lookups only read the database. Hit and miss counts and the times polars
+were last used are kept in memory and written in one transaction by put(),
+stats() and close(), or when flush_every polars were used since the last
+write, so processes sharing the file don't queue up for its write lock on
+every lookup.
+
+    cache = PolarCache("polars.sqlite")
+    polar = cache.oper_visc_alpha("some_airfoil.dat", 0, 1E6, iterlim=80)
+    print cache.stats()
+"""
+
+from __future__ import division
+import os
+import sqlite3
+import hashlib
+import threading
+from time import time
+import cPickle as pickle
+
+import xfoil
+
+
+def geometry_key(airfoil, gen_naca=False):
+    """Canonical string for airfoil file contents or 'NACA xxxx(x)'. Only
+       the coordinates count, rounded to 6 decimals, not the airfoil name
+       or formatting of the file."""
+    if gen_naca:
+        return ' '.join(airfoil.upper().split())
+    with open(airfoil) as f:
+        text = f.read()
+    coords = []
+    for line in text.splitlines():
+        try:
+            coords.extend(float(v) for v in line.split())
+        except ValueError:
+            # Name line
+            continue
+    return '\n'.join("{:.6f}".format(c) for c in coords)
+
+
+def polar_key(geometry, mode, operating_point, Re, Mach=None, Ncrit=None,
+              iterlim=None, normalize=True):
+    """Hash of geometry_key() and flow conditions. Values are formatted the
+       way XFOIL gets them, so operating points that XFOIL can't tell apart
+       share a key."""
+    try:
+        oper = ' '.join("{:.3f}".format(v) for v in operating_point)
+    except TypeError:
+        oper = "{:.3f}".format(operating_point)
+    conditions = "{} {}|Re {}|Mach {:.3f}|Ncrit {}|ITER {:.0f}|NORM {}".format(
+        mode.upper(), oper, Re, Mach or 0,
+        xfoil.XFOIL_DEFAULT_NCRIT if Ncrit is None else Ncrit,
+        iterlim or xfoil.XFOIL_DEFAULT_ITER, bool(normalize))
+    h = hashlib.sha1(geometry)
+    h.update('\n' + conditions)
+    return h.hexdigest()
+
+
+class PolarCache(object):
+    """
+    Size-bounded LRU cache of parsed polars in an SQLite file. Safe to use
+    from several threads and processes at the same time, each gets its own
+    database connection. Polars of airfoils that didn't converge are cached
+    as well, as XFOIL would fail on them again; exceptions are not cached,
+    nor are partial polars a watchdog aborted (points[-1].aborted).
+    """
+
+    def __init__(self, filename, max_entries=100000, flush_every=100):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        # Statistics of this PolarCache object, see stats()
+        self.hits = 0
+        self.misses = 0
+        # Not yet written to the file: counts, and last use time per key
+        self._unflushed = {'hits': 0, 'misses': 0}
+        self._used = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS polars (
+                          key TEXT PRIMARY KEY, polar BLOB,
+                          last_used REAL)""")
+            db.execute("""CREATE INDEX IF NOT EXISTS polars_last_used
+                          ON polars (last_used)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS stats (
+                          name TEXT PRIMARY KEY, value INTEGER)""")
+            db.execute("""INSERT OR IGNORE INTO stats VALUES ('hits', 0)""")
+            db.execute("""INSERT OR IGNORE INTO stats VALUES ('misses', 0)""")
+
+    def _connect(self):
+        """Connection of current thread and process"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            # New thread, or forked process that must not reuse connection
+            local.db = sqlite3.connect(self.filename, timeout=60)
+            local.pid = os.getpid()
+        return local.db
+
+    def _count(self, name, key=None):
+        """Count hit or miss, remember when key was used. Returns True when
+           it's time to flush."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self._unflushed[name] += 1
+            if key is not None:
+                self._used[key] = time()
+            return len(self._used) >= self.flush_every
+
+    def _flush(self, db):
+        """Write counts and last use times to db, in its transaction"""
+        with self._lock:
+            unflushed, used = self._unflushed, self._used
+            self._unflushed, self._used = {'hits': 0, 'misses': 0}, {}
+        db.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                       [(n, name) for name, n in unflushed.items() if n])
+        db.executemany("UPDATE polars SET last_used = ? WHERE key = ?",
+                       [(t, key) for key, t in used.items()])
+
+    def flush(self):
+        """Write counts and last use times to the file"""
+        with self._connect() as db:
+            self._flush(db)
+
+    def get(self, key):
+        """Returns polar stored under key, None if not in cache"""
+        db = self._connect()
+        row = db.execute("SELECT polar FROM polars WHERE key = ?",
+                         (key,)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        if self._count('hits', key):
+            self.flush()
+        return pickle.loads(str(row[0]))
+
+    def put(self, key, polar):
+        """Store polar under key, evicting least recently used polars"""
+        blob = sqlite3.Binary(pickle.dumps(polar, pickle.HIGHEST_PROTOCOL))
+        with self._connect() as db:
+            # Last use times first, so eviction sees them
+            self._flush(db)
+            db.execute("INSERT OR REPLACE INTO polars VALUES (?, ?, ?)",
+                       (key, blob, time()))
+            n = db.execute("SELECT COUNT(*) FROM polars").fetchone()[0]
+            if n > self.max_entries:
+                db.execute("""DELETE FROM polars WHERE key IN (
+                              SELECT key FROM polars ORDER BY last_used
+                              LIMIT ?)""", (n - self.max_entries,))
+
+    def __len__(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM polars").fetchone()[0]
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM polars")
+
+    def close(self):
+        """Flush, and close the connection of the current thread"""
+        self.flush()
+        local = self._local
+        if getattr(local, 'pid', None) == os.getpid():
+            local.db.close()
+            del local.db, local.pid
+
+    def stats(self):
+        """Hits and misses of this object, and of all users of the file
+           (as far as they have flushed)"""
+        self.flush()
+        db = self._connect()
+        total = dict(db.execute("SELECT name, value FROM stats").fetchall())
+        return {'hits': self.hits, 'misses': self.misses,
+                'total_hits': total['hits'],
+                'total_misses': total['misses'],
+                'entries': len(self)}
+
+    def oper_visc_alpha(self, *args, **kwargs):
+        """Cached xfoil.oper_visc_alpha, takes the same arguments. Polars a
+           watchdog aborted (points[-1].aborted) are partial and not cached.
+           On a cache hit, telemetry gets no points."""
+        return self._oper_visc('ALFA', *args, **kwargs)
+
+    def oper_visc_cl(self, *args, **kwargs):
+        """Cached xfoil.oper_visc_cl, see oper_visc_alpha"""
+        return self._oper_visc('CL', *args, **kwargs)
+
+    def _oper_visc(self, mode, airfoil, operating_point, Re, Mach=None,
+                   normalize=True, iterlim=None, gen_naca=False, **kwargs):
+        """Other kwargs (show_seconds, watchdog, telemetry) are passed on to
+           xfoil._oper_visc"""
+        key = polar_key(geometry_key(airfoil, gen_naca), mode,
+                        operating_point, Re, Mach=Mach, iterlim=iterlim,
+                        normalize=normalize)
+        polar = self.get(key)
+        if polar is None:
+            telemetry = kwargs.get('telemetry')
+            if telemetry is None and kwargs.get('watchdog') is not None:
+                # Points tell whether the watchdog aborted the polar
+                telemetry = kwargs['telemetry'] = []
+            n = 0 if telemetry is None else len(telemetry)
+            polar = xfoil._oper_visc(xfoil.PCMDS[mode], airfoil,
+                                     operating_point, Re, Mach=Mach,
+                                     normalize=normalize, iterlim=iterlim,
+                                     gen_naca=gen_naca, **kwargs)
+            if telemetry is None or not _aborted(telemetry[n:]):
+                self.put(key, polar)
+        return polar
+
+    def oper_visc_batch(self, jobs, normalize=True, iterlim=None,
+                        gen_naca=False, pool=None, watchdog=None,
+                        telemetry=None):
+        """Cached xfoil.oper_visc_batch, only jobs that are not in the cache
+           are sent to XFOIL. Polars a watchdog aborted are not cached.
+           telemetry gets None for the jobs answered from the cache."""
+        jobs = list(jobs)
+        geometries = {}
+        keys, polars, todo = [], [], []
+        for job in jobs:
+            airfoil, mode, operating_point, Re = job[:4]
+            Mach, Ncrit = (tuple(job[4:]) + (None, None))[:2]
+            if airfoil not in geometries:
+                geometries[airfoil] = geometry_key(airfoil, gen_naca)
+            key = polar_key(geometries[airfoil], mode, operating_point, Re,
+                            Mach=Mach, Ncrit=Ncrit, iterlim=iterlim,
+                            normalize=normalize)
+            keys.append(key)
+            polars.append(self.get(key))
+            if polars[-1] is None:
+                todo.append(len(polars) - 1)
+        points = {}
+        if todo:
+            job_points = None
+            if watchdog is not None or telemetry is not None:
+                job_points = []
+            calculated = xfoil.oper_visc_batch(
+                [jobs[i] for i in todo], normalize=normalize,
+                iterlim=iterlim, gen_naca=gen_naca, pool=pool,
+                watchdog=watchdog, telemetry=job_points)
+            for n, (i, polar) in enumerate(zip(todo, calculated)):
+                if job_points is not None:
+                    points[i] = job_points[n]
+                if not _aborted(points.get(i)):
+                    self.put(keys[i], polar)
+                polars[i] = polar
+        if telemetry is not None:
+            telemetry.extend(points.get(i) for i in range(len(jobs)))
+        return polars
+
+
+def _aborted(points):
+    """True if a watchdog aborted the last of OperPoints points"""
+    return bool(points) and points[-1].aborted is not None
+
+
+def test():
+    '''Unit tests, against fake_xfoil.py instead of XFOIL.'''
+    import tempfile
+    import shutil
+    import numpy as np
+    from watchdog import DivergenceWatchdog
+    xfoil.configure_pool(binary='fake_xfoil.py', size=2)
+    tmp = tempfile.mkdtemp()
+    try:
+        # Only coordinates count for the key
+        a, b = os.path.join(tmp, 'a.dat'), os.path.join(tmp, 'b.dat')
+        with open(a, 'w') as f:
+            f.write("Airfoil A\n1.0 0.0\n0.5  0.06\n0 0\n0.5 -0.06\n1 0\n")
+        with open(b, 'w') as f:
+            f.write("1.000000 0.000000\n0.500000 0.060000\n0 0\n"
+                    "0.5 -0.060000\n1.0 0\n")
+        assert geometry_key(a) == geometry_key(b)
+        assert polar_key(geometry_key(a), 'alfa', 0, 1E6) == \
+            polar_key(geometry_key(b), 'ALFA', 0.0001, 1E6)
+        assert polar_key(geometry_key(a), 'ALFA', 0, 1E6) != \
+            polar_key(geometry_key(a), 'ALFA', 0, 1E6, Mach=.1)
+
+        # Hits and misses, a hit doesn't run XFOIL
+        cache = PolarCache(os.path.join(tmp, 'polars.sqlite'),
+                           max_entries=2)
+        telemetry = []
+        first = cache.oper_visc_alpha(a, 0, 1E6, iterlim=50,
+                                      telemetry=telemetry)
+        again = cache.oper_visc_alpha(b, 0, 1E6, iterlim=50,
+                                      telemetry=telemetry)
+        assert len(telemetry) == 1
+        assert again.info == first.info and len(again['CD']) == 1
+        np.testing.assert_array_equal(again.data, first.data)
+        other = PolarCache(cache.filename)
+        other.oper_visc_cl(a, 0, 1E6, iterlim=50)
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 1)
+        assert (stats['total_hits'], stats['total_misses']) == (1, 2)
+        assert stats['entries'] == 2
+
+        # Least recently used polar is evicted
+        cache.oper_visc_alpha(a, 0, 1E6, iterlim=50)
+        cache.oper_visc_alpha(a, 2, 1E6, iterlim=50)
+        assert len(cache) == 2 and cache.stats()['hits'] == 2
+        cache.oper_visc_alpha(a, 0, 1E6, iterlim=50)
+        assert cache.stats()['hits'] == 3
+        other.oper_visc_cl(a, 0, 1E6, iterlim=50)
+        assert other.stats()['misses'] == 2
+
+        # Polars a watchdog aborted aren't cached, batch only sends
+        # uncached jobs to XFOIL
+        impatient = DivergenceWatchdog(min_iterations=1, max_rms=1E-3)
+        cache.clear()
+        aborted = cache.oper_visc_alpha(a, 1, 1E6, watchdog=impatient)
+        assert len(aborted['CD']) == 0 and len(cache) == 0
+        assert np.isnan(aborted.info.xtrf_top)
+        telemetry = []
+        polars = cache.oper_visc_batch([(a, 'ALFA', 0, 1E6),
+                                        (a, 'ALFA', 1, 1E6)],
+                                       telemetry=telemetry)
+        assert len(cache) == 2 and len(telemetry[0]) == 1
+        telemetry = []
+        again = cache.oper_visc_batch([(b, 'ALFA', 1, 1E6),
+                                       (b, 'ALFA', 3, 1E6)],
+                                      telemetry=telemetry)
+        assert telemetry[0] is None and len(telemetry[1]) == 1
+        np.testing.assert_array_equal(again[0].data, polars[1].data)
+        cache.close()
+        other.close()
+    finally:
+        xfoil.get_pool().close()
+        shutil.rmtree(tmp)
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print "Tests succeeded."
@@ -0,0 +1,366 @@
+"""
+Non-blocking XFOIL evaluations, so one thread can keep many polars in flight.
+
+oper_visc_alpha_async and oper_visc_cl_async take the same arguments as
+their blocking counterparts in xfoil.py, but return a PolarFuture right
+away. Jobs wait in a queue until the AsyncEvaluator's pool has a free XFOIL
+session. Nothing blocks while XFOIL works: output lines are handed to a
+listener by the reader thread (the shared StreamMultiplexer thread on most
+platforms), which completes the future when the polar is listed. Returning
+the session to the pool and starting the next queued job, which may spawn
+XFOIL and write to its stdin, is left to a dispatcher thread, so the reader
+thread keeps delivering the output of all other sessions meanwhile.
+
+    futures = [oper_visc_alpha_async(f, 0, 1E6) for f in filenames]
+    polars = wait_all(futures)
+
+Results can also be collected with PolarFuture.add_done_callback, e.g. to
+resubmit work from an optimizer as soon as one evaluation returns.
+"""
+
+from __future__ import division
+import heapq
+from collections import deque
+from threading import Thread, Lock, Condition, Event
+from time import time
+
+from xfoil import (PCMDS, XfoilPool, XfoilTimeout, UnexpectedEndOfStream,
+                   parse_stdout_polar, _XFOIL_PATH)
+
+
+def oper_visc_alpha_async(*args, **kwargs):
+    """Non-blocking oper_visc_alpha, returns PolarFuture"""
+    return get_evaluator().submit(PCMDS['ALFA'], *args, **kwargs)
+
+def oper_visc_cl_async(*args, **kwargs):
+    """Non-blocking oper_visc_cl, returns PolarFuture"""
+    return get_evaluator().submit(PCMDS['CL'], *args, **kwargs)
+
+def wait_all(futures, timeout=None):
+    """Wait for all futures, returns list of their results in same order.
+       Raises the exception of the first failed future, or XfoilTimeout if
+       timeout [s] passes first."""
+    if timeout is not None:
+        deadline = time() + timeout
+    results = []
+    for future in futures:
+        remaining = None if timeout is None else max(deadline - time(), 0)
+        results.append(future.result(remaining))
+    return results
+
+
+class PolarFuture(object):
+    """Polar that is still being calculated"""
+
+    def __init__(self):
+        self._done = Event()
+        self._lock = Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        """True if result or exception is available"""
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for polar and return it, or raise exception of evaluation.
+           Raises XfoilTimeout if timeout [s] passes first."""
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait for evaluation and return its exception, None if fine"""
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """Call fn(future) when done, right away if already done. Is called
+           from reader thread, so fn should not block."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _wait(self, timeout):
+        if not self._done.wait(timeout):
+            raise XfoilTimeout("Polar not ready within {} s".format(timeout))
+
+    def _finish(self, result=None, exception=None):
+        with self._lock:
+            self._result, self._exception = result, exception
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class _Evaluation(object):
+    """Bookkeeping of one evaluation in flight"""
+    __slots__ = ('future', 'session', 'output', 'finished', 'timed_out')
+
+    def __init__(self, future, session):
+        self.future, self.session = future, session
+        self.output = ['']
+        self.finished = self.timed_out = False
+
+
+class AsyncEvaluator(object):
+    """
+    Runs submitted polar calculations on sessions of its own XfoilPool, at
+    most pool.size at a time, queueing the rest. The pool should not be
+    shared with blocking users, whose sessions would hold up queued jobs.
+    If pool.timeout is set, a watchdog thread kills XFOIL processes that
+    take longer, their futures raise XfoilTimeout.
+    """
+
+    def __init__(self, pool=None, **pool_kwargs):
+        """Use pool, or make one with XfoilPool(**pool_kwargs)"""
+        if pool is None:
+            pool_kwargs.setdefault('path', _XFOIL_PATH)
+            pool = XfoilPool(**pool_kwargs)
+        self.pool = pool
+        self._jobs = deque()
+        # Sessions of finished evaluations, for the dispatcher to check in
+        self._returned = deque()
+        self._lock = Lock()
+        self._wake = Condition(self._lock)
+        self._dispatcher = None
+        self._running = 0
+        self._closed = False
+        self._deadlines = []
+        self._watch_cond = Condition(Lock())
+        self._watchdog = None
+
+    def submit(self, pcmd, airfoil, operating_point, Re, Mach=None,
+               normalize=True, iterlim=None, gen_naca=False):
+        """Queue polar calculation, arguments as for _oper_visc. Returns
+           PolarFuture."""
+        future = PolarFuture()
+        with self._lock:
+            if self._closed:
+                raise Warning("AsyncEvaluator was closed")
+            self._jobs.append((future, (pcmd, airfoil, operating_point, Re,
+                                        Mach, normalize, iterlim, gen_naca)))
+            if self._dispatcher is None:
+                self._dispatcher = Thread(target=self._dispatch_loop)
+                self._dispatcher.daemon = True
+                self._dispatcher.start()
+            self._wake.notify()
+        return future
+
+    def pending(self):
+        """Number of jobs waiting for a session"""
+        with self._lock:
+            return len(self._jobs)
+
+    def _dispatch_loop(self):
+        """Check in sessions of finished evaluations and start queued jobs
+           while fewer than pool.size are running. Runs on its own thread,
+           not the reader thread, as spawning XFOIL or writing to its stdin
+           may take a while."""
+        while True:
+            with self._lock:
+                while not (self._closed or self._returned or (
+                        self._jobs and self._running < self.pool.size)):
+                    self._wake.wait()
+                if self._closed:
+                    return
+                returned, self._returned = self._returned, deque()
+                self._running -= len(returned)
+                start = bool(self._jobs) and self._running < self.pool.size
+                if start:
+                    self._running += 1
+                    future, job = self._jobs.popleft()
+            for session in returned:
+                self.pool.checkin(session)
+            if not start:
+                continue
+            try:
+                # Only waits if the pool is shared with blocking users
+                session = self.pool.checkout()
+            except Exception, e:
+                with self._lock:
+                    self._running -= 1
+                future._finish(exception=e)
+                continue
+            self._start(session, future, job)
+
+    def _start(self, session, future, job):
+        (pcmd, airfoil, operating_point, Re, Mach, normalize, iterlim,
+         gen_naca) = job
+        ev = _Evaluation(future, session)
+        def listener(line):
+            if line is None:
+                if ev.timed_out:
+                    self._finish(ev, exception=XfoilTimeout(
+                        "XFOIL killed after {} s".format(self.pool.timeout)))
+                else:
+                    self._finish(ev, exception=UnexpectedEndOfStream())
+                return
+            ev.output.append(line)
+            if 'ENDD' in line:
+                self._finish(ev)
+        try:
+            session.xf.set_listener(listener)
+            session.load(airfoil, normalize=normalize, gen_naca=gen_naca)
+            session.oper_setup(Re, Mach=Mach, iterlim=iterlim)
+            session.new_polar()
+            session.solve(pcmd, operating_point)
+            session.start_listing()
+        except Exception, e:
+            session.broken = True
+            self._finish(ev, exception=e)
+            return
+        if self.pool.timeout is not None:
+            self._watch(ev, time() + self.pool.timeout)
+
+    def _finish(self, ev, exception=None):
+        """Hand session back to dispatcher, complete future"""
+        with self._lock:
+            if ev.finished:
+                return
+            ev.finished = True
+        ev.session.xf.set_listener(None)
+        if exception is not None:
+            ev.session.broken = True
+        result = None
+        if exception is None:
+            try:
+                result = parse_stdout_polar(ev.output)
+            except Exception, e:
+                exception = e
+        # Checkin writes to XFOIL, leave it to the dispatcher thread
+        with self._lock:
+            self._returned.append(ev.session)
+            self._wake.notify()
+        ev.future._finish(result, exception)
+
+    def _watch(self, ev, deadline):
+        with self._watch_cond:
+            heapq.heappush(self._deadlines, (deadline, id(ev), ev))
+            if self._watchdog is None:
+                self._watchdog = Thread(target=self._watchdog_loop)
+                self._watchdog.daemon = True
+                self._watchdog.start()
+            self._watch_cond.notify()
+
+    def _watchdog_loop(self):
+        """Kill sessions of evaluations that passed their deadline. The
+           end of stream this causes completes the evaluation."""
+        while True:
+            with self._watch_cond:
+                while True:
+                    while self._deadlines and self._deadlines[0][2].finished:
+                        heapq.heappop(self._deadlines)
+                    now = time()
+                    if self._deadlines and self._deadlines[0][0] <= now:
+                        ev = heapq.heappop(self._deadlines)[2]
+                        break
+                    self._watch_cond.wait(self._deadlines[0][0] - now
+                                          if self._deadlines else None)
+            ev.timed_out = True
+            ev.session.kill()
+
+    def close(self):
+        """Stop dispatching, kill XFOIL processes that are not busy"""
+        with self._lock:
+            self._closed = True
+            returned, self._returned = self._returned, deque()
+            self._wake.notify()
+        self.pool.close()
+        for session in returned:
+            self.pool.checkin(session)
+
+
+_evaluator = None
+_evaluator_lock = Lock()
+
+def get_evaluator():
+    """Returns AsyncEvaluator used by the *_async functions"""
+    global _evaluator
+    with _evaluator_lock:
+        if _evaluator is None:
+            _evaluator = AsyncEvaluator()
+        return _evaluator
+
+def configure_evaluator(**kwargs):
+    """Replaces default evaluator by AsyncEvaluator(**kwargs), e.g.
+       configure_evaluator(size=16, timeout=60)"""
+    global _evaluator
+    with _evaluator_lock:
+        if _evaluator is not None:
+            _evaluator.close()
+        _evaluator = AsyncEvaluator(**kwargs)
+        return _evaluator
+
+
+def test():
+    '''Unit tests, against fake_xfoil.py instead of XFOIL.'''
+    import os
+    import numpy as np
+    import xfoil
+    airfoils = ["NACA 00{:02d}".format(t) for t in range(8, 20)]
+    evaluator = AsyncEvaluator(size=3, binary='fake_xfoil.py')
+    try:
+        # More jobs than sessions, queued ones start as sessions free up
+        futures = [evaluator.submit(PCMDS['ALFA'], airfoil, 1, 1E6,
+                                    gen_naca=True, iterlim=50)
+                   for airfoil in airfoils]
+        assert evaluator.pending() > 0
+        polars = wait_all(futures, timeout=30)
+        xfoil.configure_pool(binary='fake_xfoil.py', size=1)
+        for airfoil, polar in zip(airfoils, polars):
+            blocking = xfoil.oper_visc_alpha(airfoil, 1, 1E6, gen_naca=True,
+                                             iterlim=50)
+            np.testing.assert_array_equal(polar.data, blocking.data)
+        # Work resubmitted from done callbacks, on the reader thread
+        done = Event()
+        results = []
+        def resubmit(future):
+            results.append(future.result())
+            if len(results) < 6:
+                evaluator.submit(PCMDS['CL'], "NACA 2412", len(results)/10,
+                                 1E6, gen_naca=True, iterlim=50
+                                 ).add_done_callback(resubmit)
+            else:
+                done.set()
+        evaluator.submit(PCMDS['CL'], "NACA 2412", 0, 1E6, gen_naca=True,
+                         iterlim=50).add_done_callback(resubmit)
+        assert done.wait(30)
+        np.testing.assert_allclose([p['CL'][0] for p in results],
+                                   np.arange(6)/10)
+    finally:
+        evaluator.close()
+        xfoil.get_pool().close()
+
+    # Hung XFOIL processes are killed after the timeout
+    os.environ['FAKE_XFOIL_HANG_RATE'] = '1'
+    try:
+        evaluator = AsyncEvaluator(size=2, binary='fake_xfoil.py',
+                                   timeout=.5)
+        futures = [evaluator.submit(PCMDS['ALFA'], airfoil, 0, 1E6,
+                                    gen_naca=True) for airfoil in airfoils[:3]]
+        for future in futures:
+            assert isinstance(future.exception(10), XfoilTimeout)
+        # And when waiting for them
+        xfoil.configure_pool(binary='fake_xfoil.py', size=1, timeout=.5)
+        start = time()
+        try:
+            xfoil.oper_visc_alpha("NACA 0012", 0, 1E6, gen_naca=True)
+            raise AssertionError("Hung XFOIL not killed")
+        except XfoilTimeout:
+            pass
+        assert time() - start < 5
+    finally:
+        del os.environ['FAKE_XFOIL_HANG_RATE']
+        evaluator.close()
+        xfoil.get_pool().close()
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print "Tests succeeded."
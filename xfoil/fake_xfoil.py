@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""
+Stand-in for the XFOIL binary, for testing and benchmarking the code in this
+package without the real XFOIL, whose run time depends on the airfoil.
+
+It understands the part of XFOIL's interactive protocol that xfoil.py uses:
+NORM, LOAD, NACA, PLOP, OPER, ITER, VISC, RE, MACH, VPAR/N, PACC, ALFA, ASEQ,
+CL, CSEQ, PLIS and QUIT, and answers with output formatted like XFOIL's:
+Newton iteration blocks while solving and a PLIS polar table. Coefficients
+come from thin airfoil theory and a flat plate skin friction estimate, using
+thickness and camber of the loaded airfoil, so they depend on geometry and
+Re in a plausible, repeatable way.
+
+Behaviour is set with environment variables, which Xfoil's subprocess
+inherits:
+
+  FAKE_XFOIL_LATENCY       Seconds per operating point (default 0)
+  FAKE_XFOIL_STARTUP       Seconds before the banner is printed (default 0)
+  FAKE_XFOIL_FAILURE_RATE  Chance a point doesn't converge (default 0)
+  FAKE_XFOIL_HANG_RATE     Chance a point hangs until killed (default 0)
+  FAKE_XFOIL_SEED          Seed of failures and hangs (default: random)
+
+Use it by passing binary="fake_xfoil.py" to XfoilPool or configure_pool.
+"""
+
+from __future__ import division, print_function
+import math
+import os
+import random
+import sys
+import time
+
+LATENCY = float(os.environ.get('FAKE_XFOIL_LATENCY', 0))
+STARTUP = float(os.environ.get('FAKE_XFOIL_STARTUP', 0))
+FAILURE_RATE = float(os.environ.get('FAKE_XFOIL_FAILURE_RATE', 0))
+HANG_RATE = float(os.environ.get('FAKE_XFOIL_HANG_RATE', 0))
+SEED = os.environ.get('FAKE_XFOIL_SEED')
+
+rng = random.Random(SEED)
+
+
+def write(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+def readline():
+    line = sys.stdin.readline()
+    if not line:
+        # XFOIL's stdin was closed
+        sys.exit(0)
+    return line.rstrip('\r\n')
+
+def not_recognized(command):
+    write(" {:4s} command not recognized.  Type a \"?\" for list\n"
+          .format(command[:4]))
+
+
+class Airfoil(object):
+    """Thickness and camber, all the fake aerodynamics need"""
+
+    def __init__(self, name, thickness=.12, camber=0.):
+        self.name = name
+        self.thickness = thickness
+        self.camber = camber
+
+    @classmethod
+    def from_file(cls, filename):
+        """Returns (airfoil, whether file has a name line)"""
+        coords, name = [], None
+        with open(filename) as f:
+            for line in f:
+                try:
+                    coords.append([float(v) for v in line.split()[:2]])
+                except ValueError:
+                    name = line.strip()
+        coords = [c for c in coords if len(c) == 2]
+        airfoil = cls(name or os.path.basename(filename))
+        if coords:
+            # Coordinates run from TE over one surface to LE and back, pair
+            # points of both surfaces by x to estimate thickness and camber
+            ile = min(range(len(coords)), key=lambda i: coords[i][0])
+            first, second = coords[:ile+1], coords[ile:]
+            thickness, camber = 0., 0.
+            for x, y in first:
+                y2 = min(second, key=lambda c: abs(c[0]-x))[1]
+                thickness = max(thickness, abs(y-y2))
+                camber = max(camber, abs(y+y2)/2, key=abs)
+            airfoil.thickness, airfoil.camber = thickness, camber
+        return airfoil, name is not None
+
+    @classmethod
+    def naca(cls, digits):
+        if len(digits) == 4:
+            return cls("NACA " + digits, int(digits[2:])/100,
+                       int(digits[0])/100)
+        return cls("NACA " + digits, int(digits[3:])/100, .015*int(digits[0]))
+
+
+class Fake(object):
+
+    def __init__(self):
+        self.airfoil = Airfoil("NACA 0012")
+        self.normalize = False
+        self.viscous = False
+        self.Re = 0.
+        self.Mach = 0.
+        self.Ncrit = 9.
+        self.itmax = 10
+        self.pacc = False
+        self.polar = []
+
+    def coefficients(self, alpha):
+        """(CL, CD, CDp, CM, Top_Xtr, Bot_Xtr) at alpha [deg]"""
+        af = self.airfoil
+        beta = math.sqrt(max(1 - self.Mach**2, .1))
+        a = math.radians(alpha)
+        cl_lin = 2*math.pi*(a + 2*af.camber) / beta
+        # Soft stall
+        cl_max = 1.2 + 3*af.thickness
+        CL = cl_max*math.tanh(cl_lin/cl_max)
+        Re = max(self.Re, 1E4)
+        cf = .074/Re**.2
+        CDf = 2*cf*(1 + 2*af.thickness + 60*af.thickness**4)
+        CDp = .3*CDf*(1 + 4*af.thickness) + .01*(cl_lin - CL)**2
+        CD = CDf + CDp
+        CM = -math.pi/2*af.camber - .01*CL
+        Top_Xtr = min(max(.6 - .05*alpha - self.Ncrit/100, .01), 1.)
+        Bot_Xtr = min(max(.7 + .05*alpha - self.Ncrit/100, .01), 1.)
+        return CL, CD, CDp, CM, Top_Xtr, Bot_Xtr
+
+    def solve(self, alpha=None, cl=None):
+        """Print iterations like XFOIL does, add point to polar"""
+        if cl is not None:
+            beta = math.sqrt(max(1 - self.Mach**2, .1))
+            alpha = math.degrees(cl*beta/(2*math.pi)) - \
+                math.degrees(2*self.airfoil.camber)
+        CL, CD, CDp, CM, Top_Xtr, Bot_Xtr = self.coefficients(alpha)
+        if cl is not None:
+            CL = cl
+        if not self.viscous:
+            write("\n a = {:7.3f}      CL = {:8.4f}\n Cm = {:8.4f}"
+                  "     CDp = {:8.5f}\n".format(alpha, CL, CM, CDp))
+            return
+        if rng.random() < HANG_RATE:
+            while True:
+                time.sleep(3600)
+        converges = rng.random() >= FAILURE_RATE
+        needed = rng.randint(4, 12)
+        iterations = min(needed, self.itmax) if converges else self.itmax
+        write("\n Solving BL system ...\n")
+        rms = .5
+        for i in range(1, iterations+1):
+            if converges:
+                # Reach convergence criterion of 1E-4 at iteration 'needed'
+                rms = .5 * (2E-4/.5)**(i/needed) * .45
+            else:
+                rms = rms * rng.uniform(.7, 1.5)
+            if LATENCY:
+                time.sleep(LATENCY/iterations)
+            write(" Side 1  free  transition at x/c = {:7.4f}   76\n"
+                  " Side 2  free  transition at x/c = {:7.4f}   33\n"
+                  " {:3d}   rms: {:.4E}   max: {:.4E}   C at   43  1\n"
+                  "       a = {:6.3f}      CL = {:7.4f}\n"
+                  "      Cm = {:7.4f}     CD = {:8.5f}   =>   "
+                  "CDf = {:8.5f}    CDp = {:8.5f}\n\n".format(
+                      Top_Xtr, Bot_Xtr, i, rms, -3*rms, alpha, CL, CM, CD,
+                      CD - CDp, CDp))
+        if not (converges and needed <= self.itmax):
+            write(" VISCAL:  Convergence failed\n")
+            return
+        if self.pacc:
+            self.polar.append((alpha, CL, CD, CDp, CM, Top_Xtr, Bot_Xtr))
+
+    def plis(self):
+        mantissa, exponent = "{:.3e}".format(self.Re).split('e')
+        write("\n       XFOIL         Version 6.99\n\n"
+              " Calculated polar for: {}\n\n"
+              " 1 1 Reynolds number fixed          Mach number fixed\n\n"
+              " xtrf =   1.000 (top)        1.000 (bottom)\n"
+              " Mach = {:7.3f}     Re = {:9.3f} e {:d}     Ncrit = {:7.3f}\n\n"
+              "   alpha    CL        CD       CDp       CM     Top_Xtr"
+              "  Bot_Xtr\n"
+              "  ------ -------- --------- --------- -------- -------- "
+              "--------\n".format(self.airfoil.name, self.Mach,
+                                  float(mantissa), int(exponent),
+                                  self.Ncrit))
+        for point in self.polar:
+            write("  {:6.3f}  {:7.4f}  {:8.5f}  {:8.5f}  {:7.4f}  {:7.4f}"
+                  "  {:7.4f}\n".format(*point))
+        write("\n")
+
+    def sequence(self, args):
+        start, stop, step = [float(a) for a in args]
+        n = int(round((stop - start)/step)) if step else 0
+        return [start + i*step for i in range(n+1)]
+
+    def top(self):
+        """Top level menu, returns when QUIT is given"""
+        while True:
+            write("\n XFOIL   c>  ")
+            words = readline().split()
+            if not words:
+                continue
+            command, args = words[0].upper(), words[1:]
+            if command.startswith('NACA') and len(command) > 4:
+                # Digits given without a space
+                command, args = 'NACA', [command[4:]]
+            if command == 'QUIT':
+                return
+            elif command == 'NORM':
+                self.normalize = not self.normalize
+            elif command == 'LOAD':
+                try:
+                    self.airfoil, named = Airfoil.from_file(args[0])
+                except (IOError, OSError):
+                    write("\n LOAD: File OPEN error.\n")
+                    continue
+                if not named:
+                    write("\n Enter airfoil name   s>  ")
+                    name = readline().strip()
+                    self.airfoil.name = name or self.airfoil.name
+            elif command == 'NACA':
+                self.airfoil = Airfoil.naca(args[0])
+            elif command == 'PLOP':
+                while True:
+                    write("\n  Option, <cr>   c>  ")
+                    if not readline().strip():
+                        break
+            elif command == 'OPER':
+                self.oper()
+            else:
+                not_recognized(command)
+
+    def oper(self):
+        """OPER menu, returns on empty line"""
+        while True:
+            write("\n OPER{}   c>  ".format('v' if self.viscous else 'i'))
+            words = readline().split()
+            if not words:
+                return
+            command, args = words[0].upper(), words[1:]
+            if command == 'ITER':
+                self.itmax = int(args[0])
+            elif command == 'VISC':
+                self.viscous = not self.viscous
+                if self.viscous and args:
+                    self.Re = float(args[0])
+            elif command == 'RE':
+                self.Re = float(args[0])
+            elif command == 'MACH':
+                self.Mach = float(args[0])
+            elif command == 'VPAR':
+                while True:
+                    write("\n .VPAR{}   c>  ".format(
+                        'v' if self.viscous else 'i'))
+                    words = readline().split()
+                    if not words:
+                        break
+                    if words[0].upper() == 'N':
+                        self.Ncrit = float(words[1])
+            elif command == 'PACC':
+                self.pacc = not self.pacc
+                if self.pacc:
+                    self.polar = []
+                    write("\n Enter  polar save filename"
+                          "  OR  <return> for no file   s>  ")
+                    readline()
+                    write("\n Enter  polar dump filename"
+                          "  OR  <return> for no file   s>  ")
+                    readline()
+            elif command == 'ALFA':
+                self.solve(alpha=float(args[0]))
+            elif command == 'ASEQ':
+                for alpha in self.sequence(args):
+                    self.solve(alpha=alpha)
+            elif command == 'CL':
+                self.solve(cl=float(args[0]))
+            elif command == 'CSEQ':
+                for cl in self.sequence(args):
+                    self.solve(cl=cl)
+            elif command == 'PLIS':
+                self.plis()
+            else:
+                not_recognized(command)
+
+
+if __name__ == "__main__":
+    time.sleep(STARTUP)
+    write("\n ===================================================\n"
+          "  XFOIL Version 6.99 (fake_xfoil.py stand-in)\n"
+          " ===================================================\n")
+    Fake().top()
@@ -0,0 +1,301 @@
+"""
+Optional instrumentation of Xfoil processes, to see where the time of an
+evaluation goes: XFOIL computing, XFOIL waiting for Python to send the next
+command, lines waiting in the queue before Python reads them, or writing
+commands to the pipe.
+
+    instrument = Instrument()
+    configure_pool(instrument=instrument)
+    ...
+    print instrument.summary()
+    instrument.save("timings.jsonl")
+
+Every command line sent and every line received is timestamped. Commands
+are pipelined, so the time XFOIL spends on one is found from its prompts:
+XFOIL prints a prompt before reading each input line, so the prompt that
+follows input line i marks the moment XFOIL finished it. XFOIL waited for
+Python (idle) when an input line was sent after its prompt.
+"""
+
+from __future__ import division
+from collections import deque
+from threading import Lock
+from time import time
+import json
+import os
+import re
+
+import numpy as np
+
+from polar import OperStreamParser
+
+# Phase started by a command, other input lines continue the current phase
+COMMAND_PHASES = {
+    'NORM': 'load', 'LOAD': 'load', 'NACA': 'load',
+    'PLOP': 'setup', 'OPER': 'setup', 'ITER': 'setup', 'VISC': 'setup',
+    'RE': 'setup', 'MACH': 'setup', 'VPAR': 'setup', 'PACC': 'setup',
+    'ALFA': 'solve', 'ASEQ': 'solve', 'CL': 'solve', 'CSEQ': 'solve',
+    'PLIS': 'listing',
+    'ENDD': 'marker', 'PING': 'marker'}
+
+# Prompts end in e.g. 'c>' for commands and 's>' for strings, the '=>' in
+# XFOIL's CD line is not one
+_re_prompt = re.compile(r"\s[a-z]>(\s|$)")
+
+
+class Histogram(object):
+    """Counts of durations [s] in logarithmic bins, from lo to hi"""
+
+    def __init__(self, lo=1E-6, hi=1E3, per_decade=10):
+        decades = np.log10(hi) - np.log10(lo)
+        self.edges = np.logspace(np.log10(lo), np.log10(hi),
+                                 int(decades * per_decade) + 1)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=int)
+        self.n = 0
+        self.total = 0.
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        if not len(values):
+            return
+        clipped = np.clip(values, self.edges[0], self.edges[-1])
+        self.counts += np.histogram(clipped, self.edges)[0]
+        self.n += len(values)
+        self.total += values.sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.n += other.n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Upper edge of the bin containing the p-th percentile"""
+        if not self.n:
+            return None
+        i = np.searchsorted(np.cumsum(self.counts), p / 100 * self.n)
+        return min(self.edges[min(i, len(self.counts) - 1) + 1], self.max)
+
+    def to_dict(self):
+        if not self.n:
+            return {'n': 0}
+        return {'n': self.n, 'total': self.total, 'mean': self.total/self.n,
+                'min': self.min, 'max': self.max,
+                'p50': self.percentile(50), 'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'edges': self.edges.tolist(), 'counts': self.counts.tolist()}
+
+
+class SessionTrace(object):
+    """
+    Timestamps of one XFOIL process. Xfoil calls command() when it writes,
+    consumed() when it hands a line to the caller, and the stream reader
+    calls arrived() when a line came in.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.pid = os.getpid()
+        self.t_spawn = time()
+        # [time sent, text, phase] per input line
+        self.inputs = []
+        # [time arrived, time read, text] per output line
+        self.lines = []
+        # Arrival times of prompts
+        self.prompts = []
+        # Durations of writes to the pipe
+        self.writes = []
+        self._partial = ''
+        self._phase = 'setup'
+        self._nread = 0
+
+    def command(self, text, t_sent, duration):
+        self.writes.append(duration)
+        inputs = (self._partial + text).split('\n')
+        self._partial = inputs.pop()
+        for line in inputs:
+            words = line.split()
+            command = words[0].upper() if words else ''
+            if command in COMMAND_PHASES:
+                self._phase = COMMAND_PHASES[command]
+            self.inputs.append([t_sent, line, self._phase])
+
+    def arrived(self, line, t):
+        # A prompt has no newline, so its line only arrives with the output
+        # that follows it, but it was printed together with the line before
+        t_prompt = self.lines[-1][0] if self.lines else t
+        self.lines.append([t, None, line])
+        self.prompts.extend([t_prompt] * len(_re_prompt.findall(line)))
+
+    def consumed(self, t):
+        self.lines[self._nread][1] = t
+        self._nread += 1
+
+    def _input_times(self):
+        """[(start, end, idle)] per finished input line: when XFOIL started
+           and finished it and how long XFOIL waited for it"""
+        times = []
+        prompts = self.prompts
+        for i, (t_sent, text, phase) in enumerate(self.inputs):
+            if i + 1 >= len(prompts):
+                break
+            start = max(t_sent, prompts[i])
+            times.append((start, prompts[i+1], max(t_sent - prompts[i], 0)))
+        return times
+
+    def records(self):
+        """List of dicts, one per phase (startup, load, setup, solve,
+           listing), per operating point and per idle period"""
+        common = {'session': self.session_id, 'pid': self.pid}
+        records = []
+        def record(kind, start, latency, **kwargs):
+            rec = dict(common, phase=kind, start=start, latency=latency)
+            rec.update(kwargs)
+            records.append(rec)
+
+        inputs = list(self.inputs)
+        lines = list(self.lines)
+        times = self._input_times()
+        if self.prompts:
+            record('startup', self.t_spawn, self.prompts[0] - self.t_spawn)
+        group = None
+        for i, (start, end, idle) in enumerate(times):
+            t_sent, text, phase = inputs[i]
+            if idle > 0:
+                record('idle', start - idle, idle, command=text)
+            words = text.split()
+            starts_group = words and words[0].upper() in COMMAND_PHASES
+            if group is not None and (phase != group['phase'] or
+                                      (starts_group and phase == 'solve')):
+                records.append(group)
+                group = None
+            if group is None:
+                group = dict(common, phase=phase, start=start, command=text)
+            group['latency'] = end - group['start']
+        if group is not None:
+            records.append(group)
+
+        for rec in [r for r in records if r['phase'] == 'solve']:
+            records.extend(self._point_records(rec, lines, common))
+        records = [r for r in records if r['phase'] != 'marker']
+        records.sort(key=lambda r: r['start'])
+        return records
+
+    def _point_records(self, solve, lines, common):
+        """Records of the operating points of a solve record"""
+        end = solve['start'] + solve['latency']
+        parser = OperStreamParser()
+        records = []
+        previous = solve['start']
+        for t_arrived, t_read, line in lines:
+            if solve['start'] < t_arrived <= end:
+                for point in parser.feed(line):
+                    records.append(dict(common, phase='point',
+                                        start=previous,
+                                        latency=t_arrived - previous,
+                                        alpha=point.alpha,
+                                        converged=point.converged,
+                                        iterations=point.iterations))
+                    previous = t_arrived
+        for point in parser.close():
+            records.append(dict(common, phase='point', start=previous,
+                                latency=end - previous, alpha=point.alpha,
+                                converged=point.converged,
+                                iterations=point.iterations))
+        return records
+
+    def histograms(self):
+        """Dict of Histogram per phase, plus 'queue' for the time lines
+           waited before they were read and 'write' for pipe writes"""
+        histograms = {}
+        def add(kind, values):
+            histograms.setdefault(kind, Histogram()).add(values)
+        for rec in self.records():
+            add(rec['phase'], rec['latency'])
+        add('queue', [t_read - t_arrived for t_arrived, t_read, line
+                      in list(self.lines) if t_read is not None])
+        add('write', list(self.writes))
+        return histograms
+
+
+class Instrument(object):
+    """
+    Collects a SessionTrace for every Xfoil constructed with it, and
+    aggregates them per process. Records of closed sessions are kept up to
+    max_records.
+    """
+
+    def __init__(self, max_records=100000):
+        self._lock = Lock()
+        self._live = []
+        self._records = deque(maxlen=max_records)
+        self._histograms = {}
+        self._next_id = 0
+
+    def trace(self):
+        """New SessionTrace, called by Xfoil when spawning XFOIL"""
+        with self._lock:
+            trace = SessionTrace(self._next_id)
+            self._next_id += 1
+            self._live.append(trace)
+        return trace
+
+    def finish(self, trace):
+        """Fold trace of a closed XFOIL into the process totals"""
+        with self._lock:
+            if trace not in self._live:
+                return
+            self._live.remove(trace)
+        records = trace.records()
+        histograms = trace.histograms()
+        with self._lock:
+            self._records.extend(records)
+            _merge_into(self._histograms, histograms)
+
+    def records(self):
+        """Records of closed and live sessions, see SessionTrace.records"""
+        with self._lock:
+            records, live = list(self._records), list(self._live)
+        for trace in live:
+            records.extend(trace.records())
+        return records
+
+    def histograms(self):
+        """Dict of Histogram per phase over all sessions of this process"""
+        with self._lock:
+            live = list(self._live)
+            histograms = {}
+            _merge_into(histograms, self._histograms)
+        for trace in live:
+            _merge_into(histograms, trace.histograms())
+        return histograms
+
+    def summary(self):
+        """Total seconds XFOIL computed, XFOIL waited for commands, lines
+           waited to be read and Python spent writing commands"""
+        histograms = self.histograms()
+        busy = sum(h.total for kind, h in histograms.items()
+                   if kind in ('startup', 'load', 'setup', 'solve',
+                               'listing'))
+        def total(kind):
+            return histograms[kind].total if kind in histograms else 0.
+        return {'xfoil': busy, 'idle': total('idle'),
+                'queue': total('queue'), 'write': total('write')}
+
+    def save(self, filename):
+        """Write records as JSON, one per line"""
+        with open(filename, 'w') as f:
+            for rec in self.records():
+                f.write(json.dumps(rec) + '\n')
+
+
+def _merge_into(histograms, other):
+    for kind, histogram in other.items():
+        if kind not in histograms:
+            histograms[kind] = Histogram()
+        histograms[kind].merge(histogram)
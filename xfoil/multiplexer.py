@@ -0,0 +1,185 @@
+"""
+Reads the stdout of many XFOIL processes from a single thread.
+
+Every NonBlockingStreamReader runs its own thread, which is fine for a few
+XFOIL processes, but with dozens of them the reader threads mostly compete
+for the GIL. The StreamMultiplexer instead waits on all pipes at once with
+select.poll(), reads whatever arrived and hands complete lines to a callback
+registered per stream. The number of threads stays at one, however many
+XFOIL processes are running.
+
+select.poll() doesn't work on pipes on Windows, check AVAILABLE before use.
+"""
+
+from __future__ import division
+import os
+import atexit
+import select
+import traceback
+from threading import Thread, Lock
+
+# Windows can't poll pipes
+AVAILABLE = hasattr(select, 'poll')
+
+_EVENTS_IN = (select.POLLIN | select.POLLPRI | select.POLLHUP |
+              select.POLLERR) if AVAILABLE else 0
+
+
+class StreamMultiplexer(object):
+    """
+    Owns a daemon thread that reads lines from registered streams, e.g.
+    some_xfoil_subprocess.stdout, and calls callback(line) for every complete
+    line and callback(None) when the stream ends. Callbacks run on the
+    multiplexer thread, so they should be quick, e.g. put line in a queue.
+    """
+
+    def __init__(self):
+        if not AVAILABLE:
+            raise Warning("StreamMultiplexer needs select.poll()")
+        self._poll = select.poll()
+        # fd -> [stream, callback, incomplete last line]
+        self._streams = {}
+        # Streams are registered by the multiplexer thread itself, a byte
+        # written to the wakeup pipe interrupts poll() to make it do so.
+        self._pending = []
+        self._lock = Lock()
+        self._wake_r, self._wake_w = os.pipe()
+        self._poll.register(self._wake_r, select.POLLIN)
+        self._stopped = False
+        self._t = Thread(target=self._loop)
+        self._t.daemon = True
+        self._t.start()
+        self.pid = os.getpid()
+        # Stop before interpreter shutdown tears down what callbacks use
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop reading, streams are not read anymore after this"""
+        self._stopped = True
+        os.write(self._wake_w, b'x')
+        self._t.join(1)
+
+    def register(self, stream, callback):
+        """Start delivering lines of stream to callback(line)"""
+        with self._lock:
+            self._pending.append((stream, callback))
+        os.write(self._wake_w, b'x')
+
+    def __len__(self):
+        """Number of streams being read"""
+        with self._lock:
+            return len(self._streams) + len(self._pending)
+
+    def _register_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            for stream, callback in pending:
+                fd = stream.fileno()
+                # Keep reference to stream, so fd isn't closed and reused
+                # before end of stream is seen
+                self._streams[fd] = [stream, callback, '']
+                self._poll.register(fd, _EVENTS_IN)
+
+    def _deliver(self, callback, line):
+        try:
+            callback(line)
+        except Exception:
+            # Never let a faulty callback stop reading of other streams
+            traceback.print_exc()
+
+    def _loop(self):
+        while not self._stopped:
+            self._register_pending()
+            try:
+                events = self._poll.poll()
+            except select.error:
+                # Interrupted by signal
+                continue
+            if self._stopped:
+                return
+            for fd, event in events:
+                if fd == self._wake_r:
+                    os.read(fd, 4096)
+                    continue
+                entry = self._streams.get(fd)
+                if entry is None:
+                    continue
+                data = os.read(fd, 65536)
+                if data:
+                    lines = (entry[2] + data).split('\n')
+                    # Last item is incomplete, e.g. an XFOIL prompt
+                    entry[2] = lines.pop()
+                    for line in lines:
+                        self._deliver(entry[1], line + '\n')
+                else:
+                    # End of stream
+                    if entry[2]:
+                        self._deliver(entry[1], entry[2])
+                    self._deliver(entry[1], None)
+                    with self._lock:
+                        self._poll.unregister(fd)
+                        del self._streams[fd]
+
+
+_multiplexer = None
+_multiplexer_lock = Lock()
+
+def get_multiplexer():
+    """Returns the StreamMultiplexer shared by all Xfoil instances"""
+    global _multiplexer
+    with _multiplexer_lock:
+        # A forked process doesn't inherit the thread, so needs its own
+        if _multiplexer is None or _multiplexer.pid != os.getpid():
+            _multiplexer = StreamMultiplexer()
+        return _multiplexer
+
+
+def test():
+    '''Unit tests, on pipes and on processes of fake_xfoil.py.'''
+    from Queue import Queue
+    import threading
+    mux = StreamMultiplexer()
+    try:
+        # Lines split over writes, incomplete last line, end of stream
+        received = {}
+        done = Queue()
+        def make_callback(name):
+            received[name] = []
+            def callback(line):
+                received[name].append(line)
+                if line is None:
+                    done.put(name)
+            return callback
+        pipes = {}
+        for name in 'ab':
+            r, w = os.pipe()
+            pipes[name] = w
+            mux.register(os.fdopen(r), make_callback(name))
+        os.write(pipes['a'], b'first li')
+        os.write(pipes['b'], b'one\ntwo\n')
+        os.write(pipes['a'], b'ne\nprompt>  ')
+        for w in pipes.values():
+            os.close(w)
+        assert set([done.get(timeout=5), done.get(timeout=5)]) == set('ab')
+        assert received['a'] == ['first line\n', 'prompt>  ', None]
+        assert received['b'] == ['one\n', 'two\n', None]
+        assert len(mux) == 0
+
+        # One thread reads all XFOIL processes
+        import xfoil
+        threads = threading.active_count()
+        pool = xfoil.XfoilPool(size=6, path=xfoil._XFOIL_PATH,
+                               binary='fake_xfoil.py')
+        sessions = [pool.checkout() for i in range(6)]
+        assert all(session.ping() for session in sessions)
+        assert threading.active_count() <= threads + 1
+        for session in sessions:
+            pool.checkin(session)
+        pool.close()
+    finally:
+        mux.stop()
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print "Tests succeeded."
@@ -0,0 +1,366 @@
+"""
+Parsing of XFOIL output.
+
+Polar.from_lines reads the polar that PLIS lists after all operating points
+are done (parse_stdout_polar in xfoil.py uses it). A Polar keeps its data in
+a NumPy structured array with one field per column, so columns can be taken
+by name and many polars take little memory. For old code, a Polar can still
+be indexed and unpacked like the (data_array, data_header, infodict) tuple
+that parse_stdout_polar used to return.
+
+The OperStreamParser in this file reads the OPER
+output itself, line by line while XFOIL is still working, and recognizes
+every operating point as soon as XFOIL is done with it. For a long ASEQ
+sweep, results can be used (or the sweep aborted) right away.
+
+For every Newton iteration of the viscous solution, XFOIL prints a block:
+
+ Side 1  free  transition at x/c =  0.6189   76
+ Side 2  free  transition at x/c =  0.6818   33
+   5   rms: 0.7412E-04   max: -0.2512E-02   C at   43  1
+       a =  0.000      CL =  0.2512
+      Cm = -0.0527     CD =  0.00654   =>   CDf =  0.00522    CDp =  0.00132
+
+XFOIL stops iterating when rms drops below 1E-4, so a block with such an rms
+completes a converged point. A point that doesn't converge within the
+iteration limit is followed by 'VISCAL:  Convergence failed'.
+"""
+
+from __future__ import division
+from cStringIO import StringIO
+import numpy as np
+import re
+
+# Convergence criterion on rms of Newton residuals, EPS1 in XFOIL source
+XFOIL_EPS1 = 1E-4
+
+_re_transition = re.compile(r"Side\s+(\d)\s.*transition at x/c =\s*(\S+)")
+_re_residual = re.compile(r"^\s*(\d+)\s+rms:\s*(\S+)\s+max:\s*(\S+)")
+_re_alpha_cl = re.compile(r"a =\s*(\S+)\s+CL =\s*(\S+)")
+_re_cm_cd = re.compile(r"Cm =\s*(\S+)\s+CD =\s*(\S+)\s+=>\s+CDf =\s*(\S+)"
+                       r"\s+CDp =\s*(\S+)")
+_re_failed = re.compile(r"Convergence failed")
+_re_divider = re.compile(r"\s*---")
+_re_info = re.compile(r"xtrf=(\d+\.\d+)\(top\)(\d+\.\d+)\(bottom\)"
+                      r"Mach=(\d+\.\d+)Re=(\d+\.\d+e\d+)Ncrit=(\d+\.\d+)")
+
+# Columns listed by PLIS
+POLAR_FIELDS = ('alpha', 'CL', 'CD', 'CDp', 'CM', 'Top_Xtr', 'Bot_Xtr')
+
+
+class PolarInfo(object):
+    """Conditions a polar was calculated for. Can be used like the dict
+       parse_stdout_polar used to return, e.g. info['Re']."""
+    __slots__ = ('xtrf_top', 'xtrf_bottom', 'Mach', 'Ncrit', 'Re')
+
+    def __init__(self, xtrf_top, xtrf_bottom, Mach, Ncrit, Re):
+        self.xtrf_top, self.xtrf_bottom = xtrf_top, xtrf_bottom
+        self.Mach, self.Ncrit, self.Re = Mach, Ncrit, Re
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.__slots__]
+
+    def __eq__(self, other):
+        return isinstance(other, PolarInfo) and self.items() == other.items()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __reduce__(self):
+        return (PolarInfo, tuple(getattr(self, k) for k in self.__slots__))
+
+    def __repr__(self):
+        return "PolarInfo({})".format(", ".join(
+            "{}={}".format(k, v) for k, v in self.items()))
+
+
+class Polar(object):
+    """
+    Polar data in a structured array, polar.data['CD'] gives the drag of
+    all points, polar.data[0] the first point. polar.info holds conditions.
+    polar[0], polar[1] and polar[2] give a plain 2D float array (a view,
+    not a copy), the header list and info, like the old tuple.
+    """
+    __slots__ = ('data', 'info')
+
+    def __init__(self, data, info):
+        self.data = data
+        self.info = info
+
+    @staticmethod
+    def dtype(header=POLAR_FIELDS):
+        return np.dtype([(str(name), np.float64) for name in header])
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Parse XFOIL stdout lines that end with PLIS output and one more
+           line, e.g. the one with the end marker"""
+        # Find location of data from last ---- divider
+        for i in xrange(len(lines)-1, -1, -1):
+            if _re_divider.match(lines[i]):
+                divider = i
+                break
+        else:
+            raise ValueError("No polar listing in XFOIL output")
+        # What columns mean
+        header = lines[divider-1].split()
+        # Parse info lines in one go
+        info = re.sub(r"\s", "", ''.join(lines[divider-4:divider-2]))
+        m = _re_info.search(info)
+        xtrf_top, xtrf_bottom, Mach, Re, Ncrit = map(float, m.groups())
+        info = PolarInfo(xtrf_top, xtrf_bottom, Mach, Ncrit, Re)
+        # Convert whole data block at once
+        values = np.array(''.join(lines[divider+1:-2]).split(),
+                          dtype=np.float64)
+        data = values.view(cls.dtype(header))
+        return cls(data, info)
+
+    @classmethod
+    def from_points(cls, points, info=None):
+        """Make polar of OperPoints, e.g. from OperStreamParser. Points that
+           didn't converge are left out, like XFOIL does."""
+        data = np.array([tuple(getattr(p, f) for f in POLAR_FIELDS)
+                         for p in points if p.converged],
+                        dtype=cls.dtype())
+        return cls(data, info)
+
+    @classmethod
+    def concatenate(cls, polars):
+        """One polar with the points of all polars, info of the first"""
+        polars = list(polars)
+        return cls(np.concatenate([p.data for p in polars]), polars[0].info)
+
+    @property
+    def header(self):
+        return list(self.data.dtype.names)
+
+    @property
+    def array(self):
+        """Data as 2D float array, shares memory with self.data"""
+        return self.data.view(np.float64).reshape(len(self.data),
+                                                  len(self.header))
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return self.data[key]
+        return (self.array, self.header, self.info)[key]
+
+    def __iter__(self):
+        return iter((self.array, self.header, self.info))
+
+    def __reduce__(self):
+        return (Polar, (self.data, self.info))
+
+    def tostring(self):
+        """Serialize to compact binary string, see fromstring()"""
+        f = StringIO()
+        info = self.info
+        np.savez(f, data=self.data, info=np.array(
+            [getattr(info, k) for k in PolarInfo.__slots__]
+            if info is not None else []))
+        return f.getvalue()
+
+    @classmethod
+    def fromstring(cls, s):
+        npz = np.load(StringIO(s))
+        info = npz['info']
+        return cls(npz['data'], PolarInfo(*info) if len(info) else None)
+
+    def __repr__(self):
+        return "Polar({} points, {})".format(len(self.data), self.info)
+
+
+class OperPoint(object):
+    """One operating point as solved by XFOIL. Field names follow the PLIS
+       header. iterations is the number of Newton iterations used, rms the
+       residual of every iteration. aborted is the reason if a watchdog
+       gave up on the point, else None."""
+    __slots__ = ('alpha', 'CL', 'CD', 'CDp', 'CM', 'Top_Xtr', 'Bot_Xtr',
+                 'converged', 'iterations', 'rms', 'aborted')
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, None)
+        self.converged = False
+        self.iterations = 0
+        self.rms = []
+
+    def __repr__(self):
+        return ("OperPoint(alpha={}, CL={}, CD={}, CM={}, converged={}, "
+                "iterations={}{})".format(
+                    self.alpha, self.CL, self.CD, self.CM, self.converged,
+                    self.iterations, ", aborted={!r}".format(self.aborted)
+                    if self.aborted else ""))
+
+
+class OperStreamParser(object):
+    """
+    Incremental parser for the OPER output of XFOIL. Feed it lines as they
+    arrive, feed() returns the operating points they completed:
+
+        parser = OperStreamParser()
+        for line in lines:
+            for point in parser.feed(line):
+                ...
+        leftover = parser.close()
+    """
+
+    def __init__(self):
+        self._point = None
+        self._rms = None
+        # Transition lines come first in an iteration block, they're only
+        # assigned to a point once the residual line tells which point
+        self._xtr = [None, None]
+
+    def feed(self, line):
+        """Parse one line, returns list of completed OperPoints"""
+        done = []
+        m = _re_residual.search(line)
+        if m:
+            iteration = int(m.group(1))
+            if (self._point is not None and
+                    iteration <= self._point.iterations):
+                # Iteration count restarted without a convergence failure,
+                # so previous point converged
+                done.append(self._finish(True))
+            if self._point is None:
+                self._point = OperPoint()
+            self._point.iterations = iteration
+            self._point.Top_Xtr, self._point.Bot_Xtr = self._xtr
+            self._rms = float(m.group(2))
+            self._point.rms.append(self._rms)
+            return done
+        m = _re_transition.search(line)
+        if m:
+            # Side 1 is the top surface
+            self._xtr[m.group(1) != '1'] = float(m.group(2))
+            return done
+        if self._point is None:
+            return done
+        m = _re_alpha_cl.search(line)
+        if m:
+            self._point.alpha = float(m.group(1))
+            self._point.CL = float(m.group(2))
+            return done
+        m = _re_cm_cd.search(line)
+        if m:
+            p = self._point
+            p.CM, p.CD = float(m.group(1)), float(m.group(2))
+            p.CDp = float(m.group(4))
+            if self._rms is not None and self._rms < XFOIL_EPS1:
+                done.append(self._finish(True))
+            return done
+        if _re_failed.search(line):
+            done.append(self._finish(False))
+        return done
+
+    @property
+    def current(self):
+        """OperPoint being solved, None between points"""
+        return self._point
+
+    def abort(self, reason):
+        """Give up on current point, returns it marked as aborted"""
+        point = self._finish(False)
+        point.aborted = reason
+        return point
+
+    def close(self):
+        """End of output, returns list with point still being parsed"""
+        if self._point is None or self._point.CD is None:
+            self._point = None
+            return []
+        return [self._finish(False)]
+
+    def _finish(self, converged):
+        point, self._point, self._rms = self._point, None, None
+        point.converged = converged
+        return point
+
+
+def test():
+    '''Unit tests of the parsers, on captured XFOIL output.'''
+    import cPickle as pickle
+    # Two listings in one output, e.g. when a session is reused, and a
+    # non-default Mach, Ncrit and forced transition in the second
+    captured = """
+ Calculated polar for: NACA 0012
+
+ xtrf =   1.000 (top)        1.000 (bottom)
+ Mach =   0.000     Re =     1.000 e 6     Ncrit =   9.000
+
+   alpha    CL        CD       CDp       CM     Top_Xtr  Bot_Xtr
+  ------ -------- --------- --------- -------- -------- --------
+   0.000   0.0000   0.00540   0.00101   0.0000   0.7410   0.7410
+
+ Calculated polar for: NACA 2412
+
+ xtrf =   0.100 (top)        0.500 (bottom)
+ Mach =   0.600     Re =     2.500 e 5     Ncrit =  11.000
+
+   alpha    CL        CD       CDp       CM     Top_Xtr  Bot_Xtr
+  ------ -------- --------- --------- -------- -------- --------
+  -1.000   0.1375   0.01074   0.00267  -0.0541   0.1000   0.5000
+   2.500   0.5389   0.01132   0.00312  -0.0573   0.1000   0.5000
+
+ENDD
+"""
+    lines = [line + '\n' for line in captured.split('\n')]
+    polar = Polar.from_lines(lines[:-1])
+    assert polar.info == PolarInfo(.1, .5, .6, 11., 2.5E5)
+    assert polar.header == list(POLAR_FIELDS)
+    np.testing.assert_array_equal(polar.data['alpha'], (-1, 2.5))
+    np.testing.assert_array_equal(polar['CD'], (.01074, .01132))
+    # Old tuple interface
+    array, header, info = polar
+    assert array.shape == (2, 7) and array[1, 1] == .5389
+    assert info['Ncrit'] == 11. and header[2] == 'CD'
+    # Serialization
+    for copy in (pickle.loads(pickle.dumps(polar, 2)),
+                 Polar.fromstring(polar.tostring())):
+        np.testing.assert_array_equal(copy.data, polar.data)
+        assert copy.info == polar.info
+    try:
+        Polar.from_lines(lines[:5])
+        raise AssertionError("Output without listing parsed")
+    except ValueError:
+        pass
+
+    # Stream parser: a converged point, a failed one, one cut off
+    def block(i, rms, cl):
+        return [" Side 1  free  transition at x/c =  0.6189   76\n",
+                " Side 2  free  transition at x/c =  0.6818   33\n",
+                "   {}   rms: {}   max: -0.2512E-02   C at   43  1\n"
+                .format(i, rms),
+                "       a =  0.000      CL =  {}\n".format(cl),
+                "      Cm = -0.0527     CD =  0.00654   =>   CDf =  0.00522"
+                "    CDp =  0.00132\n"]
+    output = (block(1, '0.5E+00', .2) + block(2, '0.7E-04', .25) +
+              block(1, '0.3E+00', .3) + block(2, '0.2E+00', .31) +
+              [" VISCAL:  Convergence failed\n"] + block(1, '0.4E+00', .4))
+    parser = OperStreamParser()
+    points = []
+    for line in output:
+        points.extend(parser.feed(line))
+    assert [p.converged for p in points] == [True, False]
+    assert points[0].CL == .25 and points[0].rms == [.5, .7E-4]
+    assert points[0].Top_Xtr == .6189 and points[0].Bot_Xtr == .6818
+    assert points[1].iterations == 2 and parser.current.CL == .4
+    aborted = parser.abort("test")
+    assert aborted.aborted == "test" and parser.current is None
+    assert parser.close() == []
+    polar = Polar.from_points(points + [aborted])
+    np.testing.assert_array_equal(polar['CL'], (.25,))
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print "Tests succeeded."
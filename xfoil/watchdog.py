@@ -0,0 +1,102 @@
+"""
+Policy for aborting XFOIL runs that clearly won't converge.
+
+An airfoil that doesn't converge still costs the full iteration limit at
+every operating point, which with iterlim=500 is most of the run time of an
+optimization. The OperStreamParser records the rms residual of every Newton
+iteration, so a DivergenceWatchdog can look at the history of the point
+being solved and tell XfoilSession.iter_points to give up on it.
+
+    telemetry = []
+    polar = oper_visc_alpha(fname, 0, 1E6, iterlim=500,
+                            watchdog=DivergenceWatchdog(), telemetry=telemetry)
+    print telemetry[0].iterations, telemetry[0].rms, telemetry[0].aborted
+"""
+
+from __future__ import division
+
+
+class DivergenceWatchdog(object):
+    """
+    Judges a point diverging when, after min_iterations:
+    - rms is above max_rms, or
+    - rms grew to more than growth times the lowest rms seen, or
+    - the lowest rms of the last stall_window iterations isn't below
+      stall_factor times the lowest rms before them.
+    Set a criterion to None to switch it off.
+    """
+
+    def __init__(self, min_iterations=10, max_rms=1., growth=100.,
+                 stall_window=30, stall_factor=.9):
+        self.min_iterations = min_iterations
+        self.max_rms = max_rms
+        self.growth = growth
+        self.stall_window = stall_window
+        self.stall_factor = stall_factor
+
+    def diverging(self, point):
+        """Returns reason if OperPoint point should be aborted, else None"""
+        rms = point.rms
+        if len(rms) < self.min_iterations:
+            return None
+        if self.max_rms is not None and rms[-1] > self.max_rms:
+            return "rms {:.3g} above {:.3g}".format(rms[-1], self.max_rms)
+        if self.growth is not None and rms[-1] > self.growth*min(rms):
+            return "rms grew from {:.3g} to {:.3g}".format(min(rms), rms[-1])
+        window = self.stall_window
+        if (window is not None and len(rms) > window and
+                min(rms[-window:]) > self.stall_factor*min(rms[:-window])):
+            return "rms stalled at {:.3g} for {} iterations".format(
+                min(rms), window)
+        return None
+
+
+def test():
+    '''Unit tests, aborting polars of fake_xfoil.py instead of XFOIL.'''
+    import os
+    import numpy as np
+    import xfoil
+    from polar import OperPoint
+    def point(rms):
+        p = OperPoint()
+        p.rms = list(rms)
+        p.iterations = len(rms)
+        return p
+    watchdog = DivergenceWatchdog(min_iterations=3, stall_window=4)
+    assert watchdog.diverging(point((5, 5))) is None
+    assert "above" in watchdog.diverging(point((.1, .1, 2)))
+    assert "grew" in watchdog.diverging(point((.5, 1E-3, .5)))
+    assert "stalled" in watchdog.diverging(point((.1, .01, .01, .01, .01,
+                                                  .01)))
+    assert watchdog.diverging(point(.5**np.arange(20))) is None
+    assert DivergenceWatchdog(max_rms=None, growth=None, stall_window=None
+                              ).diverging(point((10,)*20)) is None
+
+    # Points of the fake never converge, their rms wanders about
+    os.environ['FAKE_XFOIL_FAILURE_RATE'] = '1'
+    try:
+        pool = xfoil.configure_pool(binary='fake_xfoil.py', size=1)
+        telemetry = []
+        polar = xfoil.oper_visc_alpha("NACA 0012", [0, 2, 1], 1E6,
+                                      gen_naca=True, iterlim=500,
+                                      watchdog=DivergenceWatchdog(),
+                                      telemetry=telemetry)
+        assert len(telemetry) == 1 and telemetry[0].aborted
+        assert telemetry[0].iterations < 500
+        assert len(polar['CD']) == 0 and np.isnan(polar.info.xtrf_top)
+        # Session was killed, the pool replaces it
+        assert pool._idle == []
+        telemetry = []
+        xfoil.oper_visc_batch([("NACA 0012", 'ALFA', 0, 1E6)] * 2,
+                              gen_naca=True, iterlim=500,
+                              watchdog=DivergenceWatchdog(),
+                              telemetry=telemetry)
+        assert all(points[-1].aborted for points in telemetry)
+    finally:
+        del os.environ['FAKE_XFOIL_FAILURE_RATE']
+        xfoil.get_pool().close()
+
+# Run tests when running this file itself, and not when importing it.
+if __name__ == "__main__":
+    test()
+    print "Tests succeeded."
@@ -4,30 +4,44 @@ This file contains all code necessary for interfacing with XFOIL.
 The Xfoil class circumvents blocking problems (caused by the interactive
 nature of XFOIL) by using the NonBlockingStreamReader class, that runs the
 blocking some_xfoil_subprocess.stdout.readline() call in a separate thread,
-exchanging information with it using a queue.
+exchanging information with it using a queue. Where the platform supports
+it, MultiplexedStreamReader is used instead, which shares one thread between
+all XFOIL processes (see multiplexer.py).
 
 This enables the Xfoil class to interact with XFOIL, and to read polars from
 stdout instead of having to write a file to disk, eliminating latency there.
+Reading blocks on the queue, so a thread waiting for XFOIL sleeps instead of
+spinning; an XFOIL that doesn't answer before the deadline is killed.
 (Airfoil data still needs to be read from a file by XFOIL.)
 
 Multiple XFOIL subprocesses can be run simultaneously, simply by constructing
 the Xfoil class multiple times.
 
+Spawning XFOIL and setting it up takes longer than calculating a single
+operating point, so oper_visc_alpha and oper_visc_cl take a long-lived
+XfoilSession from an XfoilPool, instead of starting a new process every call.
+The pool can be sized with configure_pool().
+
 As such, this is probably the fastest and most versatile XFOIL automization
 script out there. (I've seen a good MATLAB implementation, but it still relied
 on files for output, and was not interactive.)
 """
 
 from __future__ import division
-from time import sleep
+from time import sleep, time
 import subprocess as subp
-import numpy as np
 import os
 import re
 import sys
 
-from threading import Thread
+from threading import Thread, Lock, Condition
 from Queue import Queue, Empty
+from contextlib import contextmanager
+from multiprocessing import cpu_count
+import atexit
+
+import multiplexer
+from polar import OperStreamParser, Polar, PolarInfo
 
 if sys.platform == 'win32':
     XFOIL_BIN = "xfoil.exe"
@@ -36,17 +50,25 @@ elif sys.platform == 'darwin':
 elif sys.platform == 'linux2':
     XFOIL_BIN = "xfoil"
 
+# XFOIL defaults, used to bring a reused session back to a known state
+XFOIL_DEFAULT_ITER = 10
+XFOIL_DEFAULT_NCRIT = 9
+
+# XFOIL commands for single value and sequence, per operating point mode
+PCMDS = {'ALFA': ["ALFA","ASEQ"], 'CL': ["Cl","CSEQ"]}
+
 def oper_visc_alpha(*args, **kwargs):
     """Wrapper for _oper_visc"""
-    return _oper_visc(["ALFA","ASEQ"], *args, **kwargs)
+    return _oper_visc(PCMDS['ALFA'], *args, **kwargs)
 
 def oper_visc_cl(*args, **kwargs):
     """Wrapper for _oper_visc"""
-    return _oper_visc(["Cl","CSEQ"], *args, **kwargs)
+    return _oper_visc(PCMDS['CL'], *args, **kwargs)
 
 
 def _oper_visc(pcmd, airfoil, operating_point, Re, Mach=None,
-             normalize=True, show_seconds=None, iterlim=None, gen_naca=False):
+             normalize=True, show_seconds=None, iterlim=None, gen_naca=False,
+             watchdog=None, telemetry=None):
     """
     Convenience function that returns polar for specified airfoil and
     Reynolds number for (range of) alpha or cl.
@@ -63,90 +85,188 @@ def _oper_visc(pcmd, airfoil, operating_point, Re, Mach=None,
        plot=False     -> Display XFOIL plotting window
        iterlim=None   -> Set a new iteration limit (XFOIL standard is 10)
        gen_naca=False -> Generate airfoil='NACA xxxx(x)' within XFOIL
+       watchdog=None  -> DivergenceWatchdog, aborts diverging points (the
+                         polar then has nan xtrf in its info)
+       telemetry=None -> List to append an OperPoint per point to, with
+                         iteration count and residual history
     """
-    # Circumvent different current working directory problems
-    path = os.path.dirname(os.path.realpath(__file__))
-    xf = Xfoil(path)
-
-    if normalize:
-        xf.cmd("NORM")
-    # Generate NACA or load from file
-    if gen_naca:
-        xf.cmd(airfoil)
+    if show_seconds:
+        # Plotting needs graphics enabled, so use a private XFOIL process
+        # instead of one from the pool
+        session = XfoilSession(_XFOIL_PATH, graphics=True)
+        try:
+            polar = _run_polar(session, pcmd, airfoil, operating_point, Re,
+                               Mach, normalize, iterlim, gen_naca,
+                               watchdog, telemetry)
+            sleep(show_seconds)
+        finally:
+            session.close()
     else:
-        xf.cmd('LOAD {}\n\n'.format(airfoil),
-               autonewline=False)
-    # Disable G(raphics) flag in Plotting options
-    if not show_seconds:
-        xf.cmd("PLOP\nG\n\n", autonewline=False)
-    # Enter OPER menu
-    xf.cmd("OPER")
-    if iterlim:
-        xf.cmd("ITER {:.0f}".format(iterlim))
-    xf.cmd("VISC {}".format(Re))
-    if Mach:
-        xf.cmd("MACH {:.3f}".format(Mach))
-
-    # Turn polar accumulation on, double enter for no savefile or dumpfile
-    xf.cmd("PACC\n\n\n", autonewline=False)
-    # Calculate polar
-    try:
-        if len(operating_point) != 3:
-            raise Warning("oper pt is single value or [start, stop, interval]")
-        # * unpacks, same as (alpha[0], alpha[1],...)
-        xf.cmd("{:s} {:.3f} {:.3f} {:.3f}".format(pcmd[1], *operating_point))
-    except TypeError:
-        # If iterating doesn't work, assume it's a single digit
-        xf.cmd("{:s} {:.3f}".format(pcmd[0], operating_point))
-
-    # List polar and send recognizable end marker
-    xf.cmd("PLIS\nENDD\n\n", autonewline=False)
-    
+        with get_pool().session() as session:
+            polar = _run_polar(session, pcmd, airfoil, operating_point, Re,
+                               Mach, normalize, iterlim, gen_naca,
+                               watchdog, telemetry)
+    return polar
+
+
+def iter_oper_visc_alpha(*args, **kwargs):
+    """Generator version of oper_visc_alpha, see _iter_oper_visc"""
+    return _iter_oper_visc(PCMDS['ALFA'], *args, **kwargs)
+
+def iter_oper_visc_cl(*args, **kwargs):
+    """Generator version of oper_visc_cl, see _iter_oper_visc"""
+    return _iter_oper_visc(PCMDS['CL'], *args, **kwargs)
+
+def _iter_oper_visc(pcmd, airfoil, operating_point, Re, Mach=None,
+                    normalize=True, iterlim=None, gen_naca=False,
+                    watchdog=None):
+    """
+    Yields an OperPoint for every operating point as soon as XFOIL has
+    converged it, or has given up on it (point.converged is False).
+    Arguments as for _oper_visc, a watchdog ends the sequence at the first
+    diverging point. Stop iterating (or call .close() on the
+    generator) to abort a sequence, the XFOIL process is then replaced.
+
+    Example, stop sweep once past max. lift:
+       best = None
+       for point in iter_oper_visc_alpha(fname, [0, 20, .5], 1E6):
+           if best and point.converged and point.CL < best.CL:
+               break
+           best = point
+    """
+    with get_pool().session() as session:
+        session.load(airfoil, normalize=normalize, gen_naca=gen_naca)
+        session.oper_setup(Re, Mach=Mach, iterlim=iterlim)
+        session.new_polar()
+        for point in session.iter_points(pcmd, operating_point, watchdog):
+            yield point
+
+
+def _run_polar(session, pcmd, airfoil, operating_point, Re, Mach,
+               normalize, iterlim, gen_naca, watchdog=None, telemetry=None):
+    """Let session calculate one polar, returns parsed polar."""
+    session.load(airfoil, normalize=normalize, gen_naca=gen_naca)
+    session.oper_setup(Re, Mach=Mach, iterlim=iterlim)
+    session.new_polar()
     print "Xfoil module starting read"
-    # Keep reading until end marker is encountered
-    output = ['']
-    while not re.search("ENDD", output[-1]):
-        line = xf.readline()
-        if line:
-            output.append(line)
+    polar = _solve_polar(session, pcmd, operating_point, Re, Mach, None,
+                         watchdog, telemetry)
     print "Xfoil module ending read"
-    if show_seconds:
-        sleep(show_seconds)
-    #print ''.join(output)
+    return polar
+
+
+def _solve_polar(session, pcmd, operating_point, Re, Mach, Ncrit,
+                 watchdog=None, telemetry=None):
+    """Solve and parse polar in a set up session. Only parses OPER output
+       on the fly when it needs to watch convergence or report it.
+       If the watchdog aborts a point, XFOIL is killed before it lists the
+       polar: the converged points are returned, with info xtrf_top and
+       xtrf_bottom nan as XFOIL didn't report them."""
+    if watchdog is None and telemetry is None:
+        session.solve(pcmd, operating_point)
+        return parse_stdout_polar(session.list_polar())
+    output = ['']
+    points = list(session.iter_points(pcmd, operating_point, watchdog,
+                                      output))
+    if telemetry is not None:
+        telemetry.extend(points)
+    if points and points[-1].aborted:
+        # XFOIL was killed before it could list the polar
+        Ncrit = XFOIL_DEFAULT_NCRIT if Ncrit is None else Ncrit
+        return Polar.from_points(points, PolarInfo(
+            float('nan'), float('nan'), float(Mach or 0), float(Ncrit),
+            float(Re)))
     return parse_stdout_polar(output)
 
 
-def parse_stdout_polar(lines):
-    """Converts polar 'PLIS' data to array"""    
-    def clean_split(s): return re.split('\s+', s.replace(os.linesep,''))[1:]
+def oper_visc_batch(jobs, normalize=True, iterlim=None, gen_naca=False,
+                    pool=None, watchdog=None, telemetry=None):
+    """
+    Calculates a polar for every job, running the jobs back to back in one
+    XFOIL session. An airfoil is only loaded again when it differs from the
+    one of the previous job, the polar is reset between jobs with PACC.
+    Returns list with one parsed polar per job, see parse_stdout_polar.
 
-    # Find location of data from ---- divider
-    for i, line in enumerate(lines):
-        if re.match('\s*---', line):
-            dividerIndex = i
-    
-    # What columns mean
-    data_header = clean_split(lines[dividerIndex-1])
-
-    # Clean info lines
-    info = ''.join(lines[dividerIndex-4:dividerIndex-2])
-    info = re.sub("[\r\n\s]","", info)
-    # Parse info with regular expressions
-    def p(s): return float(re.search(s, info).group(1))
-    infodict = {
-     'xtrf_top': p("xtrf=(\d+\.\d+)"),
-     'xtrf_bottom': p("\(top\)(\d+\.\d+)\(bottom\)"),
-     'Mach': p("Mach=(\d+\.\d+)"),
-     'Ncrit': p("Ncrit=(\d+\.\d+)"),
-     'Re': p("Re=(\d+\.\d+e\d+)")
-    }
-
-    # Extract, clean, convert to array
-    datalines = lines[dividerIndex+1:-2]
-    data_array = np.array(
-    [clean_split(dataline) for dataline in datalines], dtype='float')
-
-    return data_array, data_header, infodict
+    args:
+       jobs           -> List of (airfoil, mode, operating_point, Re) or
+                         (airfoil, mode, operating_point, Re, Mach, Ncrit)
+                         tuples, mode is 'ALFA' or 'CL' and operating_point
+                         a single value or list of [start, stop, interval].
+
+    kwargs:
+       normalize=True -> Normalize airfoils through NORM command
+       iterlim=None   -> Set a new iteration limit (XFOIL standard is 10)
+       gen_naca=False -> Generate airfoil='NACA xxxx(x)' within XFOIL
+       pool=None      -> XfoilPool to take session from, default get_pool()
+       watchdog=None  -> DivergenceWatchdog, aborts diverging points
+       telemetry=None -> List to append a list of OperPoints per job to
+
+    Example, Cd at Cl=0 and Cl=.4 with one LOAD:
+       oper_visc_batch([(fname, 'CL', 0, Re), (fname, 'CL', .4, Re)])
+    """
+    if pool is None:
+        pool = get_pool()
+    jobs = list(jobs)
+    polars = []
+    # A session is replaced after pool.max_uses polars, so large batches
+    # are spread over consecutive sessions
+    while len(polars) < len(jobs):
+        with pool.session() as session:
+            loaded = None
+            while (len(polars) < len(jobs) and
+                   (session.uses < pool.max_uses or not session.uses)):
+                job = jobs[len(polars)]
+                airfoil, mode, operating_point, Re = job[:4]
+                Mach, Ncrit = (tuple(job[4:]) + (None, None))[:2]
+                if airfoil != loaded:
+                    session.load(airfoil, normalize=normalize,
+                                 gen_naca=gen_naca)
+                    loaded = airfoil
+                session.oper_setup(Re, Mach=Mach, iterlim=iterlim,
+                                   Ncrit=Ncrit)
+                session.new_polar()
+                points = None if telemetry is None else []
+                polars.append(_solve_polar(session, PCMDS[mode.upper()],
+                                           operating_point, Re, Mach, Ncrit,
+                                           watchdog, points))
+                if telemetry is not None:
+                    telemetry.append(points)
+                if session.broken:
+                    # Killed by watchdog, continue in a new session
+                    break
+    return polars
+
+
+# Path of XFOIL binaries, circumvents current working directory problems
+_XFOIL_PATH = os.path.dirname(os.path.realpath(__file__))
+_default_pool = None
+_default_pool_lock = Lock()
+
+def get_pool():
+    """Returns pool used by oper_visc_alpha and oper_visc_cl, creating it
+       on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = XfoilPool(path=_XFOIL_PATH)
+        return _default_pool
+
+def configure_pool(**kwargs):
+    """Replaces default pool by one constructed with XfoilPool(**kwargs),
+       e.g. configure_pool(size=8, max_uses=10)."""
+    global _default_pool
+    kwargs.setdefault('path', _XFOIL_PATH)
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = XfoilPool(**kwargs)
+        return _default_pool
+
+
+def parse_stdout_polar(lines):
+    """Converts polar 'PLIS' data to Polar, which can be unpacked like the
+       (data_array, data_header, infodict) tuple"""
+    return Polar.from_lines(lines)
 
 
 class Xfoil():
@@ -156,81 +276,521 @@ class Xfoil():
     on the XFOIL process.
     """
     
-    def __init__(self, path="",binary=""):
-        """Spawn xfoil child process"""
+    def __init__(self, path="",binary="", multiplex=None, instrument=None):
+        """Spawn xfoil child process. Its stdout is read by the shared
+           StreamMultiplexer thread if multiplex (default: when supported
+           by the platform), otherwise by a thread of its own. Commands
+           and lines are timestamped if an Instrument is given (see
+           instrument.py)."""
         if not binary:
             binary = XFOIL_BIN
+        if multiplex is None:
+            multiplex = multiplexer.AVAILABLE
+        self._instrument = instrument
+        self._trace = None
         self.xfinst = subp.Popen(os.path.join(path, binary),
                   stdin=subp.PIPE, stdout=subp.PIPE, stderr=subp.PIPE)
-        self._stdoutnonblock = NonBlockingStreamReader(self.xfinst.stdout)
+        on_line = None
+        if instrument is not None:
+            self._trace = instrument.trace()
+            on_line = self._trace.arrived
+        if multiplex:
+            self._stdoutnonblock = MultiplexedStreamReader(self.xfinst.stdout,
+                                                           on_line=on_line)
+        else:
+            self._stdoutnonblock = NonBlockingStreamReader(self.xfinst.stdout,
+                                                           on_line=on_line)
         self._stdin = self.xfinst.stdin
         self._stderr = self.xfinst.stderr
 
     def cmd(self, cmd, autonewline=True):
         """Give a command. Set newline=False for manual control with '\n'"""
         n = '\n' if autonewline else ''
-        self.xfinst.stdin.write(cmd + n)
-
-    def readline(self):
-        """Read one line, returns None if empty"""
-        return self._stdoutnonblock.readline()
+        if self._trace is None:
+            self.xfinst.stdin.write(cmd + n)
+        else:
+            start = time()
+            self.xfinst.stdin.write(cmd + n)
+            self._trace.command(cmd + n, start, time() - start)
+
+    def readline(self, timeout=None, block=None):
+        """Read one line, returns None if empty. Waits at most timeout [s]
+           for a line, or until one arrives if block=True."""
+        line = self._stdoutnonblock.readline(timeout, block)
+        if line and self._trace is not None:
+            self._trace.consumed(time())
+        return line
+
+    def set_listener(self, listener):
+        """Have listener(line) called for every line read from now on,
+           instead of queueing it for readline(). None ends listening."""
+        if listener is not None and self._trace is not None:
+            trace, deliver = self._trace, listener
+            def listener(line):
+                if line is not None:
+                    trace.consumed(time())
+                deliver(line)
+        self._stdoutnonblock.set_listener(listener)
 
     def close(self):
         #print "Xfoil: instance closed through .close()"
-        self.xfinst.kill()
+        # Killing an already reaped process raises OSError
+        if self.xfinst.poll() is None:
+            self.xfinst.kill()
+        if self._trace is not None:
+            self._instrument.finish(self._trace)
     def __enter__(self):
         """Gets called when entering 'with ... as ...' block"""
         return self
     def __exit__(self):
         """Gets called when exiting 'with ... as ...' block"""
         #print "Xfoil: instance closed through __exit__"
-        self.xfinst.kill()
+        self.close()
     def __del__(self):
         """Gets called when deleted with 'del ...' or garbage collected"""
         #print "Xfoil: instance closed through __del__ (e.g. garbage collection)"
-        self.xfinst.kill()
+        self.close()
+
+
+class XfoilSession(object):
+    """
+    A long-lived XFOIL process that keeps track of the state it was brought
+    into (normalization flag, viscous mode, Re, Mach, iteration limit, polar
+    accumulation), so it can be reused for many polars. Commands that toggle
+    a flag (NORM, VISC, PACC) are only sent when the flag has to change.
+    """
+
+    def __init__(self, path="", binary="", graphics=False, timeout=None,
+                 instrument=None):
+        """Spawn XFOIL and disable graphics unless asked for. XFOIL is
+           killed if a polar takes longer than timeout seconds."""
+        self.xf = Xfoil(path, binary, instrument=instrument)
+        self.timeout = timeout
+        self._solve_start = None
+        # Number of polars calculated by this process
+        self.uses = 0
+        # Set when XFOIL is in an unknown state, e.g. after an exception
+        self.broken = False
+        self._in_oper = False
+        self._normalize = False
+        self._viscous = False
+        self._Re = None
+        self._Mach = 0
+        self._iterlim = XFOIL_DEFAULT_ITER
+        self._Ncrit = XFOIL_DEFAULT_NCRIT
+        self._pacc = False
+        if not graphics:
+            # Disable G(raphics) flag in Plotting options
+            self.xf.cmd("PLOP\nG\n\n", autonewline=False)
+
+    def _top(self):
+        """Go to top level menu"""
+        if self._in_oper:
+            self.xf.cmd("")
+            self._in_oper = False
+
+    def _oper(self):
+        """Go to OPER menu"""
+        if not self._in_oper:
+            self.xf.cmd("OPER")
+            self._in_oper = True
+
+    def load(self, airfoil, normalize=True, gen_naca=False):
+        """Load airfoil file, or generate airfoil='NACA xxxx(x)'"""
+        self._top()
+        if normalize != self._normalize:
+            self.xf.cmd("NORM")
+            self._normalize = normalize
+        # Generate NACA or load from file
+        if gen_naca:
+            self.xf.cmd(airfoil)
+        else:
+            self.xf.cmd('LOAD {}\n\n'.format(airfoil),
+                        autonewline=False)
+
+    def oper_setup(self, Re, Mach=None, iterlim=None, Ncrit=None):
+        """Set flow conditions in OPER menu. None means XFOIL default."""
+        self._oper()
+        iterlim = iterlim or XFOIL_DEFAULT_ITER
+        if iterlim != self._iterlim:
+            self.xf.cmd("ITER {:.0f}".format(iterlim))
+            self._iterlim = iterlim
+        if not self._viscous:
+            # VISC toggles viscous mode, so only use it once
+            self.xf.cmd("VISC {}".format(Re))
+            self._viscous = True
+        elif Re != self._Re:
+            self.xf.cmd("RE {}".format(Re))
+        self._Re = Re
+        Mach = Mach or 0
+        if Mach != self._Mach:
+            self.xf.cmd("MACH {:.3f}".format(Mach))
+            self._Mach = Mach
+        Ncrit = XFOIL_DEFAULT_NCRIT if Ncrit is None else Ncrit
+        if Ncrit != self._Ncrit:
+            self.xf.cmd("VPAR\nN {}\n\n".format(Ncrit), autonewline=False)
+            self._Ncrit = Ncrit
+
+    def new_polar(self):
+        """Start accumulating a new, empty polar"""
+        self._oper()
+        if self._pacc:
+            # Turn accumulation of previous polar off
+            self.xf.cmd("PACC")
+        # Turn polar accumulation on, double enter for no savefile or dumpfile
+        self.xf.cmd("PACC\n\n\n", autonewline=False)
+        self._pacc = True
+
+    def solve(self, pcmd, operating_point):
+        """Calculate operating point(s), pcmd is e.g. ["ALFA","ASEQ"]"""
+        self._oper()
+        self.uses += 1
+        self._solve_start = time()
+        try:
+            if len(operating_point) != 3:
+                raise Warning(
+                    "oper pt is single value or [start, stop, interval]")
+            # * unpacks, same as (alpha[0], alpha[1],...)
+            self.xf.cmd("{:s} {:.3f} {:.3f} {:.3f}".format(pcmd[1],
+                                                           *operating_point))
+        except TypeError:
+            # If iterating doesn't work, assume it's a single digit
+            self.xf.cmd("{:s} {:.3f}".format(pcmd[0], operating_point))
+
+    def list_polar(self):
+        """List polar and return all stdout lines up to the end marker.
+           Raises XfoilTimeout if this takes longer than self.timeout
+           seconds after solve() was called."""
+        self.start_listing()
+        if self.timeout is None:
+            return self.read_until("ENDD")
+        start = self._solve_start or time()
+        return self.read_until("ENDD", max(start+self.timeout-time(), 0))
+
+    def start_listing(self):
+        """Send PLIS followed by the ENDD end marker, without reading"""
+        self._oper()
+        self.xf.cmd("PLIS\nENDD", autonewline=True)
+
+    def iter_points(self, pcmd, operating_point, watchdog=None,
+                    lines=None):
+        """Like solve() followed by list_polar(), but yields an OperPoint
+           as soon as XFOIL is done with it. Closing the generator before
+           the end leaves XFOIL busy, so then the session is killed.
+           If watchdog (see watchdog.py) finds the point being solved is
+           diverging, the session is killed as well and the point is
+           yielded as the last one, with point.aborted set. Raw output
+           lines are appended to list lines if given."""
+        self.solve(pcmd, operating_point)
+        self.start_listing()
+        start = self._solve_start
+        timeout = None
+        if self.timeout is not None:
+            timeout = max(start+self.timeout-time(), 0)
+        parser = OperStreamParser()
+        finished = False
+        try:
+            for line in self.iter_lines("ENDD", timeout):
+                if lines is not None:
+                    lines.append(line)
+                for point in parser.feed(line):
+                    yield point
+                if watchdog is not None and parser.current is not None:
+                    reason = watchdog.diverging(parser.current)
+                    if reason:
+                        self.kill()
+                        finished = True
+                        yield parser.abort(reason)
+                        return
+            finished = True
+        finally:
+            if not finished:
+                self.kill()
+        for point in parser.close():
+            yield point
+
+    def iter_lines(self, marker, timeout=None):
+        """Yields lines as they arrive, sleeping while XFOIL is busy, up to
+           and including the line with marker. If timeout [s] passes first,
+           XFOIL is considered hung: it is killed and XfoilTimeout is
+           raised."""
+        if timeout is not None:
+            deadline = time() + timeout
+        line = ''
+        while not re.search(marker, line):
+            if timeout is None:
+                line = self.xf.readline(block=True)
+            else:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    self.kill()
+                    raise XfoilTimeout(
+                        "No '{}' from XFOIL within {:.1f} s, process killed"
+                        .format(marker, timeout))
+                line = self.xf.readline(remaining)
+            if line:
+                yield line
+            else:
+                line = ''
+
+    def read_until(self, marker, timeout=None):
+        """Keep reading until line with marker is encountered, returns list
+           of lines. Raises XfoilTimeout like iter_lines()."""
+        return [''] + list(self.iter_lines(marker, timeout))
+
+    def drain(self):
+        """Throw away output that was not read yet"""
+        try:
+            while self.xf.readline():
+                pass
+        except UnexpectedEndOfStream:
+            self.broken = True
+
+    def is_alive(self):
+        """True if XFOIL process did not exit"""
+        return self.xf.xfinst.poll() is None
+
+    def ping(self, timeout=5):
+        """Health check: True if XFOIL responds to a command in time"""
+        if not self.is_alive():
+            return False
+        try:
+            self.xf.cmd("PING")
+            self.read_until("PING", timeout)
+        except (IOError, UnexpectedEndOfStream, XfoilTimeout):
+            return False
+        return True
+
+    def kill(self):
+        """Kill XFOIL and wait for the process to be reaped"""
+        self.broken = True
+        self.xf.close()
+        self.xf.xfinst.wait()
+
+    def close(self):
+        """Kill XFOIL and reap it"""
+        self.kill()
+
+
+class XfoilPool(object):
+    """
+    Pool of XfoilSession objects, avoids spawning and setting up a new XFOIL
+    process for every polar. Sessions are checked out, used and checked in:
+
+        with pool.session() as session:
+            session.load(...)
+
+    A session that raised an exception, died or did not pass its health
+    check is replaced by a fresh one. After max_uses polars a session is
+    replaced as well, to keep XFOIL's polar storage from filling up.
+    """
+
+    def __init__(self, size=None, path="", binary="", max_uses=10,
+                 health_check=True, ping_timeout=5, timeout=None,
+                 instrument=None):
+        """
+        size         -> Max. number of XFOIL processes, default nr. of cores
+        path, binary -> Passed on to Xfoil
+        max_uses     -> Number of polars after which process is replaced
+        health_check -> Ping sessions on checkout
+        ping_timeout -> Seconds to wait for a ping answer
+        timeout      -> Seconds one polar may take before XFOIL is killed,
+                        None to wait forever
+        instrument   -> Instrument that timestamps XFOIL I/O of all sessions
+        """
+        self.size = size or cpu_count()
+        self.path, self.binary = path, binary
+        self.timeout = timeout
+        self.instrument = instrument
+        self.max_uses = max_uses
+        self.health_check = health_check
+        self.ping_timeout = ping_timeout
+        self._idle = []
+        self._nbusy = 0
+        self._cond = Condition(Lock())
+        self._closed = False
+        self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def _check_fork(self):
+        """Sessions inherited from the parent of a forked process, e.g. a
+           multiprocessing worker, are read by threads that don't exist in
+           the child and belong to the parent, so start afresh."""
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = []
+            self._nbusy = 0
+
+    def _spawn(self):
+        return XfoilSession(self.path, self.binary, timeout=self.timeout,
+                            instrument=self.instrument)
+
+    def _healthy(self, session, ping=None):
+        if session.broken or session.uses >= self.max_uses:
+            return False
+        if self.health_check if ping is None else ping:
+            return session.ping(self.ping_timeout)
+        return session.is_alive()
+
+    def checkout(self, block=True, ping=None):
+        """Get a session, blocks while all sessions are in use. With
+           block=False, returns None instead of waiting. ping overrides
+           self.health_check, pinging must not be done from a thread that
+           delivers lines, like the multiplexer thread."""
+        with self._cond:
+            self._check_fork()
+            if self._closed:
+                raise Warning("XfoilPool was closed")
+            while not self._idle and self._nbusy >= self.size:
+                if not block:
+                    return None
+                self._cond.wait()
+            session = self._idle.pop() if self._idle else None
+            self._nbusy += 1
+        try:
+            if session is not None and not self._healthy(session, ping):
+                session.close()
+                session = None
+            if session is None:
+                session = self._spawn()
+        except:
+            with self._cond:
+                self._nbusy -= 1
+                self._cond.notify()
+            raise
+        return session
+
+    def checkin(self, session):
+        """Return a session to the pool, discarding it if it's broken"""
+        if not session.broken and session.is_alive():
+            try:
+                session._top()
+                session.drain()
+            except IOError:
+                session.broken = True
+        with self._cond:
+            self._nbusy -= 1
+            if self._closed or session.broken or not session.is_alive():
+                session.close()
+            else:
+                self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self):
+        """Context manager that checks a session out and in again"""
+        session = self.checkout()
+        try:
+            yield session
+        except:
+            session.broken = True
+            raise
+        finally:
+            self.checkin(session)
+
+    def close(self):
+        """Kill all idle XFOIL processes, busy ones are killed on checkin"""
+        with self._cond:
+            self._check_fork()
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for session in idle:
+            session.close()
 
 
 class UnexpectedEndOfStream(Exception): pass
 
+class XfoilTimeout(Exception): pass
+
+# Put in queue by reader thread when stream is closed
+_EOF = object()
+
 class NonBlockingStreamReader:
     """XFOIL is interactive, thus readline() blocks. The solution is to
        let another thread handle the XFOIL communication, and communicate
        with that thread using a queue.
        From http://eyalarubas.com/python-subproc-nonblock.html"""
  
-    def __init__(self, stream):
+    def __init__(self, stream, on_line=None):
         '''
         stream: the stream to read from.
                 Usually a process' stdout or stderr.
+        on_line: called as on_line(line, time) when a line arrives.
         '''
         self._s = stream
         self._q = Queue()
-        def _populateQueue(stream, queue):
+        self._on_line = on_line
+        self._listener = None
+        self._listener_lock = Lock()
+        def _populateQueue(stream, deliver):
             '''
             Collect lines from 'stream' and put them in 'quque'.
             '''
             while True:
                 line = stream.readline()
                 if line:
-                    queue.put(line)
+                    deliver(line)
                 else:
                     #print "NonBlockingStreamReader: End of stream"
-                    # Make sure to terminate
+                    # Tell reading side, and make sure to terminate
+                    deliver(None)
                     return
                     #raise UnexpectedEndOfStream
         self._t = Thread(target = _populateQueue,
-                args = (self._s, self._q))
+                args = (self._s, self._deliver))
         self._t.daemon = True
         # Start collecting lines from the stream
         self._t.start()
 
-    def readline(self, timeout = None):
+    def readline(self, timeout = None, block = None):
+        """Returns line, or None if no line arrived within timeout [s].
+           Doesn't wait if timeout is None, unless block=True.
+           Raises UnexpectedEndOfStream when the stream was closed."""
+        if block is None:
+            block = timeout is not None
         try:
-            return self._q.get(block = timeout is not None,
-                    timeout = timeout)
+            line = self._q.get(block = block, timeout = timeout)
         except Empty:
             return None
+        if line is _EOF:
+            # Leave marker for next readline() call
+            self._q.put(_EOF)
+            raise UnexpectedEndOfStream
+        return line
+
+    def set_listener(self, listener):
+        """Call listener(line) for every new line instead of queueing it,
+           with line None at end of stream. Set to None to queue again."""
+        with self._listener_lock:
+            self._listener = listener
+
+    def _deliver(self, line):
+        """Give line (None at end of stream) to listener or queue"""
+        if line is not None and self._on_line is not None:
+            self._on_line(line, time())
+        with self._listener_lock:
+            listener = self._listener
+            if listener is None:
+                self._q.put(_EOF if line is None else line)
+        if listener is not None:
+            listener(line)
+
+
+class MultiplexedStreamReader(NonBlockingStreamReader):
+    """Same interface as NonBlockingStreamReader, but lines are put in the
+       queue by the StreamMultiplexer thread that is shared by all
+       readers, instead of by a thread per stream."""
+
+    def __init__(self, stream, mux=None, on_line=None):
+        self._s = stream
+        self._q = Queue()
+        self._on_line = on_line
+        self._listener = None
+        self._listener_lock = Lock()
+        if mux is None:
+            mux = multiplexer.get_multiplexer()
+        mux.register(stream, self._deliver)
 
 
 if __name__ == "__main__":